@@ -24,7 +24,10 @@ sac2ncf_params = ["sac2ncf_procs"]
 
 ncf2egf_params = ["chb_ncf2egf_symmetrize", "chb_ncf2egf_cut", "le_ncf2egf_cut_begin", "le_ncf2egf_cut_end",
                   "chb_ncf2egf_bp", "le_ncf2egf_bp_cp1", "le_ncf2egf_bp_cp2",
-                  "sb_ncf2egf_bp_poles", "sb_ncf2egf_bp_passes"]
+                  "sb_ncf2egf_bp_poles", "sb_ncf2egf_bp_passes", "cmb_ncf2egf_bp_method"]
+
+# parameters that older config files do not have: {parameter: default value}
+optional_params = {"cmb_ncf2egf_bp_method": "0"} # SAC: bp
 
 
 integer_params = ["chb_dc_service_iris_edu","chb_dc_service_ncedc_org","chb_dc_service_scedc_caltech_edu",
@@ -41,11 +44,16 @@ integer_params = ["chb_dc_service_iris_edu","chb_dc_service_ncedc_org","chb_dc_s
                   "cmb_sac2ncf_final_sf","cmb_sac2ncf_resp_output","cmb_sac2ncf_resp_prefilter",
                   "sb_sac2ncf_bp_poles","sb_sac2ncf_bp_passes", "le_sac2ncf_dspline", "sb_sac2ncf_whiten_order",
                   "chb_ncf2egf_symmetrize", "chb_ncf2egf_cut", "chb_ncf2egf_bp",
-                  "sb_ncf2egf_bp_poles", "sb_ncf2egf_bp_passes",
-                  "cmb_sac2ncf_detrend_method", "sb_sac2ncf_detrend_order"]
+                  "sb_ncf2egf_bp_poles", "sb_ncf2egf_bp_passes", "cmb_ncf2egf_bp_method",
+                  "cmb_sac2ncf_detrend_method", "sb_sac2ncf_detrend_order", "cmb_sac2ncf_xcorr_outputs",
+                  "cmb_sac2ncf_xcorr_weights"]
 
 float_params = ["dsb_mseed2sac_max_taper", "le_minlat","le_maxlat","le_minlon","le_maxlon",
-                "le_mseed2sac_bp_cp1", "le_mseed2sac_bp_cp2", "le_sac2ncf_bp_cp1", "le_sac2ncf_bp_cp2",
+                "le_mseed2sac_bp_cp1", "le_mseed2sac_bp_cp2", "le_sac2ncf_bp_cp1", "le_sac2ncf_bp_cp2", "le_sac2ncf_ram_window",
+                "le_sac2ncf_whiten_cp1", "le_sac2ncf_whiten_cp2", "le_sac2ncf_whiten_smooth",
+                "le_sac2ncf_xcorr_min_dist", "le_sac2ncf_xcorr_max_dist", "le_sac2ncf_xcorr_min_wavelengths",
+                "le_sac2ncf_xcorr_velocity", "le_sac2ncf_xcorr_maxlag", "le_sac2ncf_xcorr_window",
+                "le_sac2ncf_xcorr_overlap",
                 "le_ncf2egf_cut_begin", "le_ncf2egf_cut_end", "le_ncf2egf_bp_cp1", "le_ncf2egf_bp_cp2"]
 
 intlist_params = ["pid"]
@@ -148,10 +156,13 @@ def read_config(maindir):
     # ncf2egf
     ncf2egf = {}
     for param in ncf2egf_params:
-        if param not in config.options('ncf2egf'):
+        if param in config.options('ncf2egf'):
+            val = config.get('ncf2egf',f"{param}")
+        elif param in optional_params:
+            val = optional_params[param]
+        else:
             print(f"read_config(): Config parameter not available in [ncf2egf]: '{param}'")
             return False
-        val = config.get('ncf2egf',f"{param}")
         if param in integer_params and len(val):
             ncf2egf[f"{param}"] = int(val)
         elif param in float_params and len(val):
@@ -229,6 +240,7 @@ def write_config(maindir, parameters):
     fopen.write(f"le_ncf2egf_bp_cp2 = {parameters['ncf2egf']['le_ncf2egf_bp_cp2']}\n")
     fopen.write(f"sb_ncf2egf_bp_poles = {parameters['ncf2egf']['sb_ncf2egf_bp_poles']}\n")
     fopen.write(f"sb_ncf2egf_bp_passes = {parameters['ncf2egf']['sb_ncf2egf_bp_passes']}\n")
+    fopen.write(f"cmb_ncf2egf_bp_method = {parameters['ncf2egf']['cmb_ncf2egf_bp_method']}\n")
 
 
     fopen.close()
@@ -369,6 +381,11 @@ class Defaults:
         # process 3 
         sac2ncf_proc_3 = {}
         sac2ncf_proc_3['pid'] = [10,1]
+        sac2ncf_proc_3['le_sac2ncf_xcorr_min_dist'] = 0 # km
+        sac2ncf_proc_3['le_sac2ncf_xcorr_max_dist'] = 0 # km; 0: no limit
+        sac2ncf_proc_3['le_sac2ncf_xcorr_min_wavelengths'] = 0 # 0: off
+        sac2ncf_proc_3['le_sac2ncf_xcorr_velocity'] = 3 # km/s
+        sac2ncf_proc_3['le_sac2ncf_xcorr_maxlag'] = 0 # s; 0: all lags
         # append processes to the list
         sac2ncf['sac2ncf_procs'].append(sac2ncf_proc_1)
         sac2ncf['sac2ncf_procs'].append(sac2ncf_proc_2)
@@ -386,5 +403,6 @@ class Defaults:
         ncf2egf['le_ncf2egf_bp_cp2'] = 300
         ncf2egf['sb_ncf2egf_bp_poles'] = 3
         ncf2egf['sb_ncf2egf_bp_passes'] = 2
+        ncf2egf['cmb_ncf2egf_bp_method'] = 0 # SAC: bp
         return ncf2egf
 
@@ -975,7 +975,7 @@ class MSEED2SAC(QWidget):
         proc_method = current_proc_frame.layout().itemAt(1).widget()
         proc_type_index = proc_type.layout().itemAt(1).widget().currentIndex()
         proc_method_index = proc_method.layout().itemAt(1).widget().currentIndex()
-        more_than_one_method = [2] # proc_type_index which has more than 1 method available
+        more_than_one_method = [2, 4, 5] # proc_type_index which has more than 1 method available
         if proc_type_index not in more_than_one_method or proc_method_index in [0, -1]:
             proc_method_index = 1
             proc_method_index = 1
@@ -1146,6 +1146,7 @@ class MSEED2SAC(QWidget):
             cmb_proc_method.setEditable(True)
             cmb_proc_method.lineEdit().setAlignment(Qt.AlignCenter)
             cmb_proc_method.addItem("SAC: bp") # Method 1
+            cmb_proc_method.addItem("SciPy: butterworth (not verified against SAC bp)") # Method 2
             lyo_proc_method.addWidget(lbl_bandpass_method)
             lyo_proc_method.addWidget(cmb_proc_method)
         elif ptype_index == 5: # cut seismogram
@@ -1155,6 +1156,7 @@ class MSEED2SAC(QWidget):
             cmb_proc_method.setEditable(True)
             cmb_proc_method.lineEdit().setAlignment(Qt.AlignCenter)
             cmb_proc_method.addItem("SAC: cuterr fillz") # Method 1
+            cmb_proc_method.addItem("NumPy: cut & zero fill") # Method 2
             lyo_proc_method.addWidget(lbl_cut_method)
             lyo_proc_method.addWidget(cmb_proc_method)
         elif ptype_index == 6: # Detrend
@@ -1373,7 +1375,7 @@ class MSEED2SAC(QWidget):
             le_mseed2sac_stametadir.setText(f"{params['le_mseed2sac_stametadir']}")
             cmb_mseed2sac_resp_output.setCurrentIndex(params['cmb_mseed2sac_resp_output'])
             cmb_mseed2sac_resp_prefilter.setCurrentIndex(params['cmb_mseed2sac_resp_prefilter'])
-        elif pid == [4,1]: # bandpass filter - Method 1
+        elif pid == [4,1] or pid == [4,2]: # bandpass filter - Method 1 & 2
             lbl_mseed2sac_bp_cp1 = QLabel("Left corner period (s):")
             le_mseed2sac_bp_cp1 = MyLineEdit()
             le_mseed2sac_bp_cp1.setObjectName('le_mseed2sac_bp_cp1')
@@ -1416,7 +1418,7 @@ class MSEED2SAC(QWidget):
             le_mseed2sac_bp_cp2.setText(f"{params['le_mseed2sac_bp_cp2']}")
             sb_mseed2sac_bp_poles.setValue(params['sb_mseed2sac_bp_poles'])
             sb_mseed2sac_bp_passes.setValue(params['sb_mseed2sac_bp_passes'])
-        elif pid == [5,1]: # Cut seismogram - Method 1
+        elif pid == [5,1] or pid == [5,2]: # Cut seismogram - Method 1 & 2
             lbl_mseed2sac_cut_begin = QLabel("Cut begin (s):")
             le_mseed2sac_cut_begin = MyLineEdit()
             le_mseed2sac_cut_begin.setObjectName("le_mseed2sac_cut_begin")
@@ -1556,10 +1558,20 @@ class MSEED2SAC(QWidget):
             mseed2sac_proc_params["le_mseed2sac_bp_cp2"] = "500"
             mseed2sac_proc_params["sb_mseed2sac_bp_poles"] = 3
             mseed2sac_proc_params["sb_mseed2sac_bp_passes"] = 2
+        elif pid == [4,2]: # Bandpass filter - Method 2
+            mseed2sac_proc_params["pid"] = [4,2]
+            mseed2sac_proc_params["le_mseed2sac_bp_cp1"] = "4"
+            mseed2sac_proc_params["le_mseed2sac_bp_cp2"] = "500"
+            mseed2sac_proc_params["sb_mseed2sac_bp_poles"] = 3
+            mseed2sac_proc_params["sb_mseed2sac_bp_passes"] = 2
         elif pid == [5,1]: # Cut seismogram - Method 1
             mseed2sac_proc_params["pid"] = [5,1]
             mseed2sac_proc_params["le_mseed2sac_cut_begin"] = ""
             mseed2sac_proc_params["le_mseed2sac_cut_end"] = ""
+        elif pid == [5,2]: # Cut seismogram - Method 2
+            mseed2sac_proc_params["pid"] = [5,2]
+            mseed2sac_proc_params["le_mseed2sac_cut_begin"] = ""
+            mseed2sac_proc_params["le_mseed2sac_cut_end"] = ""
         elif pid == [6,1]: # Detrend - Method 1
             mseed2sac_proc_params["cmb_mseed2sac_detrend_method"] = 3
             mseed2sac_proc_params["sb_mseed2sac_detrend_order"] = 4
@@ -1613,7 +1625,7 @@ class MSEED2SAC(QWidget):
                     proc['le_mseed2sac_stametadir'] = le_mseed2sac_stametadir
                     proc['cmb_mseed2sac_resp_output'] = cmb_mseed2sac_resp_output
                     proc['cmb_mseed2sac_resp_prefilter'] = cmb_mseed2sac_resp_prefilter
-                elif pid == [4,1]: # bandpass filter - Method 1
+                elif pid == [4,1] or pid == [4,2]: # bandpass filter - Method 1 & 2
                     le_mseed2sac_bp_cp1 = proc_param.findChild(QLineEdit, 'le_mseed2sac_bp_cp1').text()
                     le_mseed2sac_bp_cp2 = proc_param.findChild(QLineEdit, 'le_mseed2sac_bp_cp2').text()
                     sb_mseed2sac_bp_poles = proc_param.findChild(QSpinBox, 'sb_mseed2sac_bp_poles').value()
@@ -1622,7 +1634,7 @@ class MSEED2SAC(QWidget):
                     proc['le_mseed2sac_bp_cp2'] = le_mseed2sac_bp_cp2
                     proc['sb_mseed2sac_bp_poles'] = sb_mseed2sac_bp_poles
                     proc['sb_mseed2sac_bp_passes'] = sb_mseed2sac_bp_passes
-                elif pid == [5,1]: # Cut seismogram - Method 1
+                elif pid == [5,1] or pid == [5,2]: # Cut seismogram - Method 1 & 2
                     le_mseed2sac_cut_begin = proc_param.findChild(MyLineEdit, 'le_mseed2sac_cut_begin').text()
                     le_mseed2sac_cut_end = proc_param.findChild(MyLineEdit, 'le_mseed2sac_cut_end').text()
                     proc['le_mseed2sac_cut_begin'] = le_mseed2sac_cut_begin
@@ -1795,7 +1807,7 @@ class SAC2NCF(QWidget):
         proc_method = current_proc_frame.layout().itemAt(1).widget()
         proc_type_index = proc_type.layout().itemAt(1).widget().currentIndex()
         proc_method_index = proc_method.layout().itemAt(1).widget().currentIndex()
-        more_than_one_method = [1] # proc_type_index which has more than 1 method available
+        more_than_one_method = [1, 3, 4, 8, 9, 10] # proc_type_index which has more than 1 method available
         if proc_type_index not in more_than_one_method or proc_method_index in [0, -1]:
             proc_method_index = 1
         new_proc_frame = self.new_proc_frame(pframe_id, pid=[proc_type_index, proc_method_index])
@@ -1906,6 +1918,7 @@ class SAC2NCF(QWidget):
             cmb_proc_method.setEditable(True)
             cmb_proc_method.lineEdit().setAlignment(Qt.AlignCenter)
             cmb_proc_method.addItem("SAC: bp") # Method 1
+            cmb_proc_method.addItem("SciPy: butterworth (not verified against SAC bp)") # Method 2
             lyo_proc_method.addWidget(lbl_bandpass_method)
             lyo_proc_method.addWidget(cmb_proc_method)
         elif ptype_index == 4: # cut seismogram
@@ -1915,6 +1928,7 @@ class SAC2NCF(QWidget):
             cmb_proc_method.setEditable(True)
             cmb_proc_method.lineEdit().setAlignment(Qt.AlignCenter)
             cmb_proc_method.addItem("SAC: cuterr fillz") # Method 1
+            cmb_proc_method.addItem("NumPy: cut & zero fill") # Method 2
             lyo_proc_method.addWidget(lbl_cut_method)
             lyo_proc_method.addWidget(cmb_proc_method)
         elif ptype_index == 5: # Detrend
@@ -1951,6 +1965,8 @@ class SAC2NCF(QWidget):
             cmb_proc_method.setEditable(True)
             cmb_proc_method.lineEdit().setAlignment(Qt.AlignCenter)
             cmb_proc_method.addItem("One-bit normalization") # Method 1
+            cmb_proc_method.addItem("NumPy: one-bit") # Method 2
+            cmb_proc_method.addItem("NumPy: running abs mean") # Method 3
             lyo_proc_method.addWidget(lbl_tempnorm_method)
             lyo_proc_method.addWidget(cmb_proc_method)
         elif ptype_index == 9: # spectral whitening
@@ -1960,6 +1976,8 @@ class SAC2NCF(QWidget):
             cmb_proc_method.setEditable(True)
             cmb_proc_method.lineEdit().setAlignment(Qt.AlignCenter)
             cmb_proc_method.addItem("SAC: whiten") # Method 1
+            cmb_proc_method.addItem("NumPy: AR prewhitening") # Method 2
+            cmb_proc_method.addItem("NumPy: spectral whitening") # Method 3
             lyo_proc_method.addWidget(lbl_whiten_method)
             lyo_proc_method.addWidget(cmb_proc_method)
         elif ptype_index == 10: # cross correlation
@@ -1969,6 +1987,8 @@ class SAC2NCF(QWidget):
             cmb_proc_method.setEditable(True)
             cmb_proc_method.lineEdit().setAlignment(Qt.AlignCenter)
             cmb_proc_method.addItem("SAC: correlate") # Method 1
+            cmb_proc_method.addItem("NumPy: FFT all-pairs") # Method 2
+            cmb_proc_method.addItem("NumPy: correlation tensor") # Method 3
             lyo_proc_method.addWidget(lbl_xcorr_method)
             lyo_proc_method.addWidget(cmb_proc_method)
         else:
@@ -2048,7 +2068,7 @@ class SAC2NCF(QWidget):
             le_sac2ncf_stametadir.setText(f"{params['le_sac2ncf_stametadir']}")
             cmb_sac2ncf_resp_output.setCurrentIndex(params['cmb_sac2ncf_resp_output'])
             cmb_sac2ncf_resp_prefilter.setCurrentIndex(params['cmb_sac2ncf_resp_prefilter'])
-        elif pid == [3,1]: # bandpass filter - Method 1
+        elif pid == [3,1] or pid == [3,2]: # bandpass filter - Method 1 & 2
             lbl_sac2ncf_bp_cp1 = QLabel("Left corner period (s):")
             le_sac2ncf_bp_cp1 = MyLineEdit()
             le_sac2ncf_bp_cp1.setObjectName('le_sac2ncf_bp_cp1')
@@ -2091,7 +2111,7 @@ class SAC2NCF(QWidget):
             le_sac2ncf_bp_cp2.setText(f"{params['le_sac2ncf_bp_cp2']}")
             sb_sac2ncf_bp_poles.setValue(params['sb_sac2ncf_bp_poles'])
             sb_sac2ncf_bp_passes.setValue(params['sb_sac2ncf_bp_passes'])
-        elif pid == [4,1]: # Cut seismogram - Method 1
+        elif pid == [4,1] or pid == [4,2]: # Cut seismogram - Method 1 & 2
             lbl_sac2ncf_cut_begin = QLabel("Cut begin (s):")
             le_sac2ncf_cut_begin = MyLineEdit()
             le_sac2ncf_cut_begin.setObjectName("le_sac2ncf_cut_begin")
@@ -2197,7 +2217,7 @@ class SAC2NCF(QWidget):
             # set parameters
             le_sac2ncf_similar_channels.setText(f"{params['le_sac2ncf_similar_channels']}")
             le_sac2ncf_channels2keep.setText(f"{params['le_sac2ncf_channels2keep']}")
-        elif pid == [9,1]: # Spectral whitening - Method 1: SAC: whiten
+        elif pid == [9,1] or pid == [9,2]: # Spectral whitening - Method 1 & 2: SAC/NumPy whiten
             lbl_sac2ncf_whiten_order = QLabel("Whitening order:")
             sb_sac2ncf_whiten_order = QSpinBox()
             sb_sac2ncf_whiten_order.setObjectName('sb_sac2ncf_whiten_order')
@@ -2212,7 +2232,157 @@ class SAC2NCF(QWidget):
             lyo_proc_param.setContentsMargins(65,0,55,0)
             # set parameters
             sb_sac2ncf_whiten_order.setValue(params['sb_sac2ncf_whiten_order'])
-        elif pid == [8,1] or pid == [10,1]: # Temporal normalization - Method 1 OR Cross-correlate - Method 1
+        elif pid == [9,3]: # Spectral whitening - Method 3: frequency-domain whitening
+            lbl_sac2ncf_whiten_cp1 = QLabel("Left corner period (s):")
+            le_sac2ncf_whiten_cp1 = MyLineEdit()
+            le_sac2ncf_whiten_cp1.setObjectName('le_sac2ncf_whiten_cp1')
+            le_sac2ncf_whiten_cp1.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_whiten_cp1.setPlaceholderText("Whitening band left corner period (s)")
+            le_sac2ncf_whiten_cp1.textChanged.connect(le_sac2ncf_whiten_cp1.isfloat)
+            lbl_sac2ncf_whiten_cp2 = QLabel("Right corner period (s):")
+            le_sac2ncf_whiten_cp2 = MyLineEdit()
+            le_sac2ncf_whiten_cp2.setObjectName('le_sac2ncf_whiten_cp2')
+            le_sac2ncf_whiten_cp2.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_whiten_cp2.setPlaceholderText("Whitening band right corner period (s)")
+            le_sac2ncf_whiten_cp2.textChanged.connect(le_sac2ncf_whiten_cp2.isfloat)
+            lbl_sac2ncf_whiten_smooth = QLabel("Smoothing width (Hz):")
+            le_sac2ncf_whiten_smooth = MyLineEdit()
+            le_sac2ncf_whiten_smooth.setObjectName('le_sac2ncf_whiten_smooth')
+            le_sac2ncf_whiten_smooth.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_whiten_smooth.setPlaceholderText("Amplitude smoothing window (0: phase only)")
+            le_sac2ncf_whiten_smooth.textChanged.connect(le_sac2ncf_whiten_smooth.isfloat)
+            # setup layout
+            lyo_proc_param.addWidget(lbl_sac2ncf_whiten_cp1, 0,0)
+            lyo_proc_param.addWidget(le_sac2ncf_whiten_cp1, 0,1)
+            lyo_proc_param.addWidget(lbl_sac2ncf_whiten_cp2, 1,0)
+            lyo_proc_param.addWidget(le_sac2ncf_whiten_cp2, 1,1)
+            lyo_proc_param.addWidget(lbl_sac2ncf_whiten_smooth, 0,2)
+            lyo_proc_param.addWidget(le_sac2ncf_whiten_smooth, 0,3)
+            lyo_proc_param.setAlignment(Qt.AlignVCenter)
+            lyo_proc_param.setAlignment(Qt.AlignHCenter)
+            lyo_proc_param.setVerticalSpacing(15)
+            lyo_proc_param.setContentsMargins(50,0,50,0)
+            # set parameters
+            le_sac2ncf_whiten_cp1.setText(f"{params['le_sac2ncf_whiten_cp1']}")
+            le_sac2ncf_whiten_cp2.setText(f"{params['le_sac2ncf_whiten_cp2']}")
+            le_sac2ncf_whiten_smooth.setText(f"{params['le_sac2ncf_whiten_smooth']}")
+        elif pid == [8,3]: # Temporal normalization - Method 3: running absolute mean
+            lbl_sac2ncf_ram_window = QLabel("Normalization window (s):")
+            le_sac2ncf_ram_window = MyLineEdit()
+            le_sac2ncf_ram_window.setObjectName('le_sac2ncf_ram_window')
+            le_sac2ncf_ram_window.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_ram_window.setPlaceholderText("Running absolute mean window length (s)")
+            le_sac2ncf_ram_window.textChanged.connect(le_sac2ncf_ram_window.isfloat)
+            # setup layout
+            lyo_proc_param.addWidget(lbl_sac2ncf_ram_window, 0,0)
+            lyo_proc_param.addWidget(le_sac2ncf_ram_window, 0,1)
+            lyo_proc_param.setAlignment(Qt.AlignVCenter)
+            lyo_proc_param.setAlignment(Qt.AlignHCenter)
+            lyo_proc_param.setContentsMargins(65,0,55,0)
+            # set parameters
+            le_sac2ncf_ram_window.setText(f"{params['le_sac2ncf_ram_window']}")
+        elif pid[0] == 10: # Cross-correlation - Method 1, 2 & 3
+            lbl_sac2ncf_xcorr_min_dist = QLabel("Min distance (km):")
+            le_sac2ncf_xcorr_min_dist = MyLineEdit()
+            le_sac2ncf_xcorr_min_dist.setObjectName('le_sac2ncf_xcorr_min_dist')
+            le_sac2ncf_xcorr_min_dist.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_xcorr_min_dist.setPlaceholderText("Minimum interstation distance (km)")
+            le_sac2ncf_xcorr_min_dist.textChanged.connect(le_sac2ncf_xcorr_min_dist.isfloat)
+            lbl_sac2ncf_xcorr_max_dist = QLabel("Max distance (km):")
+            le_sac2ncf_xcorr_max_dist = MyLineEdit()
+            le_sac2ncf_xcorr_max_dist.setObjectName('le_sac2ncf_xcorr_max_dist')
+            le_sac2ncf_xcorr_max_dist.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_xcorr_max_dist.setPlaceholderText("Maximum interstation distance (km; 0: no limit)")
+            le_sac2ncf_xcorr_max_dist.textChanged.connect(le_sac2ncf_xcorr_max_dist.isfloat)
+            lbl_sac2ncf_xcorr_min_wavelengths = QLabel("Min wavelengths:")
+            le_sac2ncf_xcorr_min_wavelengths = MyLineEdit()
+            le_sac2ncf_xcorr_min_wavelengths.setObjectName('le_sac2ncf_xcorr_min_wavelengths')
+            le_sac2ncf_xcorr_min_wavelengths.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_xcorr_min_wavelengths.setPlaceholderText("Min distance in longest bandpass period wavelengths (0: off)")
+            le_sac2ncf_xcorr_min_wavelengths.textChanged.connect(le_sac2ncf_xcorr_min_wavelengths.isfloat)
+            lbl_sac2ncf_xcorr_velocity = QLabel("Velocity (km/s):")
+            le_sac2ncf_xcorr_velocity = MyLineEdit()
+            le_sac2ncf_xcorr_velocity.setObjectName('le_sac2ncf_xcorr_velocity')
+            le_sac2ncf_xcorr_velocity.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_xcorr_velocity.setPlaceholderText("Reference velocity for wavelengths (km/s)")
+            le_sac2ncf_xcorr_velocity.textChanged.connect(le_sac2ncf_xcorr_velocity.isfloat)
+            lbl_sac2ncf_xcorr_maxlag = QLabel("Max lag (s):")
+            le_sac2ncf_xcorr_maxlag = MyLineEdit()
+            le_sac2ncf_xcorr_maxlag.setObjectName('le_sac2ncf_xcorr_maxlag')
+            le_sac2ncf_xcorr_maxlag.setAlignment(Qt.AlignCenter)
+            le_sac2ncf_xcorr_maxlag.setPlaceholderText("Output lags within +/- max lag (s; 0: all lags)")
+            le_sac2ncf_xcorr_maxlag.textChanged.connect(le_sac2ncf_xcorr_maxlag.isfloat)
+            if pid != [10,1]:
+                lbl_sac2ncf_xcorr_window = QLabel("Sub-window (s):")
+                le_sac2ncf_xcorr_window = MyLineEdit()
+                le_sac2ncf_xcorr_window.setObjectName('le_sac2ncf_xcorr_window')
+                le_sac2ncf_xcorr_window.setAlignment(Qt.AlignCenter)
+                le_sac2ncf_xcorr_window.setPlaceholderText("Sub-window length for stacking (s; 0: whole trace)")
+                le_sac2ncf_xcorr_window.textChanged.connect(le_sac2ncf_xcorr_window.isfloat)
+                lbl_sac2ncf_xcorr_overlap = QLabel("Overlap (%):")
+                le_sac2ncf_xcorr_overlap = MyLineEdit()
+                le_sac2ncf_xcorr_overlap.setObjectName('le_sac2ncf_xcorr_overlap')
+                le_sac2ncf_xcorr_overlap.setAlignment(Qt.AlignCenter)
+                le_sac2ncf_xcorr_overlap.setPlaceholderText("Sub-window overlap (%)")
+                le_sac2ncf_xcorr_overlap.textChanged.connect(le_sac2ncf_xcorr_overlap.isfloat)
+                lbl_sac2ncf_xcorr_weights = QLabel("Window weights:")
+                cmb_sac2ncf_xcorr_weights = QComboBox()
+                cmb_sac2ncf_xcorr_weights.setObjectName('cmb_sac2ncf_xcorr_weights')
+                cmb_sac2ncf_xcorr_weights.setEditable(True)
+                cmb_sac2ncf_xcorr_weights.lineEdit().setAlignment(Qt.AlignCenter)
+                cmb_sac2ncf_xcorr_weights.addItem("None")
+                cmb_sac2ncf_xcorr_weights.addItem("Inverse window energy")
+            if pid == [10,3]:
+                lbl_sac2ncf_xcorr_outputs = QLabel("Output components:")
+                cmb_sac2ncf_xcorr_outputs = QComboBox()
+                cmb_sac2ncf_xcorr_outputs.setObjectName('cmb_sac2ncf_xcorr_outputs')
+                cmb_sac2ncf_xcorr_outputs.setEditable(True)
+                cmb_sac2ncf_xcorr_outputs.lineEdit().setAlignment(Qt.AlignCenter)
+                cmb_sac2ncf_xcorr_outputs.addItem("RR, TT, ZZ")
+                cmb_sac2ncf_xcorr_outputs.addItem("RR, TT, ZZ, RT, TR, RZ, ZR")
+                cmb_sac2ncf_xcorr_outputs.addItem("Rotated + NN, NE, EN, EE, NZ, EZ, ZN, ZE")
+            lbl_sac2ncf_last_process = QLabel("Note: This must be the last listed process for ncf2sac")
+            lbl_sac2ncf_last_process.setObjectName("lbl_sac2ncf_last_process")
+            lbl_sac2ncf_last_process.setStyleSheet("#lbl_sac2ncf_last_process{ color: gray;}")
+            # setup layout
+            lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_min_dist, 0,0)
+            lyo_proc_param.addWidget(le_sac2ncf_xcorr_min_dist, 0,1)
+            lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_max_dist, 0,2)
+            lyo_proc_param.addWidget(le_sac2ncf_xcorr_max_dist, 0,3)
+            lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_min_wavelengths, 1,0)
+            lyo_proc_param.addWidget(le_sac2ncf_xcorr_min_wavelengths, 1,1)
+            lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_velocity, 1,2)
+            lyo_proc_param.addWidget(le_sac2ncf_xcorr_velocity, 1,3)
+            lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_maxlag, 2,0)
+            lyo_proc_param.addWidget(le_sac2ncf_xcorr_maxlag, 2,1)
+            if pid == [10,3]:
+                lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_outputs, 2,2)
+                lyo_proc_param.addWidget(cmb_sac2ncf_xcorr_outputs, 2,3)
+            if pid != [10,1]:
+                lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_window, 3,0)
+                lyo_proc_param.addWidget(le_sac2ncf_xcorr_window, 3,1)
+                lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_overlap, 3,2)
+                lyo_proc_param.addWidget(le_sac2ncf_xcorr_overlap, 3,3)
+                lyo_proc_param.addWidget(lbl_sac2ncf_xcorr_weights, 4,0)
+                lyo_proc_param.addWidget(cmb_sac2ncf_xcorr_weights, 4,1)
+            lyo_proc_param.addWidget(lbl_sac2ncf_last_process, 5,0,1,4)
+            lyo_proc_param.setAlignment(Qt.AlignVCenter)
+            lyo_proc_param.setAlignment(Qt.AlignHCenter)
+            lyo_proc_param.setVerticalSpacing(15)
+            lyo_proc_param.setContentsMargins(50,0,50,0)
+            # set parameters
+            le_sac2ncf_xcorr_min_dist.setText(f"{params.get('le_sac2ncf_xcorr_min_dist', 0)}")
+            le_sac2ncf_xcorr_max_dist.setText(f"{params.get('le_sac2ncf_xcorr_max_dist', 0)}")
+            le_sac2ncf_xcorr_min_wavelengths.setText(f"{params.get('le_sac2ncf_xcorr_min_wavelengths', 0)}")
+            le_sac2ncf_xcorr_velocity.setText(f"{params.get('le_sac2ncf_xcorr_velocity', 3)}")
+            le_sac2ncf_xcorr_maxlag.setText(f"{params.get('le_sac2ncf_xcorr_maxlag', 0)}")
+            if pid != [10,1]:
+                le_sac2ncf_xcorr_window.setText(f"{params.get('le_sac2ncf_xcorr_window', 0)}")
+                le_sac2ncf_xcorr_overlap.setText(f"{params.get('le_sac2ncf_xcorr_overlap', 50)}")
+                cmb_sac2ncf_xcorr_weights.setCurrentIndex(params.get('cmb_sac2ncf_xcorr_weights', 0))
+            if pid == [10,3]:
+                cmb_sac2ncf_xcorr_outputs.setCurrentIndex(params.get('cmb_sac2ncf_xcorr_outputs', 0))
+        elif pid == [8,1] or pid == [8,2]: # Temporal normalization - Method 1 & 2
             lbl_sac2ncf_nothing_adjustable = QLabel("No parameter needs to be adjusted for this process")
             lbl_sac2ncf_nothing_adjustable.setObjectName("lbl_sac2ncf_nothing_adjustable")
             lbl_sac2ncf_nothing_adjustable.setStyleSheet("#lbl_sac2ncf_nothing_adjustable{ color: gray;}")
@@ -2221,14 +2391,12 @@ class SAC2NCF(QWidget):
             lbl_sac2ncf_last_process.setStyleSheet("#lbl_sac2ncf_last_process{ color: gray;}")
             # setup layout
             lyo_proc_param.addWidget(lbl_sac2ncf_nothing_adjustable, 0,0)
-            if pid == [10,1]:
-                lyo_proc_param.addWidget(lbl_sac2ncf_last_process, 1,0)
             lyo_proc_param.setAlignment(Qt.AlignVCenter)
             lyo_proc_param.setAlignment(Qt.AlignHCenter)
             lyo_proc_param.setContentsMargins(65,0,55,0)
 
         # remove next process frames if process type "cross-correlation" is selected
-        if pid == [10,1]:
+        if pid[0] == 10:
             num_procs = self.get_num_procs()
             for  i in range(pframe_id, num_procs-1):
                 self.remove_proc_frame()
@@ -2258,10 +2426,20 @@ class SAC2NCF(QWidget):
             sac2ncf_proc_params["le_sac2ncf_bp_cp2"] = "500"
             sac2ncf_proc_params["sb_sac2ncf_bp_poles"] = 3
             sac2ncf_proc_params["sb_sac2ncf_bp_passes"] = 2
+        elif pid == [3,2]: # Bandpass filter - Method 2
+            sac2ncf_proc_params["pid"] = [3,2]
+            sac2ncf_proc_params["le_sac2ncf_bp_cp1"] = "4"
+            sac2ncf_proc_params["le_sac2ncf_bp_cp2"] = "500"
+            sac2ncf_proc_params["sb_sac2ncf_bp_poles"] = 3
+            sac2ncf_proc_params["sb_sac2ncf_bp_passes"] = 2
         elif pid == [4,1]: # Cut seismogram - Method 1
             sac2ncf_proc_params["pid"] = [4,1]
             sac2ncf_proc_params["le_sac2ncf_cut_begin"] = ""
             sac2ncf_proc_params["le_sac2ncf_cut_end"] = ""
+        elif pid == [4,2]: # Cut seismogram - Method 2
+            sac2ncf_proc_params["pid"] = [4,2]
+            sac2ncf_proc_params["le_sac2ncf_cut_begin"] = ""
+            sac2ncf_proc_params["le_sac2ncf_cut_end"] = ""
         elif pid == [5,1]: # Detrend - Method 1
             sac2ncf_proc_params["cmb_sac2ncf_detrend_method"] = 3
             sac2ncf_proc_params["sb_sac2ncf_detrend_order"] = 4
@@ -2274,11 +2452,35 @@ class SAC2NCF(QWidget):
             sac2ncf_proc_params["le_sac2ncf_channels2keep"] = "BHZ"
         elif pid == [8,1]: # Temporal normalize - Method 1: one-bit
             sac2ncf_proc_params["pid"] = [8,1]
+        elif pid == [8,2]: # Temporal normalize - Method 2: one-bit (NumPy)
+            sac2ncf_proc_params["pid"] = [8,2]
+        elif pid == [8,3]: # Temporal normalize - Method 3: running absolute mean
+            sac2ncf_proc_params["pid"] = [8,3]
+            sac2ncf_proc_params["le_sac2ncf_ram_window"] = "50"
         elif pid == [9,1]: # Spectral whitening - Method 1
             sac2ncf_proc_params["pid"] = [9,1]
             sac2ncf_proc_params['sb_sac2ncf_whiten_order'] = 6
-        elif pid == [10,1]: # Cross-correlation - Method 1: sac correlate
-            sac2ncf_proc_params["pid"] = [10,1]
+        elif pid == [9,2]: # Spectral whitening - Method 2
+            sac2ncf_proc_params["pid"] = [9,2]
+            sac2ncf_proc_params['sb_sac2ncf_whiten_order'] = 6
+        elif pid == [9,3]: # Spectral whitening - Method 3
+            sac2ncf_proc_params["pid"] = [9,3]
+            sac2ncf_proc_params['le_sac2ncf_whiten_cp1'] = "4"
+            sac2ncf_proc_params['le_sac2ncf_whiten_cp2'] = "500"
+            sac2ncf_proc_params['le_sac2ncf_whiten_smooth'] = "0.02"
+        elif pid[0] == 10: # Cross-correlation - Method 1: sac correlate, 2: FFT all-pairs, 3: correlation tensor
+            sac2ncf_proc_params["pid"] = pid
+            sac2ncf_proc_params["le_sac2ncf_xcorr_min_dist"] = "0"
+            sac2ncf_proc_params["le_sac2ncf_xcorr_max_dist"] = "0"
+            sac2ncf_proc_params["le_sac2ncf_xcorr_min_wavelengths"] = "0"
+            sac2ncf_proc_params["le_sac2ncf_xcorr_velocity"] = "3"
+            sac2ncf_proc_params["le_sac2ncf_xcorr_maxlag"] = "0"
+            if pid != [10,1]:
+                sac2ncf_proc_params["le_sac2ncf_xcorr_window"] = "0"
+                sac2ncf_proc_params["le_sac2ncf_xcorr_overlap"] = "50"
+                sac2ncf_proc_params["cmb_sac2ncf_xcorr_weights"] = 0
+            if pid == [10,3]:
+                sac2ncf_proc_params["cmb_sac2ncf_xcorr_outputs"] = 0
         return sac2ncf_proc_params
 
 
@@ -2307,7 +2509,7 @@ class SAC2NCF(QWidget):
                     proc['le_sac2ncf_stametadir'] = le_sac2ncf_stametadir
                     proc['cmb_sac2ncf_resp_output'] = cmb_sac2ncf_resp_output
                     proc['cmb_sac2ncf_resp_prefilter'] = cmb_sac2ncf_resp_prefilter
-                elif pid == [3,1]: # bandpass filter - Method 1
+                elif pid == [3,1] or pid == [3,2]: # bandpass filter - Method 1 & 2
                     le_sac2ncf_bp_cp1 = proc_param.findChild(QLineEdit, 'le_sac2ncf_bp_cp1').text()
                     le_sac2ncf_bp_cp2 = proc_param.findChild(QLineEdit, 'le_sac2ncf_bp_cp2').text()
                     sb_sac2ncf_bp_poles = proc_param.findChild(QSpinBox, 'sb_sac2ncf_bp_poles').value()
@@ -2316,7 +2518,7 @@ class SAC2NCF(QWidget):
                     proc['le_sac2ncf_bp_cp2'] = le_sac2ncf_bp_cp2
                     proc['sb_sac2ncf_bp_poles'] = sb_sac2ncf_bp_poles
                     proc['sb_sac2ncf_bp_passes'] = sb_sac2ncf_bp_passes
-                elif pid == [4,1]: # Cut seismogram - Method 1
+                elif pid == [4,1] or pid == [4,2]: # Cut seismogram - Method 1 & 2
                     le_sac2ncf_cut_begin = proc_param.findChild(MyLineEdit, 'le_sac2ncf_cut_begin').text()
                     le_sac2ncf_cut_end = proc_param.findChild(MyLineEdit, 'le_sac2ncf_cut_end').text()
                     proc['le_sac2ncf_cut_begin'] = le_sac2ncf_cut_begin
@@ -2336,9 +2538,40 @@ class SAC2NCF(QWidget):
                     le_sac2ncf_channels2keep = proc_param.findChild(QLineEdit, 'le_sac2ncf_channels2keep').text()
                     proc['le_sac2ncf_similar_channels'] = le_sac2ncf_similar_channels
                     proc['le_sac2ncf_channels2keep'] = le_sac2ncf_channels2keep
-                elif pid == [9,1]: # Spectral whitening
+                elif pid == [8,3]: # Temporal normalization - Method 3
+                    le_sac2ncf_ram_window = proc_param.findChild(QLineEdit, 'le_sac2ncf_ram_window').text()
+                    proc['le_sac2ncf_ram_window'] = le_sac2ncf_ram_window
+                elif pid == [9,1] or pid == [9,2]: # Spectral whitening - Method 1 & 2
                     sb_sac2ncf_whiten_order = proc_param.findChild(QSpinBox, 'sb_sac2ncf_whiten_order').value()
                     proc['sb_sac2ncf_whiten_order'] = sb_sac2ncf_whiten_order
+                elif pid == [9,3]: # Spectral whitening - Method 3
+                    le_sac2ncf_whiten_cp1 = proc_param.findChild(QLineEdit, 'le_sac2ncf_whiten_cp1').text()
+                    le_sac2ncf_whiten_cp2 = proc_param.findChild(QLineEdit, 'le_sac2ncf_whiten_cp2').text()
+                    le_sac2ncf_whiten_smooth = proc_param.findChild(QLineEdit, 'le_sac2ncf_whiten_smooth').text()
+                    proc['le_sac2ncf_whiten_cp1'] = le_sac2ncf_whiten_cp1
+                    proc['le_sac2ncf_whiten_cp2'] = le_sac2ncf_whiten_cp2
+                    proc['le_sac2ncf_whiten_smooth'] = le_sac2ncf_whiten_smooth
+                elif pid[0] == 10: # Cross-correlation - Method 1, 2 & 3
+                    le_sac2ncf_xcorr_min_dist = proc_param.findChild(QLineEdit, 'le_sac2ncf_xcorr_min_dist').text()
+                    le_sac2ncf_xcorr_max_dist = proc_param.findChild(QLineEdit, 'le_sac2ncf_xcorr_max_dist').text()
+                    le_sac2ncf_xcorr_min_wavelengths = proc_param.findChild(QLineEdit, 'le_sac2ncf_xcorr_min_wavelengths').text()
+                    le_sac2ncf_xcorr_velocity = proc_param.findChild(QLineEdit, 'le_sac2ncf_xcorr_velocity').text()
+                    proc['le_sac2ncf_xcorr_min_dist'] = le_sac2ncf_xcorr_min_dist
+                    proc['le_sac2ncf_xcorr_max_dist'] = le_sac2ncf_xcorr_max_dist
+                    proc['le_sac2ncf_xcorr_min_wavelengths'] = le_sac2ncf_xcorr_min_wavelengths
+                    proc['le_sac2ncf_xcorr_velocity'] = le_sac2ncf_xcorr_velocity
+                    le_sac2ncf_xcorr_maxlag = proc_param.findChild(QLineEdit, 'le_sac2ncf_xcorr_maxlag').text()
+                    proc['le_sac2ncf_xcorr_maxlag'] = le_sac2ncf_xcorr_maxlag
+                    if pid != [10,1]:
+                        le_sac2ncf_xcorr_window = proc_param.findChild(QLineEdit, 'le_sac2ncf_xcorr_window').text()
+                        le_sac2ncf_xcorr_overlap = proc_param.findChild(QLineEdit, 'le_sac2ncf_xcorr_overlap').text()
+                        cmb_sac2ncf_xcorr_weights = proc_param.findChild(QComboBox, 'cmb_sac2ncf_xcorr_weights').currentIndex()
+                        proc['le_sac2ncf_xcorr_window'] = le_sac2ncf_xcorr_window
+                        proc['le_sac2ncf_xcorr_overlap'] = le_sac2ncf_xcorr_overlap
+                        proc['cmb_sac2ncf_xcorr_weights'] = cmb_sac2ncf_xcorr_weights
+                    if pid == [10,3]:
+                        cmb_sac2ncf_xcorr_outputs = proc_param.findChild(QComboBox, 'cmb_sac2ncf_xcorr_outputs').currentIndex()
+                        proc['cmb_sac2ncf_xcorr_outputs'] = cmb_sac2ncf_xcorr_outputs
                 sac2ncf['sac2ncf_procs'].append(proc)
         return sac2ncf
 
@@ -2418,6 +2651,11 @@ class NCF2EGF(QWidget):
         self.sb_ncf2egf_bp_passes.setMinimum(1)
         self.sb_ncf2egf_bp_passes.setMaximum(2)
         self.sb_ncf2egf_bp_passes.setSingleStep(1)
+        lbl_ncf2egf_bp_method = QLabel("Method:")
+        self.cmb_ncf2egf_bp_method = QComboBox()
+        self.cmb_ncf2egf_bp_method.setObjectName('cmb_ncf2egf_bp_method')
+        self.cmb_ncf2egf_bp_method.addItem("SAC: bp")
+        self.cmb_ncf2egf_bp_method.addItem("SciPy: butterworth (not verified against SAC bp)")
         # layout bandpass
         lyo_bp = QGridLayout()
         lyo_bp.addWidget(self.chb_ncf2egf_bp, 0,0,1,1)
@@ -2430,6 +2668,8 @@ class NCF2EGF(QWidget):
         lyo_bp.addWidget(self.sb_ncf2egf_bp_poles, 1,4,1,1)
         lyo_bp.addWidget(lbl_ncf2egf_bp_passes, 2,3,1,1)
         lyo_bp.addWidget(self.sb_ncf2egf_bp_passes, 2,4,1,1)
+        lyo_bp.addWidget(lbl_ncf2egf_bp_method, 3,1,1,1)
+        lyo_bp.addWidget(self.cmb_ncf2egf_bp_method, 3,2,1,1)
         lyo_bp.setAlignment(Qt.AlignVCenter)
         lyo_bp.setAlignment(Qt.AlignHCenter)
         lyo_bp.setVerticalSpacing(15)
@@ -2472,6 +2712,7 @@ class NCF2EGF(QWidget):
             self.le_ncf2egf_bp_cp2.setEnabled(True)
             self.sb_ncf2egf_bp_poles.setEnabled(True)
             self.sb_ncf2egf_bp_passes.setEnabled(True)
+            self.cmb_ncf2egf_bp_method.setEnabled(True)
             self.le_ncf2egf_bp_cp1.setStyleSheet('#le_ncf2egf_bp_cp1{color: #000;}')
             self.le_ncf2egf_bp_cp2.setStyleSheet('#le_ncf2egf_bp_cp2{color: #000;}')
             self.sb_ncf2egf_bp_poles.setStyleSheet('#sb_ncf2egf_bp_poles{color: #000;}')
@@ -2481,6 +2722,7 @@ class NCF2EGF(QWidget):
             self.le_ncf2egf_bp_cp2.setEnabled(False)
             self.sb_ncf2egf_bp_poles.setEnabled(False)
             self.sb_ncf2egf_bp_passes.setEnabled(False)
+            self.cmb_ncf2egf_bp_method.setEnabled(False)
             self.le_ncf2egf_bp_cp1.setStyleSheet('#le_ncf2egf_bp_cp1{color: #aaa;}')
             self.le_ncf2egf_bp_cp2.setStyleSheet('#le_ncf2egf_bp_cp2{color: #aaa;}')
             self.sb_ncf2egf_bp_poles.setStyleSheet('#sb_ncf2egf_bp_poles{color: #aaa;}')
@@ -2499,6 +2741,7 @@ class NCF2EGF(QWidget):
         ncf2egf['le_ncf2egf_bp_cp2'] = self.le_ncf2egf_bp_cp2.text()
         ncf2egf['sb_ncf2egf_bp_poles'] = self.sb_ncf2egf_bp_poles.value()
         ncf2egf['sb_ncf2egf_bp_passes'] = self.sb_ncf2egf_bp_passes.value()
+        ncf2egf['cmb_ncf2egf_bp_method'] = self.cmb_ncf2egf_bp_method.currentIndex()
         return ncf2egf
 
 
@@ -2510,6 +2753,7 @@ class NCF2EGF(QWidget):
         self.chb_ncf2egf_bp.setCheckState(int(parameters['chb_ncf2egf_bp']))
         self.sb_ncf2egf_bp_poles.setValue(int(parameters['sb_ncf2egf_bp_poles']))
         self.sb_ncf2egf_bp_passes.setValue(int(parameters['sb_ncf2egf_bp_passes']))
+        self.cmb_ncf2egf_bp_method.setCurrentIndex(int(parameters['cmb_ncf2egf_bp_method']))
         self.le_ncf2egf_bp_cp1.setText(f"{parameters['le_ncf2egf_bp_cp1']}")
         self.le_ncf2egf_bp_cp2.setText(f"{parameters['le_ncf2egf_bp_cp2']}")
         self.update_ncf2egf_ui()
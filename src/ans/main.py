@@ -143,6 +143,13 @@ def main():
         help='path to the output SAC files dataset directory',
         action='store',
     )
+    mseed2sac_cmd.add_argument(
+        '--sac_pool',
+        type=int,
+        help='run SAC commands through N long-lived SAC processes (default=0: one SAC process per call)',
+        action='store',
+        default=0
+    )
     mseed2sac_cmd.add_argument(
         '--maindir',
         type=str,
@@ -155,6 +162,11 @@ def main():
         help='output all and ignore station list',
         action='store_true',
     )
+    mseed2sac_cmd.add_argument(
+        '--fused',
+        help='keep each trace in memory through all processes and write one SAC file',
+        action='store_true',
+    )
     # MODULE 5: sac2ncf
     sac2ncf_cmd = commands.add_parser('sac2ncf', help='sac2ncf processes module',
     description="sac2ncf processes module.")
@@ -170,6 +182,27 @@ def main():
         help='path to the output NCF files dataset directory',
         action='store',
     )
+    sac2ncf_cmd.add_argument(
+        '--sac_pool',
+        type=int,
+        help='run SAC commands through N long-lived SAC processes (default=0: one SAC process per call)',
+        action='store',
+        default=0
+    )
+    sac2ncf_cmd.add_argument(
+        '--workers',
+        type=int,
+        help='number of events processed in parallel (default=1)',
+        action='store',
+        default=1
+    )
+    sac2ncf_cmd.add_argument(
+        '--scratch',
+        type=str,
+        help='directory for the intermediate files (default: system temporary directory)',
+        action='store',
+        default=None
+    )
     sac2ncf_cmd.add_argument(
         '--maindir',
         type=str,
@@ -182,13 +215,35 @@ def main():
         help='output all and ignore station list',
         action='store_true',
     )
+    sac2ncf_cmd.add_argument(
+        '--fused',
+        help='read each SAC file once and run all processes in memory',
+        action='store_true',
+    )
+    sac2ncf_cmd.add_argument(
+        '--station_major',
+        help='run the processes per station channel on blocks of days (2-D arrays; same outputs as --fused)',
+        action='store_true',
+    )
+    sac2ncf_cmd.add_argument(
+        '--block_size',
+        type=int,
+        help='number of days of a station channel processed at once in --station_major mode (default=30)',
+        action='store',
+        default=30
+    )
+    sac2ncf_cmd.add_argument(
+        '--force',
+        help='process all events (by default, events that are already processed with the same settings and input files are skipped)',
+        action='store_true',
+    )
     # MODULE 6: ncf2egf
     ncf2egf_cmd = commands.add_parser('ncf2egf', help='ncf2egf processes module',
     description="ncf2egf processes module.")
     ncf2egf_cmd.add_argument(
         'ncfs_dir',
         type=str,
-        help='path to the input NCF files dataset directory',
+        help='path to the input NCF files dataset directory, or an ASCII datalist of event directories',
         action='store',
     )
     ncf2egf_cmd.add_argument(
@@ -204,6 +259,37 @@ def main():
         action='store',
         default=['ZZ','TT'],
         help='cross-correlation component(s) (default: ZZ TT)')
+    ncf2egf_cmd.add_argument(
+        '--sac_pool',
+        type=int,
+        help='run SAC commands through N long-lived SAC processes (default=0: one SAC process per call)',
+        action='store',
+        default=0
+    )
+    ncf2egf_cmd.add_argument(
+        '--workers',
+        type=int,
+        help='number of station pairs stacked in parallel (default=1)',
+        action='store',
+        default=1
+    )
+    ncf2egf_cmd.add_argument(
+        '--incremental',
+        help="keep the running sums of the EGFs in '<egfs_dir>/.stacks' and on later runs only add new NCFs and subtract NCFs that are not in the input anymore (NCFs modified or deleted after they were stacked can not be subtracted: those EGFs are restacked)",
+        action='store_true',
+    )
+    ncf2egf_cmd.add_argument(
+        '--force',
+        help='with --incremental: restack all EGFs',
+        action='store_true',
+    )
+    ncf2egf_cmd.add_argument(
+        '--windows',
+        nargs='*',
+        type=str,
+        action='store',
+        default=None,
+        help="stack time-windows in one pass: 'full', 'month', 'season', and/or 'N:S' (N-day moving windows every S days); output: <egfs_dir>/<window>/")
     ncf2egf_cmd.add_argument(
         '--maindir',
         type=str,
@@ -265,13 +351,15 @@ def main():
             download.download_mseeds(args.maindir)
     # mseed2sac
     if args.command == 'mseed2sac':
-        mseed2sac.mseed2sac_run_all(args.maindir, args.mseeds_dir, args.sacs_dir, args.all)
+        mseed2sac.mseed2sac_run_all(args.maindir, args.mseeds_dir, args.sacs_dir, args.all, fused=args.fused, sac_pool=args.sac_pool)
     # sac2ncf
     if args.command == 'sac2ncf':
-        sac2ncf.sac2ncf_run_all(args.maindir, args.sacs_dir, args.ncfs_dir, args.all)
+        sac2ncf.sac2ncf_run_all(args.maindir, args.sacs_dir, args.ncfs_dir, args.all, fused=args.fused, sac_pool=args.sac_pool, workers=args.workers, scratch=args.scratch, force=args.force,
+                                station_major=args.station_major, block_size=args.block_size)
     # ncf2egf
     if args.command == 'ncf2egf':
-        ncf2egf.ncf2egf_run_all(args.maindir, args.ncfs_dir, args.egfs_dir, args.cmp)
+        ncf2egf.ncf2egf_run_all(args.maindir, args.ncfs_dir, args.egfs_dir, args.cmp, sac_pool=args.sac_pool, workers=args.workers, force=args.force,
+                                windows=args.windows, incremental=args.incremental)
     # plot
     if args.command == 'plot':
         if args.subcommand == 'stations':
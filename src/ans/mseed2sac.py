@@ -1,11 +1,14 @@
 
 import os
 import obspy
+import numpy as np
 import re
 import shutil
+import time
 from . import config
 from . import proc
 from . import download
+from . import sacio
 
 #==== MAIN FUNCTION ====#
 
@@ -13,12 +16,14 @@ regex_mseeds = re.compile('^.*[1-2][0-9][0-9][0-9][0-1][0-9][0-3][0-9]T[0-2][0-9
 regex_events = re.compile('^[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]$')
 
 
-def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
+def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True, fused=False, sac_pool=0):
     conf = config.read_config(maindir)
     SAC = conf['setting']['le_sac']
     if not os.path.isfile(SAC):
         print(f"Error! could not find SAC software in the following path:\n{SAC}")
         exit(1)
+    if sac_pool:
+        proc.start_sac_pool(SAC, size=sac_pool)
     input_mseeds_dir = os.path.abspath(input_mseeds_dir)
     output_sacs_dir = os.path.abspath(output_sacs_dir)
     if not os.path.isdir(output_sacs_dir):
@@ -29,8 +34,13 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
     stations = download.STATIONS(maindir)
     stalist = stations.read_stalist()
 
+    if fused:
+        for step in get_fused_substitutions(conf['mseed2sac']['mseed2sac_procs']):
+            print(f"Warning! In-memory mode runs a native method instead of SAC (outputs differ from the SAC chain): {step}")
+
     num_outputs = 0
     num_deleted = 0
+    step_times = {} # fused mode: total time spent in each process
     for mseed in mseeds:
         event_name = get_event_name(mseed)
         if not os.path.isdir(os.path.join(output_sacs_dir, event_name)):
@@ -41,7 +51,19 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
         if all == False and sacfile_staname not in stalist['sta']:
             continue
             
-        if not os.path.isfile(sacfile):
+        if not os.path.isfile(sacfile) and fused:
+            print(f"\nsac file: {os.path.split(sacfile)[1]}")
+            success = mseed2sac_fused_procs(mseed, sacfile, conf, maindir, step_times)
+            if success:
+                num_outputs += 1
+                for process in conf['mseed2sac']['mseed2sac_procs']:
+                    if process['pid'] == [8,1]:
+                        event_folder = os.path.join(output_sacs_dir, get_event_name(mseed))
+                        num_deleted += proc.sac_remove_extra_channels(sacs_event_dir=event_folder,
+                            similar_channels=process['le_mseed2sac_similar_channels'].split(),
+                            channels2keep=process['le_mseed2sac_channels2keep'].split())
+
+        elif not os.path.isfile(sacfile):
             print(f"\nsac file: {os.path.split(sacfile)[1]}")
             success = True
             for i, process in enumerate(conf['mseed2sac']['mseed2sac_procs']):
@@ -131,10 +153,10 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
                     elif prefilter == 1:
                         prefilter = (0.005, 0.006, 30.0, 35.0)
 
-                    st = obspy.read(sacfile, headonly=True)
-                    net = st[0].stats.network
-                    sta = st[0].stats.station
-                    chn = st[0].stats.channel
+                    sac_headers = sacio.read_header(sacfile)
+                    net = sac_headers.get('knetwk', '')
+                    sta = sac_headers.get('kstnm', '')
+                    chn = sac_headers.get('kcmpnm', '')
                     xml_fname = f"{net}.{sta}.{chn}"
                     if os.path.isfile(os.path.join(xmldir, xml_fname)):
                         xml_file = os.path.join(xmldir, xml_fname)
@@ -161,6 +183,17 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
                                         cp1=cp1, cp2=cp2, n=n, p=p,
                                         SAC=SAC)
 
+                elif success and pid == [4,2]:
+                    print(f"    Process #{i+1}: Bandpass filter (SciPy method)")
+
+                    cp1 = process['le_mseed2sac_bp_cp1']
+                    cp2 = process['le_mseed2sac_bp_cp2']
+                    n = process['sb_mseed2sac_bp_poles']
+                    p = process['sb_mseed2sac_bp_passes']
+
+                    success = proc.scipy_bandpass_filter(sacfile, sacfile,
+                                        cp1=cp1, cp2=cp2, n=n, p=p)
+
                 elif success and pid == [5,1]:
                     print(f"    Process #{i+1}: Cut seismograms")
                     try:
@@ -170,7 +203,20 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
                         print(f"    Error! Cut begin/end values are not set properly!")
                         success = False
 
-                    success = proc.sac_cut_fillz(sacfile, sacfile, cut_begin, cut_end, SAC=SAC)
+                    if success:
+                        success = proc.sac_cut_fillz(sacfile, sacfile, cut_begin, cut_end, SAC=SAC)
+
+                elif success and pid == [5,2]:
+                    print(f"    Process #{i+1}: Cut seismograms (NumPy method)")
+                    try:
+                        cut_begin = float(process['le_mseed2sac_cut_begin'])
+                        cut_end = float(process['le_mseed2sac_cut_end'])
+                    except Exception as e:
+                        print(f"    Error! Cut begin/end values are not set properly!")
+                        success = False
+
+                    if success:
+                        success = proc.numpy_cut_fillz(sacfile, sacfile, cut_begin, cut_end)
 
                 elif success and pid == [6,1]:
                     print(f"    Process #{i+1}: Detrend seismograms")
@@ -198,10 +244,10 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
                     xmldir = process['le_mseed2sac_stametadir']
                     xmldir_2 = os.path.join(maindir, 'mseeds', get_event_name(mseed))
 
-                    st = obspy.read(sacfile, headonly=True)
-                    net = st[0].stats.network
-                    sta = st[0].stats.station
-                    chn = st[0].stats.channel
+                    sac_headers = sacio.read_header(sacfile)
+                    net = sac_headers.get('knetwk', '')
+                    sta = sac_headers.get('kstnm', '')
+                    chn = sac_headers.get('kcmpnm', '')
                     xml_fname = f"{net}.{sta}.{chn}"
                     if os.path.isfile(os.path.join(xmldir, xml_fname)):
                         xml_file = os.path.join(xmldir, xml_fname)
@@ -212,7 +258,7 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
                         success = False
                         continue
 
-                    inv = obspy.read_inventory(xml_file)
+                    inv = proc.read_inventory(xml_file)
                     headers = {}
                     headers['knetwk'] = inv[0].code.split()[0]
                     headers['kstnm'] = inv[0][0].code.split()[0]
@@ -240,14 +286,159 @@ def mseed2sac_run_all(maindir, input_mseeds_dir, output_sacs_dir, all=True):
             else:
                 num_outputs += 1
 
+    if fused and len(step_times):
+        print("\nTotal time spent in each process:")
+        for step in step_times:
+            print(f"    {step}: {step_times[step]:.2f} s")
+
     print(f"\nSAC dataset: {output_sacs_dir}\nTotal number of MSEED files: {len(mseeds)}\nNumber of final output SAC files: {num_outputs - num_deleted}\n\nDone!\n")
 
     finalize_sac_directories(output_sacs_dir, mseeds)
+    proc.stop_sac_pool()
 
 
 #========================#
 
 
+def get_fused_substitutions(mseed2sac_procs):
+    # SAC processes that the fused (in-memory) chain runs with a native method
+    # OUTPUT: list of the substituted steps
+    substitutions = {(2,1): "Decimate: SAC 'decimate' >> SciPy FIR decimation",
+                     (4,1): "Bandpass filter: SAC 'bp' >> SciPy Butterworth filter"}
+    steps = []
+    for i, process in enumerate(mseed2sac_procs):
+        if tuple(process['pid']) in substitutions:
+            steps.append(f"Process #{i+1}: {substitutions[tuple(process['pid'])]}")
+    return steps
+
+
+
+def mseed2sac_fused_procs(mseed, sacfile, conf, maindir, step_times=None):
+    # run the whole 'mseed2sac_procs' chain on the merged trace in memory and write one sac file;
+    # elapsed time of each process is printed and accumulated in 'step_times'
+    if step_times is None:
+        step_times = {}
+    tr = None
+    success = True
+    for i, process in enumerate(conf['mseed2sac']['mseed2sac_procs']):
+        pid = process['pid']
+        if not success:
+            break
+        if tr is None and pid != [1,1]:
+            continue
+        t0 = time.perf_counter()
+        if pid == [1,1]:
+            step = "MSEED to SAC"
+            print(f"    Process #{i+1}: {step} (in memory)")
+            detrend_method = ['demean', 'linear', 'polynomial', 'spline'][process['cmb_mseed2sac_detrend_method']]
+            try:
+                tr = proc.mseed2trace(mseed,
+                     detrend=is_true(process['chb_mseed2sac_detrend']), detrend_method=detrend_method,
+                     detrend_order=int(process['sb_mseed2sac_detrend_order']),
+                     dspline=int(process['le_mseed2sac_dspline']),
+                     taper=is_true(process['chb_mseed2sac_taper']), taper_type='hann',
+                     taper_max_perc=float(process['dsb_mseed2sac_max_taper']))
+                tr = proc.trace_as_sac(tr)
+            except Exception as e:
+                success = False
+
+        elif pid[0] == 2:
+            step = "Decimate"
+            print(f"    Process #{i+1}: {step} (in memory{'; SciPy instead of SAC' if pid[1] == 1 else ''})")
+            final_sampling_freq = {1: 2, 2: 5, 3: 10, 4: 20}.get(process['cmb_mseed2sac_final_sf'], 1)
+            success = proc.trace_decimate(tr, final_sampling_freq, method=pid[1])
+
+        elif pid == [3,1]:
+            step = "Remove instrument response"
+            print(f"    Process #{i+1}: {step} (in memory)")
+            xmldir = process['le_mseed2sac_stametadir']
+            xmldir_2 = os.path.join(maindir, 'mseeds', get_event_name(mseed))
+            unit = ['DISP', 'VEL', 'ACC'][process['cmb_mseed2sac_resp_output']]
+            prefilter = process['cmb_mseed2sac_resp_prefilter']
+            if prefilter == 0:
+                prefilter = None
+            elif prefilter == 1:
+                prefilter = (0.005, 0.006, 30.0, 35.0)
+
+            xml_fname = f"{tr.stats.network}.{tr.stats.station}.{tr.stats.channel}"
+            if os.path.isfile(os.path.join(xmldir, xml_fname)):
+                xml_file = os.path.join(xmldir, xml_fname)
+            elif os.path.isfile(os.path.join(xmldir_2, xml_fname)):
+                xml_file = os.path.join(xmldir_2, xml_fname)
+            else:
+                print(f"    Error! Meta data was not found: {xml_fname}")
+                success = False
+                continue
+            success = proc.trace_remove_response(tr, xml_file, unit=unit, prefilter=prefilter)
+
+        elif pid[0] == 4:
+            step = "Bandpass filter"
+            print(f"    Process #{i+1}: {step} (in memory{'; SciPy instead of SAC' if pid[1] == 1 else ''})")
+            success = proc.trace_bandpass_filter(tr,
+                      cp1=process['le_mseed2sac_bp_cp1'], cp2=process['le_mseed2sac_bp_cp2'],
+                      n=process['sb_mseed2sac_bp_poles'], p=process['sb_mseed2sac_bp_passes'])
+
+        elif pid[0] == 5:
+            step = "Cut seismograms"
+            print(f"    Process #{i+1}: {step} (in memory)")
+            try:
+                cut_begin = float(process['le_mseed2sac_cut_begin'])
+                cut_end = float(process['le_mseed2sac_cut_end'])
+            except Exception as e:
+                print(f"    Error! Cut begin/end values are not set properly!")
+                success = False
+                continue
+            success = proc.trace_cut_fillz(tr, cut_begin, cut_end)
+
+        elif pid == [6,1]:
+            step = "Detrend seismograms"
+            print(f"    Process #{i+1}: {step} (in memory)")
+            detrend_method = ['demean', 'linear', 'polynomial', 'spline'][process['cmb_mseed2sac_detrend_method']]
+            success = proc.trace_detrend(tr, detrend_method=detrend_method,
+                      detrend_order=int(process['sb_mseed2sac_detrend_order']),
+                      dspline=int(process['le_mseed2sac_dspline']))
+
+        elif pid == [7,1]:
+            step = "Write SAC headers"
+            print(f"    Process #{i+1}: {step} (in memory)")
+            xmldir = process['le_mseed2sac_stametadir']
+            xmldir_2 = os.path.join(maindir, 'mseeds', get_event_name(mseed))
+            xml_fname = f"{tr.stats.network}.{tr.stats.station}.{tr.stats.channel}"
+            if os.path.isfile(os.path.join(xmldir, xml_fname)):
+                xml_file = os.path.join(xmldir, xml_fname)
+            elif os.path.isfile(os.path.join(xmldir_2, xml_fname)):
+                xml_file = os.path.join(xmldir_2, xml_fname)
+            else:
+                print(f"    Error! Meta data was not found: {xml_fname}")
+                success = False
+                continue
+            inv = proc.read_inventory(xml_file)
+            success = proc.trace_write_headers(tr, proc.get_inventory_headers(inv))
+
+        else: # remove extra channels: handled after the sac file is written
+            continue
+
+        elapsed = time.perf_counter() - t0
+        step_times[step] = step_times.get(step, 0) + elapsed
+        print(f"        elapsed time: {elapsed:.3f} s")
+
+    if success and tr is not None:
+        t0 = time.perf_counter()
+        try:
+            tr.data = tr.data.astype(np.float32)
+            tr.write(sacfile, format='SAC')
+        except Exception as e:
+            success = False
+        step_times["Write SAC file"] = step_times.get("Write SAC file", 0) + time.perf_counter() - t0
+    else:
+        success = False
+
+    if not success and os.path.isfile(sacfile):
+        os.remove(sacfile)
+    return success
+
+
+
 def generate_mseed_list(mseeds_dir):
     mseed_list = []
     if not os.path.isdir(mseeds_dir):
@@ -1,54 +1,166 @@
 import os
 import sys
 import re
+import json
 import shutil
-import subprocess
-import obspy
+import io
+import collections
+import functools
+import itertools
+import contextlib
+import multiprocessing
+import multiprocessing.util
+import concurrent.futures
+import hashlib
+import datetime
+import numpy as np
 from . import config
 from . import proc
+from . import sacio
 
 regex_events = re.compile('^[1-2][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]$')
 
 
-def ncf2egf_run_all(maindir, ncfs_dir, egfs_dir, components):
+def ncf2egf_run_all(maindir, ncfs_dir, egfs_dir, components, sac_pool=0, workers=1, prefetch=4, force=False, windows=None,
+                    incremental=False):
+    # ncfs_dir: NCF dataset directory, or an ASCII datalist of event directories (e.g. seasonal EGFs)
+    # workers: number of processes stacking pairs in parallel; prefetch: number of NCFs read ahead
+    # (in threads) while a pair is being stacked (memory per worker: one stack + prefetch NCFs)
+    # incremental=True: EGFs are updated from their running sums (see update_stack; force=True: restack all)
+    # windows: time-window definitions (see get_stack_windows); all window EGFs of a pair are stacked
+    # from one read of its NCFs and written in '<egfs_dir>/<window name>/'
     cfg = config.read_config(maindir)
     SAC = cfg['setting']['le_sac']
-    symmetrize = is_true(cfg['ncf2egf']['chb_ncf2egf_symmetrize'])
-    cut = is_true(cfg['ncf2egf']['chb_ncf2egf_cut'])
-    cut_begin = float(cfg['ncf2egf']['le_ncf2egf_cut_begin'])
-    cut_end = float(cfg['ncf2egf']['le_ncf2egf_cut_end'])
-
-    bp = is_true(cfg['ncf2egf']['chb_ncf2egf_bp'])
-    bp_cp1 = float(cfg['ncf2egf']['le_ncf2egf_bp_cp1'])
-    bp_cp2 = float(cfg['ncf2egf']['le_ncf2egf_bp_cp2'])
-    bp_poles = int(cfg['ncf2egf']['sb_ncf2egf_bp_poles'])
-    bp_passes = int(cfg['ncf2egf']['sb_ncf2egf_bp_passes'])
+    egf_params = get_egf_params(cfg)
 
     ncfs_dir = os.path.abspath(ncfs_dir)
     egfs_dir = os.path.abspath(egfs_dir)
-    if not os.path.isdir(ncfs_dir):
+    if not os.path.exists(ncfs_dir):
         print(f"Error! 'ncfs_dir' does not exist!\nncfs_dir: {ncfs_dir}\n")
         exit(1)
-    for component in components:
-        uniq_xcorr_cmp = get_uniq_xcorr_cmp(ncfs_dir, component)
-        print(f"  NCF2EGF: Component: {component}; #cross-correlations: {len(uniq_xcorr_cmp)}\n")
+    if not os.path.isdir(egfs_dir):
+        os.mkdir(egfs_dir)
+    # one walk of the NCF dataset: {xcorr: [event directories]}
+    if os.path.isfile(ncfs_dir):
+        ncf_index = get_datalist_ncf_index(ncfs_dir, maindir=maindir)
+    else:
+        ncf_index = get_ncf_index(ncfs_dir, maindir=maindir)
+    if windows:
+        event_dates = sorted(set([get_event_date(os.path.basename(event_dir))
+                                  for event_dirs in ncf_index.values() for event_dir in event_dirs]))
+        windows = get_stack_windows(windows, event_dates)
+        print(f"  NCF2EGF: #time-windows: {len(windows)}\n")
+        if not len(windows):
+            return
+    pair_args = [egfs_dir, egf_params, SAC, prefetch, force, windows, incremental]
+    if workers > 1:
+        # pairs are independent: each worker stacks whole pairs (own SAC pool) and returns its log
+        pool = multiprocessing.Pool(workers, initializer=ncf2egf_worker_init, initargs=(SAC, sac_pool))
+    elif sac_pool:
+        proc.start_sac_pool(SAC, size=sac_pool)
+    try:
+        for component in components:
+            uniq_xcorr_cmp = get_uniq_xcorr_cmp(ncf_index, component)
+            print(f"  NCF2EGF: Component: {component}; #cross-correlations: {len(uniq_xcorr_cmp)}\n")
+            pairs = [[xcorr, ncf_index[xcorr]] for xcorr in uniq_xcorr_cmp]
+            # EGFs of pairs that are not in the dataset anymore are emptied (and removed)
+            if incremental and not windows:
+                pairs += [[xcorr, []] for xcorr in get_uniq_xcorr_cmp(get_stack_states(egfs_dir), component)
+                          if xcorr not in ncf_index]
+            if workers > 1:
+                chunksize = max(1, len(pairs) // (workers * 16))
+                for log in pool.imap(functools.partial(ncf2egf_pair_log, pair_args=pair_args), pairs, chunksize=chunksize):
+                    print(log, end='')
+            else:
+                for pair in pairs:
+                    ncf2egf_pair(pair, *pair_args)
+        if workers > 1:
+            pool.close()
+            pool.join()
+    except BaseException:
+        if workers > 1:
+            pool.terminate()
+        raise
+    proc.stop_sac_pool()
+
+
+
+def get_egf_params(cfg):
+    # EGF post-processing parameters
+    egf_params = {}
+    egf_params['symmetrize'] = is_true(cfg['ncf2egf']['chb_ncf2egf_symmetrize'])
+    egf_params['cut'] = is_true(cfg['ncf2egf']['chb_ncf2egf_cut'])
+    egf_params['cut_begin'] = float(cfg['ncf2egf']['le_ncf2egf_cut_begin'])
+    egf_params['cut_end'] = float(cfg['ncf2egf']['le_ncf2egf_cut_end'])
+    egf_params['bp'] = is_true(cfg['ncf2egf']['chb_ncf2egf_bp'])
+    egf_params['bp_cp1'] = float(cfg['ncf2egf']['le_ncf2egf_bp_cp1'])
+    egf_params['bp_cp2'] = float(cfg['ncf2egf']['le_ncf2egf_bp_cp2'])
+    egf_params['bp_poles'] = int(cfg['ncf2egf']['sb_ncf2egf_bp_poles'])
+    egf_params['bp_passes'] = int(cfg['ncf2egf']['sb_ncf2egf_bp_passes'])
+    egf_params['bp_method'] = int(cfg['ncf2egf']['cmb_ncf2egf_bp_method'])
+    return egf_params
+
+
 
-        for xcorr in uniq_xcorr_cmp:
-            stacking(ncfs_dir, egfs_dir, xcorr, SAC=SAC)
+def ncf2egf_pair(pair, egfs_dir, egf_params, SAC='/usr/local/sac/bin/sac', prefetch=0, force=False, windows=None,
+                 incremental=False):
+    # INPUT: [xcorr, [event directories]]; stack and post-process one EGF (incremental: only if the stack
+    # has changed) or, if 'windows' is given, all time-window EGFs of the pair
+    xcorr, event_dirs = pair
+    if windows:
+        for window_dir in stack_windows(egfs_dir, xcorr, event_dirs, windows, prefetch=prefetch):
+            egf_postprocess(window_dir, xcorr, egf_params, SAC=SAC)
+        return
+    if incremental:
+        egf_hash = hashlib.sha1(json.dumps(egf_params, sort_keys=True).encode()).hexdigest()
+        nstacked, updated = update_stack(egfs_dir, xcorr, event_dirs, prefetch=prefetch, egf_hash=egf_hash, force=force)
+        if not updated:
+            return
+    elif not stacking(egfs_dir, xcorr, event_dirs, prefetch=prefetch):
+        return
+    egf_postprocess(egfs_dir, xcorr, egf_params, SAC=SAC)
 
-            if symmetrize:
-                symmetrize_sac(egfs_dir,egfs_dir,xcorr, SAC=SAC)
 
-            if cut:
-                sacfile = os.path.join(egfs_dir,xcorr)
-                proc.sac_cut_fillz(sacfile, sacfile, cut_begin, cut_end, SAC=SAC)
 
-            if bp:
-                sacfile = os.path.join(egfs_dir,xcorr)
-                proc.sac_bandpass_filter(sacfile, sacfile,
-                                         bp_cp1, bp_cp2,
-                                         n=bp_poles, p=bp_passes,
-                                         SAC=SAC)
+def egf_postprocess(egfs_dir, xcorr, egf_params, SAC='/usr/local/sac/bin/sac'):
+    if egf_params['symmetrize']:
+        symmetrize_sac(egfs_dir,egfs_dir,xcorr, SAC=SAC)
+
+    if egf_params['cut']:
+        sacfile = os.path.join(egfs_dir,xcorr)
+        proc.sac_cut_fillz(sacfile, sacfile, egf_params['cut_begin'], egf_params['cut_end'], SAC=SAC)
+
+    if egf_params['bp']:
+        sacfile = os.path.join(egfs_dir,xcorr)
+        if egf_params['bp_method'] == 1:
+            proc.scipy_bandpass_filter(sacfile, sacfile,
+                                       egf_params['bp_cp1'], egf_params['bp_cp2'],
+                                       n=egf_params['bp_poles'], p=egf_params['bp_passes'])
+        else:
+            proc.sac_bandpass_filter(sacfile, sacfile,
+                                     egf_params['bp_cp1'], egf_params['bp_cp2'],
+                                     n=egf_params['bp_poles'], p=egf_params['bp_passes'],
+                                     SAC=SAC)
+
+
+
+def ncf2egf_worker_init(SAC, sac_pool):
+    if sac_pool:
+        proc.start_sac_pool(SAC, size=sac_pool)
+        # close the worker's SAC processes when the pool is closed
+        multiprocessing.util.Finalize(None, proc.stop_sac_pool, exitpriority=10)
+
+
+
+def ncf2egf_pair_log(pair, pair_args):
+    # run ncf2egf_pair() and capture its printed log
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            ncf2egf_pair(pair, *pair_args)
+        except Exception as e:
+            print(f"Error! Stacking '{pair[0]}' failed: {e}")
+    return log.getvalue()
 
 
 #################################################
@@ -56,84 +168,438 @@ def ncf2egf_run_all(maindir, ncfs_dir, egfs_dir, components):
 def symmetrize_sac(inputDataset,outputDataset,sacfile, SAC):
     input_fn=os.path.join(inputDataset,sacfile)
     output_fn=os.path.join(outputDataset,sacfile)
-    shell_cmd=["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-    shell_cmd.append(f"r {input_fn}")
-    shell_cmd.append("reverse")
-    shell_cmd.append(f"addf {input_fn}")
-    shell_cmd.append("div 2")
-    shell_cmd.append(f"w {output_fn}")
-    shell_cmd.append(f"r {output_fn}")
-    shell_cmd.append("w over")
-    shell_cmd.append('quit')
-    shell_cmd.append('EOF')
-    shell_cmd = '\n'.join(shell_cmd)
-    subprocess.call(shell_cmd,shell=True)
-
-
-def get_uniq_xcorr_cmp(ncfs_dir, component):
+    sac_cmd = []
+    sac_cmd.append(f"r {input_fn}")
+    sac_cmd.append("reverse")
+    sac_cmd.append(f"addf {input_fn}")
+    sac_cmd.append("div 2")
+    sac_cmd.append(f"w {output_fn}")
+    sac_cmd.append(f"r {output_fn}")
+    sac_cmd.append("w over")
+    proc.run_sac(sac_cmd, SAC=SAC)
+
+
+def get_uniq_xcorr_cmp(ncf_index, component):
+    # INPUT: NCF index (see get_ncf_index) or any {xcorr: ...} dictionary, cross-correlation component
     regex_xcorr = re.compile(f'^.*\_.*\.({component})$')
-    uniq_xcorr_cmp = []
-    for d in os.listdir(ncfs_dir):
-        if regex_events.match(d) and os.path.isdir(os.path.join(ncfs_dir,d)):
-            for x in os.listdir(os.path.join(ncfs_dir, d)):
-                if regex_xcorr.match(x) and x not in uniq_xcorr_cmp:
-                    uniq_xcorr_cmp.append(x)
-    return uniq_xcorr_cmp
-
-def get_stack_headers(ncfs_dir, xcorr):
+    return sorted([x for x in ncf_index if regex_xcorr.match(x)])
+
+
+
+def get_ncf_index(ncfs_dir, maindir=None, events=None):
+    # OUTPUT: {xcorr file name: [event directories (sorted)]} from one walk of the NCF dataset
+    # (events: list of event names to include; None: all events)
+    # The event listings are kept in '<maindir>/.ans/ncf2egf_index.json' with the event directory
+    # mtimes, so later runs only list new or changed event directories (maindir=None: no index file)
+    index_file = None
+    listings = {}
+    if maindir is not None:
+        index_file = os.path.join(maindir, '.ans', 'ncf2egf_index.json')
+        try:
+            with open(index_file, 'r') as fopen:
+                listings = json.load(fopen).get(ncfs_dir, {})
+        except Exception as e:
+            listings = {}
+
+    event_listings = {} # {event: [mtime_ns, [xcorr file names]]}
+    nlisted = 0
+    with os.scandir(ncfs_dir) as entries:
+        for entry in entries:
+            if not (regex_events.match(entry.name) and entry.is_dir()):
+                continue
+            mtime = entry.stat().st_mtime_ns
+            if entry.name in listings and listings[entry.name][0] == mtime:
+                event_listings[entry.name] = listings[entry.name]
+            else:
+                event_listings[entry.name] = [mtime, sorted(os.listdir(entry.path))]
+                nlisted += 1
+    print(f"  NCF index: {len(event_listings)} event directories ({nlisted} listed)\n")
+
+    if index_file is not None and (nlisted or len(event_listings) != len(listings)):
+        write_ncf_index(index_file, ncfs_dir, event_listings)
+
+    ncf_index = {}
+    for event in sorted(event_listings):
+        if events is not None and event not in events:
+            continue
+        for x in event_listings[event][1]:
+            ncf_index.setdefault(x, []).append(os.path.join(ncfs_dir, event))
+    return ncf_index
+
+
+
+def get_datalist_ncf_index(datalist, maindir=None):
+    # INPUT: ASCII datalist (one column: paths to event directories)
+    # OUTPUT: {xcorr file name: [event directories (sorted by event)]}
+    datasets = {} # {NCF dataset directory: [events]}
+    with open(datalist, 'r') as fopen:
+        for line in fopen.read().splitlines():
+            if not len(line.strip()):
+                continue
+            event_dir = os.path.abspath(line.strip())
+            event = os.path.basename(event_dir)
+            if not (regex_events.match(event) and os.path.isdir(event_dir)):
+                print(f"  Warning! Not an event directory: {line.strip()}")
+                continue
+            datasets.setdefault(os.path.dirname(event_dir), []).append(event)
+    ncf_index = {}
+    for ncfs_dir, events in datasets.items():
+        for x, event_dirs in get_ncf_index(ncfs_dir, maindir=maindir, events=set(events)).items():
+            ncf_index.setdefault(x, []).extend(event_dirs)
+    for x in ncf_index:
+        ncf_index[x].sort(key=os.path.basename)
+    return ncf_index
+
+
+
+def write_ncf_index(index_file, ncfs_dir, event_listings):
+    # one entry per NCF dataset; the file is replaced atomically
+    if not os.path.isdir(os.path.dirname(index_file)):
+        os.mkdir(os.path.dirname(index_file))
+    try:
+        with open(index_file, 'r') as fopen:
+            index = json.load(fopen)
+    except Exception as e:
+        index = {}
+    index[ncfs_dir] = event_listings
+    with open(f"{index_file}.tmp", 'w') as fopen:
+        json.dump(index, fopen)
+    os.replace(f"{index_file}.tmp", index_file)
+
+def get_ncf_headers(sac_headers):
+    # stack headers from the sac headers of an NCF
     stack_headers = {}
-    for d in os.listdir(ncfs_dir):
-        if regex_events.match(d) and os.path.isdir(os.path.join(ncfs_dir,d)):
-            if os.path.isfile(os.path.join(ncfs_dir, d, xcorr)):
-                st = obspy.read(os.path.join(ncfs_dir, d, xcorr), format="SAC", headonly=True)
-                stack_headers['delta'] = float(st[0].stats.sac.delta)
-                stack_headers['npts'] = float(st[0].stats.sac.npts)
-                stack_headers['b'] = float(st[0].stats.sac.b)
-                stack_headers['kstnm'] = str(st[0].stats.sac.kstnm)
-                stack_headers['stla'] = float(st[0].stats.sac.stla)
-                stack_headers['stlo'] = float(st[0].stats.sac.stlo)
-                stack_headers['stel'] = float(st[0].stats.sac.stel)
-                stack_headers['evla'] = float(st[0].stats.sac.evla)
-                stack_headers['evlo'] = float(st[0].stats.sac.evlo)
-                stack_headers['evel'] = float(st[0].stats.sac.evel)
-                stack_headers['kcmpnm'] = str(st[0].stats.sac.kcmpnm)
-                stack_headers['knetwk'] = str(st[0].stats.sac.knetwk)
-                return stack_headers
+    stack_headers['delta'] = float(sac_headers['delta'])
+    stack_headers['npts'] = int(sac_headers['npts'])
+    stack_headers['b'] = float(sac_headers['b'])
+    stack_headers['kstnm'] = str(sac_headers['kstnm'])
+    stack_headers['stla'] = float(sac_headers['stla'])
+    stack_headers['stlo'] = float(sac_headers['stlo'])
+    stack_headers['stel'] = float(sac_headers['stel'])
+    stack_headers['evla'] = float(sac_headers['evla'])
+    stack_headers['evlo'] = float(sac_headers['evlo'])
+    stack_headers['evel'] = float(sac_headers['evel'])
+    stack_headers['kcmpnm'] = str(sac_headers['kcmpnm'])
+    stack_headers['knetwk'] = str(sac_headers['knetwk'])
     return stack_headers
 
 
 
-def stacking(ncfs_dir, egfs_dir, xcorr, SAC='/usr/local/sac/bin/sac'):
-    if not os.path.isdir(egfs_dir):
-        os.mkdir(egfs_dir)
-    xcorrFolders = []
-    for d in os.listdir(ncfs_dir):
-        if regex_events.match(d) and os.path.isdir(os.path.join(ncfs_dir,d)):
-            xcorrFolders.append(d)
-    stack_headers = get_stack_headers(ncfs_dir, xcorr)
-
-    nStacked = 0
-    shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-    shell_cmd.append(f"fg line 0 0 delta 1 npts {stack_headers['npts']} begin {stack_headers['b']}")
-    for xcorrFolder in xcorrFolders:
-        if xcorr in os.listdir(os.path.join(ncfs_dir, xcorrFolder)):
-            nStacked += 1
-            fn = os.path.join(ncfs_dir, xcorrFolder, xcorr)
-            shell_cmd.append(f"addf {fn}")
-    shell_cmd.append(f'w {os.path.join(egfs_dir,xcorr)}')
-    shell_cmd.append(f"q")
-    shell_cmd.append('EOF')
-    shell_cmd = '\n'.join(shell_cmd)
-    subprocess.call(shell_cmd, shell=True)
-    # write headers
-    xcorrnm = int(nStacked)
-    stack_headers['kevnm'] = xcorrnm
-    del stack_headers['npts']
-    # write sac headers
-    proc.write_sac_headers(os.path.join(egfs_dir,xcorr), stack_headers, SAC=SAC)
+def is_stackable(stack_headers, sac_headers):
+    # same npts, delta, and begin time (to within a small fraction of a sample) as the stack
+    delta = stack_headers['delta']
+    return int(sac_headers['npts']) == stack_headers['npts'] \
+        and abs(float(sac_headers['delta']) - delta) <= 1e-6 * delta \
+        and abs(float(sac_headers['b']) - stack_headers['b']) <= 0.01 * delta
+
+
+
+def stacking(egfs_dir, xcorr, event_dirs, prefetch=0):
+    # full stack: the daily NCFs are streamed into a float64 accumulator and the stack is written once
+    # with its headers (kevnm: number of stacked NCFs); see stack_ncfs()
+    # event_dirs: event directories that have 'xcorr' (see get_ncf_index)
+    ncf_files = [os.path.join(event_dir, xcorr) for event_dir in event_dirs]
+    stack, stack_headers, stacked, skipped = stack_ncfs(ncf_files, prefetch=prefetch)
+    nStacked = len(stacked)
+    if nStacked:
+        stack_headers['kevnm'] = str(nStacked)
+        sacio.write_sac(os.path.join(egfs_dir,xcorr), stack_headers, stack)
+        # a running sum of an earlier incremental run does not match this EGF anymore
+        state_file = os.path.join(egfs_dir, '.stacks', f"{xcorr}.npz")
+        if os.path.isfile(state_file):
+            os.remove(state_file)
     return nStacked
 
 
+
+def stack_ncfs(ncf_files, prefetch=0, stack=None, stack_headers=None, sign=1):
+    # INPUTS: NCF files, running stack (float64) and its headers (None: new stack from the first NCF),
+    #         sign: 1 add, -1 subtract the NCFs
+    # OUTPUT: stack, stack headers, added/subtracted NCFs, skipped NCFs (npts, delta, or b do not match)
+    # One NCF is in memory at a time (plus up to 'prefetch' NCFs that are read ahead in threads)
+    stacked = []
+    skipped = []
+    for fn, ncf in read_ncfs(ncf_files, prefetch=prefetch):
+        try:
+            sac_headers, data = ncf.result()
+            if stack is None:
+                stack_headers = get_ncf_headers(sac_headers)
+                stack = np.zeros(stack_headers['npts'], dtype=np.float64)
+            elif not is_stackable(stack_headers, sac_headers):
+                print(f"    Warning! NCF does not match the stack (npts, delta, or b) and is skipped: {fn}")
+                skipped.append(fn)
+                continue
+            if sign > 0:
+                stack += data
+            else:
+                stack -= data
+            stacked.append(fn)
+            del data
+        except Exception as e:
+            print(f"    Error! Could not read NCF: {fn}")
+    return stack, stack_headers, stacked, skipped
+
+
+
+def get_event_date(event):
+    # INPUT: event name (YYJJJHHMMSS); OUTPUT: datetime.date
+    return datetime.datetime.strptime(event[0:5], '%y%j').date()
+
+
+
+def get_stack_windows(window_defs, event_dates):
+    # INPUTS: time-window definitions, sorted event dates
+    #   'full': all days; 'month': calendar months; 'season': DJF (December counts towards the next year), MAM, JJA, SON;
+    #   'N:S' (e.g. '30:10'): N-day moving windows every S days (S defaults to N) from the first day
+    # OUTPUT: [[window name, first day, last day + 1]] (days: date ordinals)
+    windows = []
+    if not len(event_dates):
+        return windows
+    day0 = event_dates[0].toordinal()
+    ndays = event_dates[-1].toordinal() - day0 + 1
+    dates = [event_dates[0] + datetime.timedelta(days=i) for i in range(ndays)]
+    seasons = {12: 'DJF', 1: 'DJF', 2: 'DJF', 3: 'MAM', 4: 'MAM', 5: 'MAM',
+               6: 'JJA', 7: 'JJA', 8: 'JJA', 9: 'SON', 10: 'SON', 11: 'SON'}
+    for window_def in window_defs:
+        if window_def == 'full':
+            windows.append(['full', day0, day0 + ndays])
+        elif window_def in ['month', 'season']:
+            names = []
+            for date in dates:
+                if window_def == 'month':
+                    names.append(f"{date.year}-{date.month:02d}")
+                else:
+                    names.append(f"{date.year + (date.month == 12)}-{seasons[date.month]}")
+            # calendar months and seasons are runs of consecutive days
+            i0 = 0
+            for i in range(1, ndays + 1):
+                if i == ndays or names[i] != names[i0]:
+                    windows.append([names[i0], day0 + i0, day0 + i])
+                    i0 = i
+        else:
+            try:
+                window_def = window_def.split(':')
+                length = int(window_def[0])
+                step = int(window_def[1]) if len(window_def) > 1 else length
+                if length < 1 or step < 1:
+                    raise ValueError
+            except Exception as e:
+                print(f"Error! Time-window definition is not valid: {':'.join(window_def)}\n")
+                exit(1)
+            for i0 in range(0, ndays - length + 1, step):
+                windows.append([f"{length}d_{dates[i0].strftime('%Y%m%d')}", day0 + i0, day0 + i0 + length])
+    return windows
+
+
+
+def stack_windows(egfs_dir, xcorr, event_dirs, windows, prefetch=0):
+    # the NCFs of a pair are read once, in day order, into a running sum (prefix sum over days) that is
+    # kept only at the window starts that are still needed; the stack of a window is then the difference
+    # of two prefix sums (O(1) per window; memory: #open windows x npts) and is written as soon as the
+    # window closes in '<egfs_dir>/<window name>/<xcorr>' (kevnm: number of stacked NCFs)
+    # NCFs that do not match the first NCF's npts, delta, and b are skipped; windows without NCFs are skipped
+    # OUTPUT: window directories with a new EGF
+    first_day = min([window[1] for window in windows])
+    last_day = max([window[2] for window in windows])
+    ncf_files = []
+    ncf_days = {}
+    for event_dir in sorted(event_dirs, key=os.path.basename):
+        iday = get_event_date(os.path.basename(event_dir)).toordinal()
+        if first_day <= iday < last_day:
+            ncf_files.append(os.path.join(event_dir, xcorr))
+            ncf_days[ncf_files[-1]] = iday
+    window_ends = {} # {window start: last window end}
+    closing_windows = {} # {window end: [[window name, window start]]}
+    for window_name, window_start, window_end in windows:
+        window_ends[window_start] = max(window_ends.get(window_start, window_start), window_end)
+        closing_windows.setdefault(window_end, []).append([window_name, window_start])
+    boundaries = sorted(set(window_ends) | set(closing_windows))
+
+    prefix_sums = {} # {window start: [running sum (None: zeros), count]}
+    running_sum = None
+    count = 0
+    stack_headers = {}
+    window_dirs = []
+    ib = 0
+    for fn, ncf in itertools.chain(read_ncfs(ncf_files, prefetch=prefetch), [[None, None]]):
+        day = last_day if fn is None else ncf_days[fn]
+        # boundaries before this day: the running sum has all the NCFs before them
+        while ib < len(boundaries) and boundaries[ib] <= day:
+            boundary = boundaries[ib]
+            ib += 1
+            for window_name, window_start in closing_windows.get(boundary, []):
+                start_sum, start_count = prefix_sums[window_start]
+                nstacked = count - start_count
+                if not nstacked:
+                    continue
+                window_dir = os.path.join(egfs_dir, window_name)
+                os.makedirs(window_dir, exist_ok=True)
+                stack_headers['kevnm'] = str(nstacked)
+                stack = running_sum if start_sum is None else running_sum - start_sum
+                sacio.write_sac(os.path.join(window_dir, xcorr), stack_headers, stack)
+                window_dirs.append(window_dir)
+            # prefix sums of the windows that are all closed are dropped
+            for window_start in [s for s in prefix_sums if window_ends[s] <= boundary]:
+                del prefix_sums[window_start]
+            if boundary in window_ends and window_ends[boundary] > boundary:
+                prefix_sums[boundary] = [None if running_sum is None else running_sum.copy(), count]
+        if fn is None:
+            break
+        try:
+            sac_headers, data = ncf.result()
+            if running_sum is None:
+                stack_headers = get_ncf_headers(sac_headers)
+                running_sum = np.zeros(stack_headers['npts'], dtype=np.float64)
+            elif not is_stackable(stack_headers, sac_headers):
+                print(f"    Warning! NCF does not match the stack (npts, delta, or b) and is skipped: {fn}")
+                continue
+            running_sum += data
+            count += 1
+            del data
+        except Exception as e:
+            print(f"    Error! Could not read NCF: {fn}")
+    return window_dirs
+
+
+
+def get_ncf_stamp(ncf_file):
+    # OUTPUT: [size, mtime_ns] of an NCF file (None if it does not exist)
+    try:
+        stat = os.stat(ncf_file)
+        return [stat.st_size, stat.st_mtime_ns]
+    except Exception as e:
+        return None
+
+
+
+def get_stack_states(egfs_dir):
+    # OUTPUT: {xcorr: running sum file} in '<egfs_dir>/.stacks'
+    states_dir = os.path.join(egfs_dir, '.stacks')
+    if not os.path.isdir(states_dir):
+        return {}
+    return {os.path.splitext(f)[0]: os.path.join(states_dir, f) for f in os.listdir(states_dir) if f.endswith('.npz')}
+
+
+
+def read_stack_state(state_file):
+    # OUTPUT: {'stack', 'headers', 'ncfs' ({NCF: stamp}), 'skipped' ({NCF: stamp}), 'egf_hash'} or None
+    try:
+        with np.load(state_file, allow_pickle=False) as npz:
+            return {'stack': np.array(npz['stack'], dtype=np.float64),
+                    'headers': json.loads(str(npz['headers'])),
+                    'ncfs': json.loads(str(npz['ncfs'])),
+                    'skipped': json.loads(str(npz['skipped'])),
+                    'egf_hash': str(npz['egf_hash'])}
+    except Exception as e:
+        return None
+
+
+
+def write_stack_state(state_file, state):
+    # the state is replaced atomically
+    if not os.path.isdir(os.path.dirname(state_file)):
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    with open(f"{state_file}.tmp", 'wb') as fopen:
+        np.savez(fopen, stack=state['stack'], headers=json.dumps(state['headers']),
+                 ncfs=json.dumps(state['ncfs']), skipped=json.dumps(state['skipped']),
+                 egf_hash=state['egf_hash'])
+    os.replace(f"{state_file}.tmp", state_file)
+
+
+
+def update_stack(egfs_dir, xcorr, event_dirs, prefetch=0, egf_hash='', force=False):
+    # incremental stacking: the running (float64) sum of every EGF is kept in '<egfs_dir>/.stacks/<xcorr>.npz'
+    # with the NCFs (size, mtime) it includes. NCFs that are new are added and NCFs that are not in
+    # event_dirs anymore (e.g. days left out of a datalist) are read again and subtracted.
+    # Limitation: the data of the stacked NCFs are not kept, so NCFs that were modified or deleted after
+    # they were stacked can not be subtracted and the EGF is restacked (reported in the log).
+    # egf_hash: hash of the EGF post-processing parameters
+    # OUTPUT: number of stacked NCFs, True if the EGF file was (re)written
+    state_file = os.path.join(egfs_dir, '.stacks', f"{xcorr}.npz")
+    egf_file = os.path.join(egfs_dir, xcorr)
+    ncfs = {} # {NCF: stamp}
+    for event_dir in event_dirs:
+        ncf_file = os.path.join(event_dir, xcorr)
+        stamp = get_ncf_stamp(ncf_file)
+        if stamp is not None:
+            ncfs[ncf_file] = stamp
+
+    if not len(ncfs):
+        # no NCFs left: the pair is not in the dataset anymore
+        for f in [egf_file, state_file]:
+            if os.path.isfile(f):
+                os.remove(f)
+        return 0, False
+    state = None if force else read_stack_state(state_file)
+    if state is not None:
+        removed = [fn for fn in state['ncfs'] if fn not in ncfs]
+        modified = [fn for fn in state['ncfs'] if fn in ncfs and ncfs[fn] != state['ncfs'][fn]]
+        deleted = [fn for fn in removed if get_ncf_stamp(fn) != state['ncfs'][fn]]
+        if len(modified) or len(deleted):
+            print(f"    {xcorr}: {len(modified)} stacked NCFs were modified and {len(deleted)} were deleted; "
+                  f"they can not be subtracted, restacking")
+            state = None
+    if state is None:
+        state = {'stack': None, 'headers': None, 'ncfs': {}, 'skipped': {}, 'egf_hash': ''}
+        removed = []
+    added = [fn for fn in ncfs if fn not in state['ncfs'] and state['skipped'].get(fn) != ncfs[fn]]
+    state['skipped'] = {fn: stamp for fn, stamp in state['skipped'].items() if ncfs.get(fn) == stamp}
+
+    if not len(added) and not len(removed) and state['egf_hash'] == egf_hash and os.path.isfile(egf_file):
+        return len(state['ncfs']), False
+    if len(removed):
+        state['stack'], state['headers'], subtracted, _ = stack_ncfs(removed, prefetch=prefetch,
+            stack=state['stack'], stack_headers=state['headers'], sign=-1)
+        for fn in subtracted:
+            del state['ncfs'][fn]
+        if len(subtracted) != len(removed):
+            print(f"    {xcorr}: {len(removed) - len(subtracted)} NCFs could not be subtracted; restacking")
+            return update_stack(egfs_dir, xcorr, event_dirs, prefetch=prefetch, egf_hash=egf_hash, force=True)
+    if len(added):
+        state['stack'], state['headers'], stacked, skipped = stack_ncfs(added, prefetch=prefetch,
+            stack=state['stack'], stack_headers=state['headers'])
+        for fn in stacked:
+            state['ncfs'][fn] = ncfs[fn]
+        for fn in skipped:
+            state['skipped'][fn] = ncfs[fn]
+
+    nstacked = len(state['ncfs'])
+    if not nstacked:
+        for f in [egf_file, state_file]:
+            if os.path.isfile(f):
+                os.remove(f)
+        return 0, False
+    state['egf_hash'] = egf_hash
+    write_stack_state(state_file, state)
+    stack_headers = dict(state['headers'])
+    stack_headers['kevnm'] = str(nstacked)
+    sacio.write_sac(egf_file, stack_headers, state['stack'])
+    return nstacked, True
+
+
+def read_ncfs(ncf_files, prefetch=0):
+    # OUTPUT: generator of (NCF file, future of sacio.load_sac(NCF file)) in input order;
+    #         prefetch > 0: up to 'prefetch' files are read ahead in a thread pool
+    if prefetch < 1:
+        for fn in ncf_files:
+            ncf = concurrent.futures.Future()
+            try:
+                ncf.set_result(sacio.load_sac(fn))
+            except Exception as e:
+                ncf.set_exception(e)
+            yield fn, ncf
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=prefetch) as executor:
+        queue = collections.deque()
+        for fn in ncf_files:
+            queue.append((fn, executor.submit(sacio.load_sac, fn)))
+            if len(queue) > prefetch:
+                yield queue.popleft()
+        while len(queue):
+            yield queue.popleft()
+
+
+
 def is_true(value):
     value = int(value)
     if value < 1:
@@ -3,8 +3,55 @@
 import os
 import sys
 import obspy
+import functools
 import numpy as np
 import subprocess
+from scipy import signal
+from scipy.fft import next_fast_len
+from obspy.io.sac import SACTrace
+from obspy.signal.util import _npts2nfft
+from . import sacio
+from . import sacpool
+
+
+#==== SAC execution ====#
+# SAC commands run either through a pool of long-lived SAC processes (see sacpool.py),
+# or as before, in a new shell + SAC process for every call
+
+sac_pool = None
+
+def start_sac_pool(SAC='/usr/local/sac/bin/sac', size=1):
+    global sac_pool
+    if sac_pool is None:
+        sac_pool = sacpool.SACPool(SAC, size=size)
+    return sac_pool
+
+
+
+def stop_sac_pool():
+    global sac_pool
+    if sac_pool is not None:
+        print(f"\n{sac_pool.report()}\n")
+        sac_pool.close()
+        sac_pool = None
+
+
+
+def run_sac(sac_cmd, SAC='/usr/local/sac/bin/sac'):
+    # INPUT: list of SAC commands (without 'quit')
+    # OUTPUT: False if SAC reported an error
+    if sac_pool is not None:
+        return sac_pool.run(sac_cmd)
+    shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
+    shell_cmd += sac_cmd
+    shell_cmd.append('quit')
+    shell_cmd.append('EOF')
+    shell_cmd = '\n'.join(shell_cmd)
+    output = subprocess.run(shell_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True, errors='replace').stdout
+    print(output, end='')
+    return 'ERROR' not in output.upper()
+
 
 
 def mseed2sac(input_mseed_file, output_sac_file,
@@ -13,70 +60,10 @@ def mseed2sac(input_mseed_file, output_sac_file,
     SAC='/usr/local/sac/bin/sac'):
     
     try:
-        st = obspy.read(input_mseed_file, format="MSEED")
-
-        # start handling data fragmentation issue
-        st.sort(['starttime'])
-        
-        data_starttime = obspy.UTCDateTime(st[0].stats.starttime)
-        data_endtime = obspy.UTCDateTime(st[-1].stats.endtime)
-        request_starttime = obspy.UTCDateTime(os.path.split(input_mseed_file)[1].split('_')[2]) # obspy.UTCDateTime()
-        request_endtime = obspy.UTCDateTime(os.path.split(input_mseed_file)[1].split('_')[4].split('.')[0]) # obspy.UTCDateTime()
-        request_length = int(request_endtime - request_starttime)
-        begin_data = int(data_starttime.hour*3600 +
-                         data_starttime.minute*60 +
-                         data_starttime.second)
-        begin_request = int(request_starttime.hour*3600 +
-                            request_starttime.minute*60 +
-                            request_starttime.second)
-
-        if detrend:
-            if detrend_method == 'spline':
-                try:
-                    st.detrend(detrend_method, order=detrend_order, dspline=dspline)
-                except:
-                    st.detrend('demean')
-            elif detrend_method == 'polynomial':
-                try:
-                    st.detrend(detrend_method, order=detrend_order)
-                except:
-                    st.detrend('demean')
-            else:
-                st.detrend(detrend_method)
-
-        if taper:
-            st.taper(taper_max_perc)
-
-        if len(st) > 1:# fix data fragmentation issue
-            st.merge(method=1, fill_value=0)
-
-        
-        # set sac begin time and write to file
-        st[0].stats.sac = obspy.core.AttribDict()
-        st[0].stats.sac.b = begin_data
-        st[0].stats.sac.iztype = 9
-        st[0].stats.sac.lovrok = True
-        st[0].stats.sac.lcalda = True
-        st[0].write(output_sac_file, format='SAC')
-        
-        # cut to correct b to e and fill with zeros
-        shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-        shell_cmd.append(f"cuterr fillz")
-        shell_cmd.append(f"cut {begin_request} {begin_request + request_length}")
-        shell_cmd.append(f"r {output_sac_file}")
-        shell_cmd.append(f"w over")
-        shell_cmd.append(f"q")
-        shell_cmd.append('EOF')
-        shell_cmd = '\n'.join(shell_cmd)
-        subprocess.call(shell_cmd, shell=True)
-
-        # reload sac file, set sac begin time to zero, correct sac kztime, and write to file
-        st = obspy.read(output_sac_file, format='SAC')
-        st[0].stats.sac = obspy.core.AttribDict()
-        st[0].stats.sac.b = 0
-        st[0].stats.starttime = request_starttime
-        st[0].write(output_sac_file, format='SAC')
-
+        tr = mseed2trace(input_mseed_file,
+             detrend=detrend, detrend_method=detrend_method, detrend_order=detrend_order, dspline=dspline,
+             taper=taper, taper_type=taper_type, taper_max_perc=taper_max_perc)
+        tr.write(output_sac_file, format='SAC')
         return True
     
     except Exception as e:
@@ -84,6 +71,68 @@ def mseed2sac(input_mseed_file, output_sac_file,
 
 
 
+def mseed2trace(input_mseed_file,
+    detrend=True, detrend_method='spline', detrend_order=4, dspline=86400,
+    taper=True, taper_type='hann', taper_max_perc=0.050):
+    # merged, detrended, tapered, and cut (to the requested time range) trace of an mseed file;
+    # sac begin time is set to zero and kztime to the request start time
+    st = obspy.read(input_mseed_file, format="MSEED")
+
+    # start handling data fragmentation issue
+    st.sort(['starttime'])
+    
+    data_starttime = obspy.UTCDateTime(st[0].stats.starttime)
+    data_endtime = obspy.UTCDateTime(st[-1].stats.endtime)
+    request_starttime = obspy.UTCDateTime(os.path.split(input_mseed_file)[1].split('_')[2]) # obspy.UTCDateTime()
+    request_endtime = obspy.UTCDateTime(os.path.split(input_mseed_file)[1].split('_')[4].split('.')[0]) # obspy.UTCDateTime()
+    request_length = int(request_endtime - request_starttime)
+    begin_data = int(data_starttime.hour*3600 +
+                     data_starttime.minute*60 +
+                     data_starttime.second)
+    begin_request = int(request_starttime.hour*3600 +
+                        request_starttime.minute*60 +
+                        request_starttime.second)
+
+    if detrend:
+        if detrend_method == 'spline':
+            try:
+                st.detrend(detrend_method, order=detrend_order, dspline=dspline)
+            except:
+                st.detrend('demean')
+        elif detrend_method == 'polynomial':
+            try:
+                st.detrend(detrend_method, order=detrend_order)
+            except:
+                st.detrend('demean')
+        else:
+            st.detrend(detrend_method)
+
+    if taper:
+        st.taper(taper_max_perc)
+
+    if len(st) > 1:# fix data fragmentation issue
+        st.merge(method=1, fill_value=0)
+
+    
+    # cut to correct b to e and fill with zeros (data begins at 'begin_data' seconds)
+    data = st[0].data.astype(np.float32)
+    st[0].data, _ = cut_fillz(data, begin_data, st[0].stats.delta,
+                              begin_request, begin_request + request_length)
+
+    # set sac begin time to zero and correct sac kztime
+    st[0].stats.sac = obspy.core.AttribDict()
+    st[0].stats.sac.b = 0
+    st[0].stats.starttime = request_starttime
+    return st[0]
+
+
+
+def trace_as_sac(tr):
+    # the trace as it would be after a write to and read from a sac file (without the disk round trip)
+    return SACTrace.from_obspy_trace(tr).to_obspy_trace()
+
+
+
 def sac_detrend(input_mseed_file, output_sac_file,
     detrend_method='spline', detrend_order=4, dspline=86400):
     try:
@@ -111,70 +160,78 @@ def sac_detrend(input_mseed_file, output_sac_file,
 
 
 def sac_remove_extra_channels(sacs_event_dir, similar_channels, channels2keep):
+    num_deleted = 0
+    for f in get_extra_channels(os.listdir(sacs_event_dir), similar_channels, channels2keep):
+        os.remove(os.path.join(sacs_event_dir, f))
+        num_deleted += 1
+    return num_deleted
+
+
+
+def get_extra_channels(sac_files, similar_channels, channels2keep):
+    # INPUT: list of sac file names (e.g. '<event>_<sta>.<channel>')
+    # OUTPUT: list of sac file names of the extra channels (all similar channels exist; channel not in channels2keep)
     for channel in channels2keep:
         if channel not in similar_channels:
             print("return 0")
-            return 0
+            return []
 
-    event_name = os.path.basename(sacs_event_dir)
-    num_deleted = 0
+    sac_files = set(sac_files)
+    extra_channels = []
     fname_uniq = []
-    for f in os.listdir(sacs_event_dir):
+    for f in sorted(sac_files):
         fname = os.path.splitext(f)[0]
         if fname not in fname_uniq:
             fname_uniq.append(fname)
     for fname in fname_uniq:
-        fname_exist = []
-        for channel in similar_channels:
-            if os.path.isfile(os.path.join(sacs_event_dir, f"{fname}.{channel}")):
-                fname_exist.append(True)
-            else:
-                fname_exist.append(False)
-        if all(fname_exist):
+        if all([f"{fname}.{channel}" in sac_files for channel in similar_channels]):
             for channel in similar_channels:
                 if channel not in  channels2keep:
-                    os.remove(os.path.join(sacs_event_dir, f"{fname}.{channel}"))
-                    num_deleted += 1
-    return num_deleted
+                    extra_channels.append(f"{fname}.{channel}")
+    return extra_channels
+
+
+
+def get_decimate_factors(initial_sf, final_sampling_freq):
+    # SAC 'decimate' accepts factors 2 to 7; split the total factor into those
+    # find divisors
+    divisors = []
+    for d in range(2, initial_sf+1):
+        if initial_sf % d == 0 and d <= 7:
+            divisors.append(d)
+    divisors.sort(reverse=True)
+
+    # find decimate factors
+    decimate_factors = []
+    while initial_sf != final_sampling_freq:
+        for divisor in divisors:
+            if (initial_sf/divisor) % final_sampling_freq == 0:
+                decimate_factors.append(divisor)
+                break
+        initial_sf = int(initial_sf/decimate_factors[-1])
+    return decimate_factors
 
 
 
 def sac_decimate(input_sacfile, output_sacfile, final_sampling_freq,
     SAC='/usr/local/sac/bin/sac'):
     try:
-        st = obspy.read(input_sacfile, format="SAC", headonly=True)
-        initial_sf = int(st[0].stats.sampling_rate)
+        initial_sf = int(round(1 / sacio.read_header(input_sacfile)['delta']))
         f0 = initial_sf
-        # find divisors
-        divisors = []
-        for d in range(2, initial_sf+1):
-            if initial_sf % d == 0 and d <= 7:
-                divisors.append(d)
-        divisors.sort(reverse=True)
-
-        # find decimate factors
-        decimate_factors = []
-        while initial_sf != final_sampling_freq:
-            for divisor in divisors:
-                if (initial_sf/divisor) % final_sampling_freq == 0:
-                    decimate_factors.append(divisor)
-                    break
-            initial_sf = int(initial_sf/decimate_factors[-1])
+        decimate_factors = get_decimate_factors(initial_sf, final_sampling_freq)
 
         # build and run shell script
-        shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF", f"r {input_sacfile}"]
+        sac_cmd = [f"r {input_sacfile}"]
         for df in decimate_factors:
-            shell_cmd.append(f"decimate {df}")
+            sac_cmd.append(f"decimate {df}")
 
         if input_sacfile == output_sacfile:
-            shell_cmd.append("w over")
+            sac_cmd.append("w over")
         else:
-            shell_cmd.append(f"w {output_sacfile}")
+            sac_cmd.append(f"w {output_sacfile}")
 
-        shell_cmd.append('quit')
-        shell_cmd.append('EOF')
-        shell_cmd = '\n'.join(shell_cmd)
-        subprocess.call(shell_cmd, shell=True)
+        if not run_sac(sac_cmd, SAC=SAC):
+            return False
         
         # check the output file
         # st = obspy.read(output_sacfile, format="SAC", headonly=True)
@@ -194,14 +251,15 @@ def obspy_decimate(input_sacfile, output_sacfile, final_sampling_freq, SAC='/usr
         sac_begin = st[0].stats.sac.b
         sac_end = st[0].stats.sac.e
         st.resample(float(final_sampling_freq))
-        st.write(output_sacfile, format='SAC')
 
         # obspy would mess with sac end time, let's fix that!
-        sac_cut_fillz(output_sacfile, output_sacfile, sac_begin, sac_end, SAC=SAC)
+        for tr in st:
+            data = tr.data.astype(np.float32)
+            tr.data, _ = cut_fillz(data, sac_begin, tr.stats.delta, sac_begin, sac_end)
+        st.write(output_sacfile, format='SAC')
 
         # check the output file
-        st = obspy.read(output_sacfile, format="SAC", headonly=True)
-        if float(st[0].stats.sampling_rate) == float(final_sampling_freq):
+        if round(1 / sacio.read_header(output_sacfile)['delta'], 4) == float(final_sampling_freq):
             return True
         else:
             return False
@@ -211,24 +269,109 @@ def obspy_decimate(input_sacfile, output_sacfile, final_sampling_freq, SAC='/usr
 
 
 
+#==== station metadata and instrument response caches ====#
+# StationXML files are parsed once per process (keyed by path and modification time), and the
+# evaluated (pre-filtered, water-level inverted) frequency responses are kept for reuse, so
+# removing the response of a channel-day becomes one rfft, one complex multiply, and one irfft.
+
+@functools.lru_cache(maxsize=512)
+def _read_inventory(xml_file, mtime):
+    return obspy.read_inventory(xml_file)
+
+
+
+def read_inventory(xml_file):
+    xml_file = os.path.abspath(xml_file)
+    return _read_inventory(xml_file, os.path.getmtime(xml_file))
+
+
+
+@functools.lru_cache(maxsize=512)
+def _get_channel_epochs(xml_file, mtime):
+    # {seed_id: [(start_date, end_date, response), ...]}
+    channel_epochs = {}
+    for net in _read_inventory(xml_file, mtime):
+        for sta in net:
+            for cha in sta:
+                seed_id = f"{net.code}.{sta.code}.{cha.location_code}.{cha.code}"
+                channel_epochs.setdefault(seed_id, []).append((cha.start_date, cha.end_date, cha.response))
+    return channel_epochs
+
+
+
+def get_channel_epoch(xml_file, seed_id, time):
+    # OUTPUT: (index of the channel epoch valid at 'time', its response); the index is part of the cache key
+    xml_file = os.path.abspath(xml_file)
+    channel_epochs = _get_channel_epochs(xml_file, os.path.getmtime(xml_file))
+    for i, (start_date, end_date, response) in enumerate(channel_epochs.get(seed_id, [])):
+        if (start_date is None or start_date <= time) and (end_date is None or time <= end_date):
+            return i, response
+    raise Exception(f"No matching response information found for '{seed_id}' at {time}")
+
+
+
+@functools.lru_cache(maxsize=8)
+def _get_response_taper(npts, taper_fraction=0.05):
+    from obspy.signal.invsim import cosine_taper
+    return cosine_taper(npts, taper_fraction, sactaper=True, halfcosine=False)
+
+
+
+# keyed by nfft (all npts with the same nfft share a spectrum); a spectrum of a 100 Hz day trace
+# (nfft = 2^24) is ~134 MB, so only a few are kept per worker
+@functools.lru_cache(maxsize=16)
+def _get_response_spectrum(xml_file, mtime, seed_id, epoch, nfft, delta, output, prefilter, water_level=60.0):
+    from obspy.signal.invsim import cosine_sac_taper, invert_spectrum
+    response = _get_channel_epochs(xml_file, mtime)[seed_id][epoch][2]
+    freq_response, freqs = response.get_evalresp_response(delta, nfft, output=output)
+    invert_spectrum(freq_response, water_level)
+    if prefilter:
+        freq_response *= cosine_sac_taper(freqs, flimit=prefilter)
+    freq_response.flags.writeable = False
+    return freq_response
+
+
+
+def remove_response(data, delta, starttime, seed_id, xml_file, output='VEL', prefilter=None):
+    # same steps as ObsPy's Trace.remove_response (demean, 5% cosine taper, pre-filter, water level 60)
+    # with the evaluated response spectrum cached per (channel epoch, nfft, delta, output, prefilter)
+    # data: 1-D trace or 2-D array of traces of the same channel epoch (one response spectrum for all rows)
+    xml_file = os.path.abspath(xml_file)
+    mtime = os.path.getmtime(xml_file)
+    epoch, response = get_channel_epoch(xml_file, seed_id, starttime)
+    if not response.response_stages:
+        raise Exception(f"No response stages: '{seed_id}'")
+    if prefilter is not None:
+        prefilter = tuple(prefilter)
+    data = np.array(data, dtype=np.float64)
+    npts = data.shape[-1]
+    data -= data.mean(axis=-1, keepdims=True)
+    data *= _get_response_taper(npts)
+    freq_response = _get_response_spectrum(xml_file, mtime, seed_id, epoch,
+                                           _npts2nfft(npts), float(delta), output, prefilter)
+    nfft = 2 * (len(freq_response) - 1)
+    spectrum = np.fft.rfft(data, n=nfft, axis=-1)
+    spectrum *= freq_response
+    spectrum[..., -1] = abs(spectrum[..., -1]) + 0.0j
+    return np.fft.irfft(spectrum, n=nfft, axis=-1)[..., 0:npts]
+
+
+
 def sac_remove_response(input_sacfile, output_sacfile, xml_file,
     unit='VEL', prefilter=(0.005, 0.006, 30.0, 35.0), SAC='/usr/local/sac/bin/sac', update_headers=True):
     try:
-        inv = obspy.read_inventory(xml_file)
+        inv = read_inventory(xml_file)
         st = obspy.read(input_sacfile)
-        st.remove_response(inventory=inv, output=unit, pre_filt=prefilter)
+        for tr in st:
+            try:
+                tr.data = remove_response(tr.data, tr.stats.delta, tr.stats.starttime, tr.id,
+                                          xml_file, output=unit, prefilter=prefilter)
+            except Exception as e: # e.g. polynomial responses
+                tr.remove_response(inventory=inv, output=unit, pre_filt=prefilter)
         st.write(output_sacfile, format='SAC')
         # update sac headers
         if update_headers:
-            headers = {}
-            headers['knetwk'] = inv[0].code.split()[0]
-            headers['kstnm'] = inv[0][0].code.split()[0]
-            headers['kcmpnm'] = inv[0][0][0].code.split()[0]
-            headers['stla'] = float(inv[0][0].latitude)
-            headers['stlo'] = float(inv[0][0].longitude)
-            headers['stel'] = float(inv[0][0].elevation)
-            headers['cmpaz'] = float(inv[0][0][0].azimuth)
-            headers['cmpinc'] = float(inv[0][0][0].dip)+90
+            headers = get_inventory_headers(inv)
             write_sac_headers(output_sacfile, headers, SAC=SAC)
         return True
     except Exception as e:
@@ -245,40 +388,104 @@ def sac_bandpass_filter(input_sacfile, output_sacfile,
         else:
             cf1 = 1 / cp2
             cf2 = 1 / cp1
-        shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF", f"r {input_sacfile}"]
-        shell_cmd.append(f'bp co {cf1} {cf2} n {n} p {p}')
+        sac_cmd = [f"r {input_sacfile}"]
+        sac_cmd.append(f'bp co {cf1} {cf2} n {n} p {p}')
         if input_sacfile == output_sacfile:
-            shell_cmd.append('w over')
+            sac_cmd.append('w over')
         else:
-            shell_cmd.append(f'w {output_sacfile}')
-        shell_cmd.append('quit')
-        shell_cmd.append('EOF')
-        shell_cmd = '\n'.join(shell_cmd)
-        subprocess.call(shell_cmd, shell=True)
+            sac_cmd.append(f'w {output_sacfile}')
+        if not run_sac(sac_cmd, SAC=SAC):
+            return False
         
         return True
     except Exception as e:
         return False
 
 
+@functools.lru_cache(maxsize=None)
+def get_bandpass_sos(delta, cp1, cp2, n=3, p=2):
+    # Butterworth bandpass design in second-order sections, designed the way SAC 'bp co 1/cp2 1/cp1 n {n} p {p}'
+    # is (bilinear transform with prewarped corners). Designs are cached per (delta, corners, poles, passes)
+    # so each one is built only once per run.
+    return signal.butter(n, [1 / cp2, 1 / cp1], btype='bandpass', fs=1 / delta, output='sos')
+
+
+
+def bandpass_filter(data, delta, cp1, cp2, n=3, p=2):
+    # INPUTS: 1-D trace or 2-D array of traces (filtered along the last axis), sampling interval,
+    #         corner periods (cp1 < cp2), number of poles (n) and passes (p: 1 causal, 2 zero-phase)
+    # OUTPUT: filtered float64 array
+    # Same as SAC, no padding is applied and the second pass runs over the time-reversed output
+    # of the first one (SAC designs and filters in single precision, so results are not identical).
+    # Not yet verified against SAC output: tests/test_bandpass.py requires a relative RMS difference
+    # below 1e-3 to SAC 'bp' references stored in tests/data/bandpass (see make_bandpass_references.py).
+    sos = get_bandpass_sos(float(delta), float(cp1), float(cp2), int(n), int(p))
+    data = signal.sosfilt(sos, np.asarray(data, dtype=np.float64), axis=-1)
+    if p == 2:
+        data = signal.sosfilt(sos, data[..., ::-1], axis=-1)[..., ::-1]
+    return data
+
+
+
+def scipy_bandpass_filter(input_sacfile, output_sacfile, cp1, cp2, n=3, p=2):
+    try:
+        if cp1 > cp2:
+            return False
+        st = obspy.read(input_sacfile, format="SAC")
+        for tr in st:
+            tr.data = bandpass_filter(tr.data, tr.stats.delta, cp1, cp2, n=n, p=p).astype(np.float32)
+        st.write(output_sacfile, format='SAC')
+        return True
+    except Exception as e:
+        return False
+
+
+def cut_fillz(data, b, delta, cut_begin, cut_end):
+    # in-memory equivalent of SAC 'cuterr fillz' + 'cut cut_begin cut_end'
+    # INPUTS: data array, its begin time (b) and sampling interval (delta), cut window
+    # OUTPUT: cut data (zero-filled where the window is outside of the data), new begin time
+    i0 = int(round((cut_begin - b) / delta))
+    i1 = int(round((cut_end - b) / delta))
+    npts = i1 - i0 + 1
+    cut_data = np.zeros(npts, dtype=data.dtype)
+    j0 = max(i0, 0)
+    j1 = min(i1 + 1, len(data))
+    if j1 > j0:
+        cut_data[j0 - i0:j1 - i0] = data[j0:j1]
+    return cut_data, b + i0 * delta
+
+
+
+def numpy_cut_fillz(input_sacfile, output_sacfile, cut_begin, cut_end):
+    try:
+        if cut_begin > cut_end:
+            return False
+        headers, data = sacio.read_sac(input_sacfile)
+        cut_data, headers['b'] = cut_fillz(data, headers['b'], headers['delta'], cut_begin, cut_end)
+        del data
+        sacio.write_sac(output_sacfile, headers, cut_data)
+        return True
+    except Exception as e:
+        return False
+
+
+
 def sac_cut_fillz(input_sacfile, output_sacfile,
     cut_begin, cut_end, SAC='/usr/local/sac/bin/sac'):
     try:
         if cut_begin > cut_end:
             return False
 
-        shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-        shell_cmd.append(f"cuterr fillz")
-        shell_cmd.append(f"cut {cut_begin} {cut_end}")
-        shell_cmd.append(f"r {input_sacfile}")
+        sac_cmd = []
+        sac_cmd.append(f"cuterr fillz")
+        sac_cmd.append(f"cut {cut_begin} {cut_end}")
+        sac_cmd.append(f"r {input_sacfile}")
         if input_sacfile == output_sacfile:
-            shell_cmd.append('w over')
+            sac_cmd.append('w over')
         else:
-            shell_cmd.append(f'w {output_sacfile}')
-        shell_cmd.append('quit')
-        shell_cmd.append('EOF')
-        shell_cmd = '\n'.join(shell_cmd)
-        subprocess.call(shell_cmd, shell=True)
+            sac_cmd.append(f'w {output_sacfile}')
+        if not run_sac(sac_cmd, SAC=SAC):
+            return False
 
 
         return True
@@ -289,20 +496,66 @@ def sac_cut_fillz(input_sacfile, output_sacfile,
 
 def sac_one_bit_normalize(input_sacfile, output_sacfile, SAC='/usr/local/sac/bin/sac'):
     try:
-        abssac = os.path.join(os.path.split(output_sacfile)[0], 'abs.sac')
-        shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-        shell_cmd.append(f'r {input_sacfile}')
-        shell_cmd.append(f'abs')
-        shell_cmd.append(f'add 1e-10')
-        shell_cmd.append(f'w {abssac}')
-        shell_cmd.append(f'r {input_sacfile}')
-        shell_cmd.append(f'divf {abssac}')
-        shell_cmd.append(f'w {output_sacfile}')
-        shell_cmd.append('quit')
-        shell_cmd.append('EOF')
-        shell_cmd = '\n'.join(shell_cmd)
-        subprocess.call(shell_cmd, shell=True)
-        os.remove(abssac)
+        abssac = os.path.join(os.path.split(output_sacfile)[0], f'abs_{os.getpid()}.sac') # unique per worker
+        sac_cmd = []
+        sac_cmd.append(f'r {input_sacfile}')
+        sac_cmd.append(f'abs')
+        sac_cmd.append(f'add 1e-10')
+        sac_cmd.append(f'w {abssac}')
+        sac_cmd.append(f'r {input_sacfile}')
+        sac_cmd.append(f'divf {abssac}')
+        sac_cmd.append(f'w {output_sacfile}')
+        success = run_sac(sac_cmd, SAC=SAC)
+        if os.path.isfile(abssac):
+            os.remove(abssac)
+        return success
+    except Exception as e:
+        return False
+
+
+
+def one_bit_normalize(data):
+    # INPUT: float array (1-D trace or 2-D array of traces); OUTPUT: the same array replaced by its sign
+    # Equivalent to SAC 'divf' by 'abs; add 1e-10' without the temporary abs.sac file
+    np.sign(data, out=data)
+    return data
+
+
+
+def running_absolute_mean_normalize(data, delta, window):
+    # INPUTS: 1-D trace or 2-D array of traces, sampling interval, normalization window length (s)
+    # OUTPUT: data divided by the running mean of its absolute amplitude over a centered window
+    # Running means are computed with cumulative sums so the cost stays O(npts) for any window length
+    data = np.asarray(data, dtype=np.float64)
+    npts = data.shape[-1]
+    half = max(int(round(window / delta / 2)), 0)
+    csum = np.zeros(data.shape[:-1] + (npts + 1,))
+    np.cumsum(np.abs(data), axis=-1, out=csum[..., 1:])
+    lo = np.clip(np.arange(npts) - half, 0, npts)
+    hi = np.clip(np.arange(npts) + half + 1, 0, npts)
+    weights = (csum[..., hi] - csum[..., lo]) / (hi - lo)
+    return data / (weights + 1e-10)
+
+
+
+def numpy_one_bit_normalize(input_sacfile, output_sacfile):
+    try:
+        st = obspy.read(input_sacfile, format="SAC")
+        for tr in st:
+            tr.data = one_bit_normalize(tr.data.astype(np.float32))
+        st.write(output_sacfile, format='SAC')
+        return True
+    except Exception as e:
+        return False
+
+
+
+def numpy_ram_normalize(input_sacfile, output_sacfile, window):
+    try:
+        st = obspy.read(input_sacfile, format="SAC")
+        for tr in st:
+            tr.data = running_absolute_mean_normalize(tr.data, tr.stats.delta, window).astype(np.float32)
+        st.write(output_sacfile, format='SAC')
         return True
     except Exception as e:
         return False
@@ -311,40 +564,403 @@ def sac_one_bit_normalize(input_sacfile, output_sacfile, SAC='/usr/local/sac/bin
 
 def sac_whiten(input_sacfile, output_sacfile, whiten_order, SAC='/usr/local/sac/bin/sac'):
     try:
-        shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-        shell_cmd.append(f"r {input_sacfile}")
-        shell_cmd.append(f"whiten {whiten_order}")
+        sac_cmd = []
+        sac_cmd.append(f"r {input_sacfile}")
+        sac_cmd.append(f"whiten {whiten_order}")
         if input_sacfile == output_sacfile:
-            shell_cmd.append('w over')
+            sac_cmd.append('w over')
         else:
-            shell_cmd.append(f'w {output_sacfile}')
-        shell_cmd.append('quit')
-        shell_cmd.append('EOF')
-        shell_cmd = '\n'.join(shell_cmd)
-        subprocess.call(shell_cmd, shell=True)
+            sac_cmd.append(f'w {output_sacfile}')
+        if not run_sac(sac_cmd, SAC=SAC):
+            return False
 
         return True
     except Exception as e:
         return False
 
 
+def levinson_durbin(acorr, order):
+    # INPUTS: autocorrelation lags 0..order (1-D, or 2-D with one row per trace), AR order
+    # OUTPUT: prediction error filter coefficients a[0..order] (a[0] = 1) for every row;
+    #         the recursion is vectorized across rows so a whole event/station is solved at once
+    acorr = np.atleast_2d(np.asarray(acorr, dtype=np.float64))
+    coefs = np.zeros((acorr.shape[0], order + 1))
+    coefs[:, 0] = 1.0
+    error = acorr[:, 0].copy()
+    valid = error > 0
+    error[~valid] = 1.0
+    for k in range(1, order + 1):
+        acc = acorr[:, k] + np.sum(coefs[:, 1:k] * acorr[:, k-1:0:-1], axis=1)
+        refl = np.where(valid, -acc / error, 0.0)
+        prev = coefs[:, :k+1].copy()
+        coefs[:, 1:k+1] = prev[:, 1:k+1] + refl[:, None] * prev[:, k-1::-1]
+        error *= (1 - refl**2)
+        error[error <= 0] = 1.0
+    return coefs
+
+
+
+def whiten(data, order=6):
+    # INPUTS: 1-D trace or 2-D array of traces (same npts), whitening order (as in SAC 'whiten {order}')
+    # OUTPUT: prewhitened data; an AR model of the given order is fitted to each trace (Levinson-Durbin on
+    #         its biased autocorrelation) and its prediction error filter is applied to the trace
+    data = np.asarray(data, dtype=np.float64)
+    traces = np.atleast_2d(data)
+    npts = traces.shape[-1]
+    nfft = next_fast_len(npts + order)
+    spectra = np.fft.rfft(traces, n=nfft, axis=-1)
+    acorr = np.fft.irfft(spectra * spectra.conj(), n=nfft, axis=-1)[:, :order+1] / npts
+    coefs = levinson_durbin(acorr, order)
+    whitened = traces.copy()
+    for k in range(1, order + 1):
+        whitened[:, k:] += coefs[:, k, None] * traces[:, :-k]
+    return whitened.reshape(data.shape)
+
+
+
+def spectral_whiten(data, delta, cp1, cp2, smooth=0.0):
+    # INPUTS: 1-D trace or 2-D array of traces, sampling interval, whitening band corner periods (cp1 < cp2),
+    #         amplitude smoothing window width in Hz (0: keep phase only)
+    # OUTPUT: band-limited whitened traces
+    data = np.asarray(data, dtype=np.float64)
+    npts = data.shape[-1]
+    nfft = next_fast_len(npts)
+    spectra = np.fft.rfft(data, n=nfft, axis=-1)
+    freqs = np.fft.rfftfreq(nfft, d=delta)
+    amplitude = np.abs(spectra)
+    nsmooth = int(round(smooth / (freqs[1] - freqs[0]) / 2)) if smooth > 0 else 0
+    if nsmooth > 0:
+        nfreq = freqs.size
+        csum = np.zeros(amplitude.shape[:-1] + (nfreq + 1,))
+        np.cumsum(amplitude, axis=-1, out=csum[..., 1:])
+        lo = np.clip(np.arange(nfreq) - nsmooth, 0, nfreq)
+        hi = np.clip(np.arange(nfreq) + nsmooth + 1, 0, nfreq)
+        amplitude = (csum[..., hi] - csum[..., lo]) / (hi - lo)
+    # cosine tapered band: flat between the corners, tapered to zero over 20% beyond each corner
+    f1, f2 = 1 / cp2, 1 / cp1
+    band = np.zeros(freqs.size)
+    band[(freqs >= f1) & (freqs <= f2)] = 1.0
+    ramp = (freqs >= 0.8 * f1) & (freqs < f1)
+    band[ramp] = 0.5 * (1 - np.cos(np.pi * (freqs[ramp] - 0.8 * f1) / (0.2 * f1)))
+    ramp = (freqs > f2) & (freqs <= 1.2 * f2)
+    band[ramp] = 0.5 * (1 + np.cos(np.pi * (freqs[ramp] - f2) / (0.2 * f2)))
+    spectra = band * spectra / (amplitude + 1e-20)
+    return np.fft.irfft(spectra, n=nfft, axis=-1)[..., :npts]
+
+
+
+def numpy_whiten(input_sacfile, output_sacfile, whiten_order):
+    try:
+        st = obspy.read(input_sacfile, format="SAC")
+        for tr in st:
+            tr.data = whiten(tr.data, whiten_order).astype(np.float32)
+        st.write(output_sacfile, format='SAC')
+        return True
+    except Exception as e:
+        return False
+
+
+
+def numpy_spectral_whiten(input_sacfile, output_sacfile, cp1, cp2, smooth=0.0):
+    try:
+        if cp1 > cp2:
+            return False
+        st = obspy.read(input_sacfile, format="SAC")
+        for tr in st:
+            tr.data = spectral_whiten(tr.data, tr.stats.delta, cp1, cp2, smooth=smooth).astype(np.float32)
+        st.write(output_sacfile, format='SAC')
+        return True
+    except Exception as e:
+        return False
+
+
+
 def write_sac_headers(sacfile, headers, SAC='/usr/local/sac/bin/sac'):
     # INPUTS: full path to sac file; sac headers in python dictionary format
-    # OUTPUT: the same sacfile with modified headers
+    # OUTPUT: the same sacfile with modified headers (patched in place; SAC is not needed anymore)
     try:
-        shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-        shell_cmd.append(f"r {sacfile}")
-        for hdr in headers:
-            shell_cmd.append(f"chnhdr {hdr} {headers[hdr]}")
-        shell_cmd.append(f"wh")
-        shell_cmd.append(f"q")
-        shell_cmd.append('EOF')
-        shell_cmd = '\n'.join(shell_cmd)
-        subprocess.call(shell_cmd, shell=True)
+        sacio.update_header(sacfile, headers)
+        return True
+    except Exception as e:
+        return False
+
+
+
+def get_inventory_headers(inv):
+    # sac headers from station metadata (first network/station/channel of the inventory)
+    headers = {}
+    headers['knetwk'] = inv[0].code.split()[0]
+    headers['kstnm'] = inv[0][0].code.split()[0]
+    headers['kcmpnm'] = inv[0][0][0].code.split()[0]
+    headers['stla'] = float(inv[0][0].latitude)
+    headers['stlo'] = float(inv[0][0].longitude)
+    headers['stel'] = float(inv[0][0].elevation)
+    headers['cmpaz'] = float(inv[0][0][0].azimuth)
+    headers['cmpinc'] = float(inv[0][0][0].dip)+90
+    return headers
 
+
+#==== in-memory (fused) processing of ObsPy traces read from sac files ====#
+# Each function modifies 'tr' (and tr.stats.sac) in place and returns True/False like
+# the file based functions above, so a whole process chain can run on one read.
+# SAC-only methods are mapped to their closest native equivalents.
+
+def trace_decimate(tr, final_sampling_freq, method=1):
+    try:
+        if method == 1: # in place of SAC decimate (not identical): cascade of SciPy FIR anti-alias filters and downsampling
+            initial_sf = int(round(tr.stats.sampling_rate))
+            data = tr.data.astype(np.float64)
+            for df in get_decimate_factors(initial_sf, final_sampling_freq):
+                data = signal.decimate(data, df, ftype='fir', zero_phase=True)
+            delta = 1 / float(final_sampling_freq)
+            tr.data = data.astype(np.float32)
+            tr.stats.delta = delta
+        else: # ObsPy resample + cut to original b and e
+            sac_begin = tr.stats.sac.b
+            sac_end = tr.stats.sac.e
+            tr.resample(float(final_sampling_freq))
+            data = tr.data.astype(np.float32)
+            tr.data, _ = cut_fillz(data, sac_begin, tr.stats.delta, sac_begin, sac_end)
+        tr.stats.sac.delta = tr.stats.delta
+        return round(tr.stats.sampling_rate, 4) == float(final_sampling_freq)
+    except Exception as e:
+        return False
+
+
+
+def trace_remove_response(tr, xml_file,
+    unit='VEL', prefilter=(0.005, 0.006, 30.0, 35.0), update_headers=True):
+    try:
+        inv = read_inventory(xml_file)
+        try:
+            tr.data = remove_response(tr.data, tr.stats.delta, tr.stats.starttime, tr.id,
+                                      xml_file, output=unit, prefilter=prefilter)
+        except Exception as e: # e.g. polynomial responses
+            tr.remove_response(inventory=inv, output=unit, pre_filt=prefilter)
+        if update_headers:
+            trace_write_headers(tr, get_inventory_headers(inv))
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_bandpass_filter(tr, cp1, cp2, n=3, p=2):
+    try:
+        tr.data = bandpass_filter(tr.data, tr.stats.delta, cp1, cp2, n=n, p=p).astype(np.float32)
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_cut_fillz(tr, cut_begin, cut_end):
+    try:
+        if cut_begin > cut_end:
+            return False
+        b = float(tr.stats.sac.b)
+        data, new_b = cut_fillz(tr.data, b, tr.stats.delta, cut_begin, cut_end)
+        tr.data = data
+        tr.stats.starttime += new_b - b
+        tr.stats.sac.b = new_b
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_detrend(tr, detrend_method='spline', detrend_order=4, dspline=86400):
+    try:
+        if detrend_method == 'spline':
+            try:
+                tr.detrend(detrend_method, order=detrend_order, dspline=dspline)
+            except:
+                tr.detrend('demean')
+        elif detrend_method == 'polynomial':
+            try:
+                tr.detrend(detrend_method, order=detrend_order)
+            except:
+                tr.detrend('demean')
+        else:
+            tr.detrend(detrend_method)
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_write_headers(tr, headers):
+    # ObsPy writes knetwk/kstnm/kcmpnm from tr.stats, so keep both in sync
+    try:
+        tr.stats.sac.update(headers)
+        if 'knetwk' in headers:
+            tr.stats.network = headers['knetwk']
+        if 'kstnm' in headers:
+            tr.stats.station = headers['kstnm']
+        if 'kcmpnm' in headers:
+            tr.stats.channel = headers['kcmpnm']
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_one_bit_normalize(tr):
+    try:
+        tr.data = one_bit_normalize(tr.data.astype(np.float32))
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_ram_normalize(tr, window):
+    try:
+        tr.data = running_absolute_mean_normalize(tr.data, tr.stats.delta, window).astype(np.float32)
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_whiten(tr, whiten_order):
+    try:
+        tr.data = whiten(tr.data, whiten_order).astype(np.float32)
+        return True
+    except Exception as e:
+        return False
+
+
+
+def trace_spectral_whiten(tr, cp1, cp2, smooth=0.0):
+    try:
+        tr.data = spectral_whiten(tr.data, tr.stats.delta, cp1, cp2, smooth=smooth).astype(np.float32)
         return True
     except Exception as e:
         return False
 
 
 
+#==== station-major (batched) processing of blocks of ObsPy traces ====#
+# Each function runs one process on a list of traces (e.g. the days of a station channel):
+# traces with equal npts and delta are stacked into one 2-D array, so the filter design,
+# response spectrum, and FFT plans are shared. Results are the same as with the trace_*
+# functions above; a block that fails falls back to them one trace at a time.
+# OUTPUT: list of success flags (one per trace)
+
+def get_trace_blocks(traces):
+    # OUTPUT: lists of trace indices with equal npts and delta
+    blocks = {}
+    for i, tr in enumerate(traces):
+        blocks.setdefault((tr.stats.npts, tr.stats.delta), []).append(i)
+    return list(blocks.values())
+
+
+
+def traces_apply(traces, func, trace_func):
+    # func(2-D array, delta) -> 2-D array; trace_func(tr) -> True/False
+    success = [False] * len(traces)
+    for block in get_trace_blocks(traces):
+        try:
+            data = func(np.array([traces[i].data for i in block]), traces[block[0]].stats.delta)
+            for i, row in zip(block, data):
+                traces[i].data = row.astype(np.float32)
+                success[i] = True
+        except Exception as e:
+            for i in block:
+                success[i] = trace_func(traces[i])
+    return success
+
+
+
+def traces_decimate(traces, final_sampling_freq, method=1):
+    success = [False] * len(traces)
+    for block in get_trace_blocks(traces):
+        if method != 1: # ObsPy resample
+            for i in block:
+                success[i] = trace_decimate(traces[i], final_sampling_freq, method=method)
+            continue
+        try:
+            initial_sf = int(round(traces[block[0]].stats.sampling_rate))
+            data = np.array([traces[i].data for i in block], dtype=np.float64)
+            for df in get_decimate_factors(initial_sf, final_sampling_freq):
+                data = signal.decimate(data, df, ftype='fir', zero_phase=True, axis=-1)
+        except Exception as e:
+            for i in block:
+                success[i] = trace_decimate(traces[i], final_sampling_freq, method=method)
+            continue
+        delta = 1 / float(final_sampling_freq)
+        for i, row in zip(block, data):
+            tr = traces[i]
+            tr.data = row.astype(np.float32)
+            tr.stats.delta = delta
+            tr.stats.sac.delta = tr.stats.delta
+            success[i] = round(tr.stats.sampling_rate, 4) == float(final_sampling_freq)
+    return success
+
+
+
+def traces_remove_response(traces, xml_files,
+    unit='VEL', prefilter=(0.005, 0.006, 30.0, 35.0), update_headers=True):
+    # xml_files: station meta file of each trace; traces are stacked per channel epoch
+    success = [False] * len(traces)
+    if prefilter is not None:
+        prefilter = tuple(prefilter)
+    epochs = {}
+    for i, tr in enumerate(traces):
+        try:
+            epoch, _ = get_channel_epoch(os.path.abspath(xml_files[i]), tr.id, tr.stats.starttime)
+        except Exception as e:
+            epoch = -1 - i # no matching epoch: ObsPy is used for this trace
+        key = (tr.stats.npts, tr.stats.delta, os.path.abspath(xml_files[i]), tr.id, epoch)
+        epochs.setdefault(key, []).append(i)
+    for (npts, delta, xml_file, seed_id, epoch), block in epochs.items():
+        try:
+            data = remove_response(np.array([traces[i].data for i in block]), delta,
+                                   traces[block[0]].stats.starttime, seed_id, xml_file,
+                                   output=unit, prefilter=prefilter)
+            if update_headers:
+                headers = get_inventory_headers(read_inventory(xml_file))
+            for i, row in zip(block, data):
+                traces[i].data = row
+                success[i] = trace_write_headers(traces[i], headers) if update_headers else True
+        except Exception as e:
+            for i in block:
+                success[i] = trace_remove_response(traces[i], xml_files[i], unit=unit,
+                                                   prefilter=prefilter, update_headers=update_headers)
+    return success
+
+
+
+def traces_bandpass_filter(traces, cp1, cp2, n=3, p=2):
+    return traces_apply(traces,
+        lambda data, delta: bandpass_filter(data, delta, cp1, cp2, n=n, p=p),
+        lambda tr: trace_bandpass_filter(tr, cp1, cp2, n=n, p=p))
+
+
+
+def traces_one_bit_normalize(traces):
+    return traces_apply(traces,
+        lambda data, delta: one_bit_normalize(data.astype(np.float32)),
+        trace_one_bit_normalize)
+
+
+
+def traces_ram_normalize(traces, window):
+    return traces_apply(traces,
+        lambda data, delta: running_absolute_mean_normalize(data, delta, window),
+        lambda tr: trace_ram_normalize(tr, window))
+
+
+
+def traces_whiten(traces, whiten_order):
+    return traces_apply(traces,
+        lambda data, delta: whiten(data, whiten_order),
+        lambda tr: trace_whiten(tr, whiten_order))
+
+
+
+def traces_spectral_whiten(traces, cp1, cp2, smooth=0.0):
+    return traces_apply(traces,
+        lambda data, delta: spectral_whiten(data, delta, cp1, cp2, smooth=smooth),
+        lambda tr: trace_spectral_whiten(tr, cp1, cp2, smooth=smooth))
@@ -1,21 +1,36 @@
 
 import os
 import obspy
+import numpy as np
 import re
 import shutil
-import subprocess
+import tempfile
+import io
+import json
+import hashlib
+import time
+import functools
+import contextlib
+import multiprocessing
+import multiprocessing.util
 from . import config
 from . import proc
 from . import download
+from . import sacio
+from . import xcorr as xcorr_engine
 
 #==== MAIN FUNCTION ====#
 
 regex_events = re.compile('^[1-2][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]$')
 regex_sacs = re.compile('^[1-2][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]\_.*\..*$')
 regex_xcorr_RTZ = re.compile('^.*\_.*\.(R|T|Z)$') # xcorr, R, T, and Z components
-regex_xcorr = re.compile('^.*\_.*\.(RR|TT|ZZ)$')
+catalog_dtype = [('kstnm', 'U8'), ('knetwk', 'U8'), ('kcmpnm', 'U8'),
+                 ('stla', 'f8'), ('stlo', 'f8'), ('stel', 'f8'), ('cmpaz', 'f8'), ('cmpinc', 'f8'),
+                 ('delta', 'f8'), ('npts', 'i8')] # + ('path', 'U*')
+regex_xcorr = re.compile('^.*\_.*\.(RR|TT|ZZ|RT|TR|RZ|ZR|NN|NE|EN|EE|NZ|EZ|ZN|ZE)$')
 
-def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
+def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True, fused=False, sac_pool=0, workers=1, scratch=None, force=False,
+                    station_major=False, block_size=30):
     input_sacs_dir = os.path.abspath(input_sacs_dir)
     output_ncfs_dir = os.path.abspath(output_ncfs_dir)
     conf = config.read_config(maindir)
@@ -24,25 +39,270 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
     stations = download.STATIONS(maindir)
     stalist = stations.read_stalist()
 
+    if output_ncfs_dir == input_sacs_dir:
+        print("Error! Input and output dataset directories must be different")
+        return
     if not os.path.isdir(output_ncfs_dir):
         os.mkdir(output_ncfs_dir)
-    
+    if scratch is not None:
+        scratch = os.path.abspath(scratch)
+        os.makedirs(scratch, exist_ok=True)
+    if station_major:
+        # station-major processing is in memory (same outputs as the fused mode)
+        fused = True
+    if fused:
+        for step in get_fused_substitutions(conf['sac2ncf']['sac2ncf_procs']):
+            print(f"Warning! In-memory mode runs a native method instead of SAC (outputs differ from the SAC chain): {step}")
+
     events = get_events(input_sacs_dir)
+    # completion manifest: events that were processed with the same sac2ncf settings
+    # and have unchanged input sac files (sizes, mtimes) are skipped unless force=True
+    manifest = read_manifest(maindir)
+    manifest_events = manifest.setdefault(output_ncfs_dir, {})
+    config_hash = get_config_hash(conf, stalist, all, fused)
+    event_manifests = {}
     for event in events:
-        xcorr = False
-        inp_event = os.path.join(input_sacs_dir, event)
-        out_event = os.path.join(output_ncfs_dir, event)
-        copy_event(inp_event, out_event)
-        for sacfile in get_event_sacs(out_event):
+        event_manifests[event] = {'config': config_hash,
+                                  'inputs': get_inputs_hash(os.path.join(input_sacs_dir, event))}
+    if not force:
+        events_done = [event for event in events if manifest_events.get(event) == event_manifests[event]
+                       and os.path.isdir(os.path.join(output_ncfs_dir, event))]
+        if len(events_done):
+            print(f"{len(events_done)} of {len(events)} events are up to date and skipped (use '--force' to process all events)")
+        events = [event for event in events if event not in events_done]
+    # events to process are only marked as complete again once they are done
+    for event in events:
+        manifest_events.pop(event, None)
+    write_manifest(maindir, manifest)
+    event_args = [maindir, input_sacs_dir, output_ncfs_dir, conf, stalist, all, fused, scratch]
+    event_times = [] # [event, wall time (s), number of sac files]
+    t0 = time.perf_counter()
+    preprocessed_dir = None
+    if station_major and len(events):
+        # the process chain runs per station channel over all events (memory bound: block_size days);
+        # the events are then only cross-correlated
+        preprocessed_dir = tempfile.mkdtemp(prefix="sac2ncf_", dir=scratch)
+        nsacs = sac2ncf_station_major(events, maindir, input_sacs_dir, preprocessed_dir, conf, stalist, all, block_size)
+        print(f"\nStation-major processing: {nsacs} sac files in {time.perf_counter() - t0:.2f} s")
+        event_args = [maindir, preprocessed_dir, output_ncfs_dir, conf, stalist, True, False, scratch, True]
+    try:
+        if workers > 1:
+            # each worker runs whole events (own SAC pool; scratch files are unique per process) and
+            # returns its log, which is printed in event order
+            pool = multiprocessing.Pool(workers, initializer=sac2ncf_worker_init, initargs=(SAC, sac_pool))
+            try:
+                for event, elapsed, nsacs, log, success in pool.imap(functools.partial(sac2ncf_event_log, event_args=event_args), events):
+                    print(dedup_log(log), end='')
+                    event_times.append([event, elapsed, nsacs])
+                    if success:
+                        manifest_events[event] = event_manifests[event]
+                        write_manifest(maindir, manifest)
+                    if preprocessed_dir is not None:
+                        shutil.rmtree(os.path.join(preprocessed_dir, event), ignore_errors=True)
+                pool.close()
+            except BaseException:
+                pool.terminate()
+                raise
+            pool.join()
+        else:
+            if sac_pool:
+                proc.start_sac_pool(SAC, size=sac_pool)
+            for event in events:
+                event_times.append(sac2ncf_event(event, *event_args))
+                manifest_events[event] = event_manifests[event]
+                write_manifest(maindir, manifest)
+                if preprocessed_dir is not None:
+                    shutil.rmtree(os.path.join(preprocessed_dir, event), ignore_errors=True)
+            proc.stop_sac_pool()
+    finally:
+        if preprocessed_dir is not None:
+            shutil.rmtree(preprocessed_dir, ignore_errors=True)
+    total_time = time.perf_counter() - t0
+
+    print_event_times(event_times, total_time)
+    print("\nDone!\n")
+
+
+
+def get_xcorr_params(conf):
+    # OUTPUT: {'method', 'outputs' (method 3 output components), 'min_dist', 'max_dist' (km; 0: no limit),
+    #          'maxlag' (s; 0: all lags), 'window' (s; 0: whole trace), 'overlap' (%), 'weighted'}
+    # the minimum distance is at least 'min_wavelengths' wavelengths of the longest bandpass period
+    xcorr_params = {'method': 1, 'outputs': 0, 'min_dist': 0, 'max_dist': 0, 'maxlag': 0,
+                    'window': 0, 'overlap': 0, 'weighted': False}
+    max_period = 0
+    for process in conf['sac2ncf']['sac2ncf_procs']:
+        if process['pid'][0] == 3:
+            max_period = max(float(process['le_sac2ncf_bp_cp1']), float(process['le_sac2ncf_bp_cp2']))
+        if process['pid'][0] == 10:
+            xcorr_params['method'] = process['pid'][1]
+            xcorr_params['outputs'] = process.get('cmb_sac2ncf_xcorr_outputs', 0)
+            xcorr_params['min_dist'] = float(process.get('le_sac2ncf_xcorr_min_dist', 0))
+            xcorr_params['max_dist'] = float(process.get('le_sac2ncf_xcorr_max_dist', 0))
+            xcorr_params['maxlag'] = float(process.get('le_sac2ncf_xcorr_maxlag', 0))
+            xcorr_params['window'] = float(process.get('le_sac2ncf_xcorr_window', 0))
+            xcorr_params['overlap'] = min(max(float(process.get('le_sac2ncf_xcorr_overlap', 0)), 0), 90)
+            xcorr_params['weighted'] = int(process.get('cmb_sac2ncf_xcorr_weights', 0)) == 1
+            if xcorr_params['method'] == 1 and xcorr_params['window'] > 0:
+                print("Warning! Sub-window stacking is not available for 'SAC: correlate'; whole traces are correlated")
+            min_wavelengths = float(process.get('le_sac2ncf_xcorr_min_wavelengths', 0))
+            velocity = float(process.get('le_sac2ncf_xcorr_velocity', 3))
+            if min_wavelengths > 0 and max_period > 0:
+                xcorr_params['min_dist'] = max(xcorr_params['min_dist'], min_wavelengths * velocity * max_period)
+            elif min_wavelengths > 0:
+                print("Warning! Wavelength criterion is ignored (no bandpass filter process)")
+    return xcorr_params
+
+
+
+def sac2ncf_worker_init(SAC, sac_pool):
+    if sac_pool:
+        proc.start_sac_pool(SAC, size=sac_pool)
+        # close the worker's SAC processes when the pool is closed
+        multiprocessing.util.Finalize(None, proc.stop_sac_pool, exitpriority=10)
+
+
+
+def sac2ncf_event_log(event, event_args):
+    # run sac2ncf_event() and capture its printed log
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            event, elapsed, nsacs = sac2ncf_event(event, *event_args)
+            success = True
+        except Exception as e:
+            print(f"Error! Event '{event}' failed: {e}")
+            elapsed, nsacs = 0, 0
+            success = False
+    return event, elapsed, nsacs, log.getvalue(), success
+
+
+
+def get_manifest_file(maindir):
+    return os.path.join(maindir, '.ans', 'sac2ncf_manifest.json')
+
+
+
+def read_manifest(maindir):
+    # OUTPUT: {output dataset directory: {event: {'config': hash, 'inputs': hash}}}
+    try:
+        with open(get_manifest_file(maindir), 'r') as fopen:
+            return json.load(fopen)
+    except Exception as e:
+        return {}
+
+
+
+def write_manifest(maindir, manifest):
+    # the manifest is replaced atomically, so an interrupted run leaves the last complete version
+    if not os.path.isdir(os.path.join(maindir, '.ans')):
+        os.mkdir(os.path.join(maindir, '.ans'))
+    manifest_file = get_manifest_file(maindir)
+    with open(f"{manifest_file}.tmp", 'w') as fopen:
+        json.dump(manifest, fopen, indent=1, sort_keys=True)
+    os.replace(f"{manifest_file}.tmp", manifest_file)
+
+
+
+def get_config_hash(conf, stalist, all=True, fused=False):
+    # hash of the settings that change sac2ncf outputs
+    settings = {'sac2ncf': conf['sac2ncf'], 'le_mseeds': conf['download']['le_mseeds'],
+                'all': all, 'fused': fused}
+    if not all:
+        settings['stations'] = sorted(stalist['sta'])
+    settings = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(settings.encode()).hexdigest()
+
+
+
+def get_inputs_hash(event_dir):
+    # hash of the names, sizes, and modification times of the event sac files
+    inputs = []
+    for sacfile in get_event_sacs(event_dir):
+        stat = os.stat(os.path.join(event_dir, sacfile))
+        inputs.append([sacfile, stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(json.dumps(inputs).encode()).hexdigest()
+
+
+
+def dedup_log(log):
+    # collapse consecutive repeated lines
+    lines = []
+    counts = []
+    for line in log.split('\n'):
+        if len(lines) and line.strip() and line == lines[-1]:
+            counts[-1] += 1
+        else:
+            lines.append(line)
+            counts.append(1)
+    return '\n'.join([line if count == 1 else f"{line} (x{count})" for line, count in zip(lines, counts)])
+
+
+
+def print_event_times(event_times, total_time):
+    if not len(event_times):
+        return
+    print("\nWall time per event:")
+    for event, elapsed, nsacs in event_times:
+        print(f"    {event}  {elapsed:10.2f} s  ({nsacs} sac files)")
+    nevents = len(event_times)
+    nsacs = sum([x[2] for x in event_times])
+    print(f"Total: {nevents} events, {nsacs} sac files in {total_time:.2f} s", end='')
+    if total_time > 0:
+        print(f" ({nevents * 3600 / total_time:.1f} events/hour, {nsacs / total_time:.2f} sac files/s)")
+    else:
+        print()
+
+
+
+def sac2ncf_event(event, maindir, input_sacs_dir, output_ncfs_dir, conf, stalist, all=True, fused=False, scratch=None, preprocessed=False):
+    # sac files are read from the input dataset; intermediate files are kept in a per-event scratch
+    # directory (scratch=None: system temporary directory) and only the cross-correlations (or the
+    # processed sac files if there is no cross-correlation process) are written to the output event
+    # preprocessed=True: input sac files are already processed (station-major mode); only cross-correlation runs
+    # OUTPUT: event, wall time (s), number of processed sac files
+    t0 = time.perf_counter()
+    nsacs = 0
+    SAC = conf['setting']['le_sac']
+    xcorr_params = get_xcorr_params(conf)
+    xcorr = False
+    inp_event = os.path.join(input_sacs_dir, event)
+    out_event = os.path.join(output_ncfs_dir, event)
+    if not os.path.isdir(out_event):
+        os.mkdir(out_event)
+    else:
+        # outputs of a previous run are replaced
+        for f in os.listdir(out_event):
+            if regex_xcorr.match(f) or regex_sacs.match(f):
+                os.remove(os.path.join(out_event, f))
+    scratch_event = tempfile.mkdtemp(prefix=f"{event}_", dir=scratch)
+    try:
+        skip_sacs = get_skip_sacs(inp_event, conf)
+        event_sacs = [] # processed sac files (scratch directory; input file if no process has modified it)
+        for sacfile in get_event_sacs(inp_event):
             sacfile_staname = sacfile.split('.')[0].split('_')[1]
             if all == False and sacfile_staname not in stalist['sta']:
                 continue
+            if sacfile in skip_sacs:
+                continue
 
             print(f"\nsac file: {sacfile}")
-            sacfile = os.path.join(out_event, sacfile)
+            nsacs += 1
+            inp_sacfile = os.path.join(inp_event, sacfile)
+            sacfile = os.path.join(scratch_event, sacfile)
+            if fused:
+                success, proc_id_xcorr = sac2ncf_fused_procs(inp_sacfile, conf, maindir, event, output_sacfile=sacfile)
+                if proc_id_xcorr:
+                    xcorr = True
+                if success:
+                    event_sacs.append(sacfile)
+                continue
             success = True
+            sacfile_in = inp_sacfile # each process reads the latest version of the sac file
             for i, process in enumerate(conf['sac2ncf']['sac2ncf_procs']):
                 pid = process['pid']
+                if preprocessed and pid[0] != 10:
+                    continue
                 if success and pid == [1,1]:
                     print(f"    Process #{i+1}: Decimate (SAC method)")
 
@@ -58,7 +318,7 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                     else:
                         final_sampling_freq = 1
 
-                    success = proc.sac_decimate(sacfile, sacfile, final_sampling_freq,
+                    success = proc.sac_decimate(sacfile_in, sacfile, final_sampling_freq,
                     SAC=SAC)
 
                     if not success and os.path.isfile(sacfile):
@@ -80,7 +340,7 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                         final_sampling_freq = 1
 
 
-                    success = proc.obspy_decimate(sacfile, sacfile, final_sampling_freq, SAC=SAC)
+                    success = proc.obspy_decimate(sacfile_in, sacfile, final_sampling_freq, SAC=SAC)
 
                     if not success and os.path.isfile(sacfile):
                         os.remove(sacfile)
@@ -104,10 +364,10 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                     elif prefilter == 1:
                         prefilter = (0.005, 0.006, 30.0, 35.0)
 
-                    st = obspy.read(sacfile, headonly=True)
-                    net = st[0].stats.network
-                    sta = st[0].stats.station
-                    chn = st[0].stats.channel
+                    sac_headers = sacio.read_header(sacfile_in)
+                    net = sac_headers.get('knetwk', '')
+                    sta = sac_headers.get('kstnm', '')
+                    chn = sac_headers.get('kcmpnm', '')
                     xml_fname = f"{net}.{sta}.{chn}"
                     if os.path.isfile(os.path.join(xmldir, xml_fname)):
                         xml_file = os.path.join(xmldir, xml_fname)
@@ -118,7 +378,7 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                         success = False
                         continue
 
-                    success = proc.sac_remove_response(sacfile, sacfile, xml_file,
+                    success = proc.sac_remove_response(sacfile_in, sacfile, xml_file,
                                                        unit=unit, prefilter=prefilter,
                                                        SAC=SAC)
 
@@ -132,14 +392,28 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                     cp2 = process['le_sac2ncf_bp_cp2']
                     n = process['sb_sac2ncf_bp_poles']
                     p = process['sb_sac2ncf_bp_passes']
-                    
-                    success = proc.sac_bandpass_filter(sacfile, sacfile,
+                
+                    success = proc.sac_bandpass_filter(sacfile_in, sacfile,
                                         cp1=cp1, cp2=cp2, n=n, p=p,
                                         SAC=SAC)
 
                     if not success and os.path.isfile(sacfile):
                         os.remove(sacfile)
 
+                elif success and pid == [3,2]:
+                    print(f"    Process #{i+1}: Bandpass filter (SciPy method)")
+
+                    cp1 = process['le_sac2ncf_bp_cp1']
+                    cp2 = process['le_sac2ncf_bp_cp2']
+                    n = process['sb_sac2ncf_bp_poles']
+                    p = process['sb_sac2ncf_bp_passes']
+
+                    success = proc.scipy_bandpass_filter(sacfile_in, sacfile,
+                                        cp1=cp1, cp2=cp2, n=n, p=p)
+
+                    if not success and os.path.isfile(sacfile):
+                        os.remove(sacfile)
+
                 elif success and pid == [4,1]:
                     print(f"    Process #{i+1}: Cut seismograms")
 
@@ -150,7 +424,24 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                         print(f"    Error! Cut begin/end values are not set properly!")
                         success = False
 
-                    success = proc.sac_cut_fillz(sacfile, sacfile, cut_begin, cut_end, SAC=SAC)
+                    if success:
+                        success = proc.sac_cut_fillz(sacfile_in, sacfile, cut_begin, cut_end, SAC=SAC)
+
+                    if not success and os.path.isfile(sacfile):
+                        os.remove(sacfile)
+
+                elif success and pid == [4,2]:
+                    print(f"    Process #{i+1}: Cut seismograms (NumPy method)")
+
+                    try:
+                        cut_begin = float(process['le_sac2ncf_cut_begin'])
+                        cut_end = float(process['le_sac2ncf_cut_end'])
+                    except Exception as e:
+                        print(f"    Error! Cut begin/end values are not set properly!")
+                        success = False
+
+                    if success:
+                        success = proc.numpy_cut_fillz(sacfile_in, sacfile, cut_begin, cut_end)
 
                     if not success and os.path.isfile(sacfile):
                         os.remove(sacfile)
@@ -161,7 +452,7 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                     detrend_method = process['cmb_sac2ncf_detrend_method']
                     detrend_order = int(process['sb_sac2ncf_detrend_order'])
                     dspline = int(process['le_sac2ncf_dspline'])
-                    
+                
                     if detrend_method == 0:
                         detrend_method = "demean"
                     elif detrend_method == 1:
@@ -172,7 +463,7 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                         detrend_method = "spline"
 
 
-                    success = proc.sac_detrend(sacfile, sacfile,
+                    success = proc.sac_detrend(sacfile_in, sacfile,
                               detrend_method=detrend_method, detrend_order=detrend_order, dspline=dspline)
 
                 elif success and pid == [6,1]:
@@ -180,10 +471,10 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
 
                     xmldir = process['le_sac2ncf_stametadir']
 
-                    st = obspy.read(sacfile, headonly=True)
-                    net = st[0].stats.network
-                    sta = st[0].stats.station
-                    chn = st[0].stats.channel
+                    sac_headers = sacio.read_header(sacfile_in)
+                    net = sac_headers.get('knetwk', '')
+                    sta = sac_headers.get('kstnm', '')
+                    chn = sac_headers.get('kcmpnm', '')
                     xml_fname = f"{net}.{sta}.{chn}"
                     if os.path.isfile(os.path.join(xmldir, xml_fname)):
                         xml_file = os.path.join(xmldir, xml_fname)
@@ -192,7 +483,7 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                         success = False
                         continue
 
-                    inv = obspy.read_inventory(xml_file)
+                    inv = proc.read_inventory(xml_file)
                     headers = {}
                     headers['knetwk'] = inv[0].code.split()[0]
                     headers['kstnm'] = inv[0][0].code.split()[0]
@@ -203,22 +494,31 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                     headers['cmpaz'] = float(inv[0][0][0].azimuth)
                     headers['cmpinc'] = float(inv[0][0][0].dip)+90
 
+                    if sacfile_in != sacfile:
+                        shutil.copyfile(sacfile_in, sacfile)
                     success = proc.write_sac_headers(sacfile, headers, SAC=SAC)
 
-                elif success and pid == [7,1]:
-                    print(f"    Process #{i+1}: Remove extra channels")
+                elif success and pid == [8,1]:
+                    print(f"    Process #{i+1}: One-bit normalization")
+
+                    success = proc.sac_one_bit_normalize(sacfile_in, sacfile, SAC=SAC)
 
-                    similar_channels = process['le_sac2ncf_similar_channels'].split()
-                    channels2keep = process['le_sac2ncf_channels2keep'].split()
+                    if not success and os.path.isfile(sacfile):
+                        os.remove(sacfile)
 
-                    proc.sac_remove_extra_channels(sacs_event_dir=out_event,
-                                                   similar_channels=similar_channels,
-                                                   channels2keep=channels2keep)
+                elif success and pid == [8,2]:
+                    print(f"    Process #{i+1}: One-bit normalization (NumPy method)")
 
-                elif success and pid == [8,1]:
-                    print(f"    Process #{i+1}: One-bit normalization")
+                    success = proc.numpy_one_bit_normalize(sacfile_in, sacfile)
+
+                    if not success and os.path.isfile(sacfile):
+                        os.remove(sacfile)
+
+                elif success and pid == [8,3]:
+                    print(f"    Process #{i+1}: Running absolute mean normalization")
 
-                    success = proc.sac_one_bit_normalize(sacfile, sacfile, SAC=SAC)
+                    ram_window = float(process['le_sac2ncf_ram_window'])
+                    success = proc.numpy_ram_normalize(sacfile_in, sacfile, ram_window)
 
                     if not success and os.path.isfile(sacfile):
                         os.remove(sacfile)
@@ -227,359 +527,637 @@ def sac2ncf_run_all(maindir, input_sacs_dir, output_ncfs_dir, all=True):
                     print(f"    Process #{i+1}: Spectral whitening")
 
                     whiten_order = int(process['sb_sac2ncf_whiten_order'])
-                    success = proc.sac_whiten(sacfile, sacfile, whiten_order, SAC=SAC)
+                    success = proc.sac_whiten(sacfile_in, sacfile, whiten_order, SAC=SAC)
 
                     if not success and os.path.isfile(sacfile):
                         os.remove(sacfile)
-                elif success and pid == [10,1]:
+
+                elif success and pid == [9,2]:
+                    print(f"    Process #{i+1}: Spectral whitening (NumPy AR method)")
+
+                    whiten_order = int(process['sb_sac2ncf_whiten_order'])
+                    success = proc.numpy_whiten(sacfile_in, sacfile, whiten_order)
+
+                    if not success and os.path.isfile(sacfile):
+                        os.remove(sacfile)
+
+                elif success and pid == [9,3]:
+                    print(f"    Process #{i+1}: Spectral whitening (NumPy frequency-domain method)")
+
+                    cp1 = process['le_sac2ncf_whiten_cp1']
+                    cp2 = process['le_sac2ncf_whiten_cp2']
+                    smooth = process['le_sac2ncf_whiten_smooth']
+                    success = proc.numpy_spectral_whiten(sacfile_in, sacfile, cp1, cp2, smooth=smooth)
+
+                    if not success and os.path.isfile(sacfile):
+                        os.remove(sacfile)
+                elif success and pid[0] == 10:
                     proc_id_xcorr = i+1
                     xcorr =True
 
-        if xcorr:
-            print(f"\nProcess #{proc_id_xcorr}: Cross-correlation; Event dir: '{event}'\n")
+                if success and os.path.isfile(sacfile):
+                    sacfile_in = sacfile
 
-            generate_xcorr_RTZ_files(out_event, SAC=SAC)
-            perform_xcorr_RTZ(out_event, SAC=SAC)
-            # remove extra files after cross-correlation
-            remove_all_files_except_regex(out_event, regex_xcorr)
+            if success:
+                event_sacs.append(sacfile_in)
 
+        if xcorr:
+            print(f"\nProcess #{proc_id_xcorr}: Cross-correlation; Event dir: '{event}'\n")
 
-    print("\nDone!\n")
+            # one header scan of the processed sac files
+            catalog = get_event_catalog(scratch_event, sacfiles=event_sacs)
+            # pairs out of the distance range are never rotated or correlated
+            event_sta_pairs = get_event_sta_pairs(scratch_event, catalog=catalog,
+                min_dist=xcorr_params['min_dist'], max_dist=xcorr_params['max_dist'])
+            maxlag = xcorr_params['maxlag']
+            windows = {'window': xcorr_params['window'], 'overlap': xcorr_params['overlap'], 'weighted': xcorr_params['weighted']}
+            if xcorr_params['method'] == 2:
+                perform_xcorr_RTZ_fft(scratch_event, catalog=catalog, event_sta_pairs=event_sta_pairs, maxlag=maxlag,
+                                      output_dir=out_event, **windows)
+            elif xcorr_params['method'] == 3:
+                perform_xcorr_tensor(scratch_event, outputs=xcorr_params['outputs'], catalog=catalog,
+                                     event_sta_pairs=event_sta_pairs, maxlag=maxlag, output_dir=out_event, **windows)
+            else:
+                generate_xcorr_RTZ_files(scratch_event, SAC=SAC, catalog=catalog, event_sta_pairs=event_sta_pairs)
+                perform_xcorr_RTZ(scratch_event, SAC=SAC, catalog=catalog, event_sta_pairs=event_sta_pairs, maxlag=maxlag,
+                                  output_dir=out_event)
+        else:
+            # no cross-correlation process: the processed sac files are the outputs
+            for sacfile in event_sacs:
+                if os.path.dirname(sacfile) == scratch_event:
+                    shutil.move(sacfile, os.path.join(out_event, os.path.basename(sacfile)))
+                else:
+                    shutil.copyfile(sacfile, os.path.join(out_event, os.path.basename(sacfile)))
+    finally:
+        shutil.rmtree(scratch_event, ignore_errors=True)
+
+    return event, time.perf_counter() - t0, nsacs
         
 
 #=======================#
 
-def perform_xcorr_RTZ(event_dir, SAC='/usr/local/sac/bin/sac'):
-    event_RTZs = get_event_RTZs(event_dir)
-    event_sta_pairs = get_event_sta_pairs(event_dir)
+def get_skip_sacs(event_dir, conf):
+    # extra channels are skipped (once per event) instead of being removed from a copy of the event
+    skip_sacs = []
+    for process in conf['sac2ncf']['sac2ncf_procs']:
+        if process['pid'] == [7,1]:
+            skip_sacs = proc.get_extra_channels(get_event_sacs(event_dir),
+                similar_channels=process['le_sac2ncf_similar_channels'].split(),
+                channels2keep=process['le_sac2ncf_channels2keep'].split())
+            print(f"Remove extra channels: {len(skip_sacs)} sac files are skipped")
+    return skip_sacs
+
+
+
+def sac2ncf_station_major(events, maindir, input_sacs_dir, preprocessed_dir, conf, stalist, all=True, block_size=30):
+    # station-major preprocessing: the days (events) of each station channel are read in blocks of up to
+    # block_size traces and every process runs once per block on 2-D arrays (see sac2ncf_block_procs);
+    # processed sac files are written to preprocessed_dir/<event>/ (same outputs as sac2ncf_fused_procs)
+    # OUTPUT: number of processed sac files
+    channel_sacs = {} # {'sta.chn': [[event, sac file], ...]}
+    for event in events:
+        inp_event = os.path.join(input_sacs_dir, event)
+        skip_sacs = get_skip_sacs(inp_event, conf)
+        for sacfile in get_event_sacs(inp_event):
+            sacfile_staname = sacfile.split('.')[0].split('_')[1]
+            if all == False and sacfile_staname not in stalist['sta']:
+                continue
+            if sacfile in skip_sacs:
+                continue
+            channel_sacs.setdefault(sacfile[len(event)+1:], []).append([event, sacfile])
+        os.mkdir(os.path.join(preprocessed_dir, event))
+
+    nsacs = 0
+    for channel, sacs in channel_sacs.items():
+        for i in range(0, len(sacs), max(block_size, 1)):
+            block = sacs[i:i+max(block_size, 1)]
+            print(f"\nstation channel: {channel}; days {i+1}-{i+len(block)} of {len(sacs)}")
+            traces = []
+            block_events = []
+            for event, sacfile in block:
+                try:
+                    traces.append(obspy.read(os.path.join(input_sacs_dir, event, sacfile), format="SAC")[0])
+                    block_events.append(event)
+                except Exception as e:
+                    print(f"    Error! Could not read sac file: {sacfile}")
+            success = sac2ncf_block_procs(traces, block_events, conf, maindir)
+            for tr, event, ok in zip(traces, block_events, success):
+                if not ok:
+                    continue
+                try:
+                    tr.data = tr.data.astype(np.float32)
+                    tr.write(os.path.join(preprocessed_dir, event, f"{event}_{channel}"), format='SAC')
+                    nsacs += 1
+                except Exception as e:
+                    print(f"    Error! Could not write sac file: {event}_{channel}")
+            del traces
+    return nsacs
+
+
+
+def sac2ncf_block_procs(traces, events, conf, maindir):
+    # run the whole 'sac2ncf_procs' chain on a block of in-memory traces (e.g. the days of a station channel;
+    # events: event of each trace); each process runs once per block, see proc.traces_* functions
+    # OUTPUT: success flag per trace
+    success = [True] * len(traces)
+    for i, process in enumerate(conf['sac2ncf']['sac2ncf_procs']):
+        pid = process['pid']
+        index = [j for j in range(len(traces)) if success[j]]
+        if not len(index):
+            break
+        block = [traces[j] for j in index]
+        if pid[0] == 1:
+            print(f"    Process #{i+1}: Decimate (station-major{'; SciPy instead of SAC' if pid[1] == 1 else ''})")
+            final_sampling_freq = {1: 2, 2: 5, 3: 10, 4: 20}.get(process['cmb_sac2ncf_final_sf'], 1)
+            block_success = proc.traces_decimate(block, final_sampling_freq, method=pid[1])
+
+        elif pid == [2,1]:
+            print(f"    Process #{i+1}: Remove instrument response (station-major)")
+            mseeds = conf['download']['le_mseeds']
+            xmldir = process['le_sac2ncf_stametadir']
+            unit = ['DISP', 'VEL', 'ACC'][process['cmb_sac2ncf_resp_output']]
+            prefilter = process['cmb_sac2ncf_resp_prefilter']
+            if prefilter == 0:
+                prefilter = None
+            elif prefilter == 1:
+                prefilter = (0.005, 0.006, 30.0, 35.0)
+
+            xml_files = []
+            for tr, j in zip(block, index):
+                xml_fname = f"{tr.stats.network}.{tr.stats.station}.{tr.stats.channel}"
+                xmldir_2 = os.path.join(maindir, mseeds, events[j])
+                if os.path.isfile(os.path.join(xmldir, xml_fname)):
+                    xml_files.append(os.path.join(xmldir, xml_fname))
+                elif os.path.isfile(os.path.join(xmldir_2, xml_fname)):
+                    xml_files.append(os.path.join(xmldir_2, xml_fname))
+                else:
+                    print(f"    Error! Meta data was not found: {xml_fname}")
+                    xml_files.append(None)
+            found = [j for j, xml_file in enumerate(xml_files) if xml_file is not None]
+            block_success = [False] * len(block)
+            found_success = proc.traces_remove_response([block[j] for j in found], [xml_files[j] for j in found],
+                                                        unit=unit, prefilter=prefilter)
+            for j, ok in zip(found, found_success):
+                block_success[j] = ok
+
+        elif pid[0] == 3:
+            print(f"    Process #{i+1}: Bandpass filter (station-major{'; SciPy instead of SAC' if pid[1] == 1 else ''})")
+            block_success = proc.traces_bandpass_filter(block,
+                            cp1=process['le_sac2ncf_bp_cp1'], cp2=process['le_sac2ncf_bp_cp2'],
+                            n=process['sb_sac2ncf_bp_poles'], p=process['sb_sac2ncf_bp_passes'])
+
+        elif pid[0] == 4:
+            print(f"    Process #{i+1}: Cut seismograms (station-major)")
+            try:
+                cut_begin = float(process['le_sac2ncf_cut_begin'])
+                cut_end = float(process['le_sac2ncf_cut_end'])
+            except Exception as e:
+                print(f"    Error! Cut begin/end values are not set properly!")
+                block_success = [False] * len(block)
+            else:
+                block_success = [proc.trace_cut_fillz(tr, cut_begin, cut_end) for tr in block]
+
+        elif pid == [5,1]:
+            print(f"    Process #{i+1}: Detrend seismograms (station-major)")
+            detrend_method = ['demean', 'linear', 'polynomial', 'spline'][process['cmb_sac2ncf_detrend_method']]
+            block_success = [proc.trace_detrend(tr, detrend_method=detrend_method,
+                             detrend_order=int(process['sb_sac2ncf_detrend_order']),
+                             dspline=int(process['le_sac2ncf_dspline'])) for tr in block]
+
+        elif pid == [6,1]:
+            print(f"    Process #{i+1}: Write SAC headers (station-major)")
+            xmldir = process['le_sac2ncf_stametadir']
+            block_success = []
+            for tr in block:
+                xml_fname = f"{tr.stats.network}.{tr.stats.station}.{tr.stats.channel}"
+                if not os.path.isfile(os.path.join(xmldir, xml_fname)):
+                    print(f"    Error! Meta data was not found: {xml_fname}")
+                    block_success.append(False)
+                    continue
+                inv = proc.read_inventory(os.path.join(xmldir, xml_fname))
+                block_success.append(proc.trace_write_headers(tr, proc.get_inventory_headers(inv)))
+
+        elif pid[0] == 8:
+            print(f"    Process #{i+1}: Temporal normalization (station-major)")
+            if pid[1] == 3:
+                block_success = proc.traces_ram_normalize(block, float(process['le_sac2ncf_ram_window']))
+            else:
+                block_success = proc.traces_one_bit_normalize(block)
+
+        elif pid[0] == 9:
+            print(f"    Process #{i+1}: Spectral whitening (station-major{'; NumPy instead of SAC' if pid[1] == 1 else ''})")
+            if pid[1] == 3:
+                block_success = proc.traces_spectral_whiten(block,
+                                process['le_sac2ncf_whiten_cp1'], process['le_sac2ncf_whiten_cp2'],
+                                smooth=process['le_sac2ncf_whiten_smooth'])
+            else:
+                block_success = proc.traces_whiten(block, int(process['sb_sac2ncf_whiten_order']))
+
+        else:
+            continue
+
+        for j, ok in zip(index, block_success):
+            success[j] = ok
+    return success
+
+
+
+def get_fused_substitutions(sac2ncf_procs):
+    # SAC processes that the in-memory (fused and station-major) chain runs with a native method
+    # OUTPUT: list of the substituted steps
+    substitutions = {(1,1): "Decimate: SAC 'decimate' >> SciPy FIR decimation",
+                     (3,1): "Bandpass filter: SAC 'bp' >> SciPy Butterworth filter",
+                     (9,1): "Spectral whitening: SAC 'whiten' >> NumPy AR whitening"}
+    steps = []
+    for i, process in enumerate(sac2ncf_procs):
+        if tuple(process['pid']) in substitutions:
+            steps.append(f"Process #{i+1}: {substitutions[tuple(process['pid'])]}")
+    return steps
+
+
+
+def sac2ncf_fused_procs(sacfile, conf, maindir, event, output_sacfile=None):
+    # run the whole 'sac2ncf_procs' chain on a single in-memory trace:
+    # one read, one write (output_sacfile; None: overwrite sacfile); the cross-correlation step itself is still event based
+    # OUTPUT: success, process number of the cross-correlation step (0 if not requested)
+    proc_id_xcorr = 0
+    if output_sacfile is None:
+        output_sacfile = sacfile
+    try:
+        st = obspy.read(sacfile, format="SAC")
+        tr = st[0]
+    except Exception as e:
+        print(f"    Error! Could not read sac file: {sacfile}")
+        return False, proc_id_xcorr
+
+    success = True
+    for i, process in enumerate(conf['sac2ncf']['sac2ncf_procs']):
+        pid = process['pid']
+        if not success:
+            break
+        if pid[0] == 1:
+            print(f"    Process #{i+1}: Decimate (in memory{'; SciPy instead of SAC' if pid[1] == 1 else ''})")
+            final_sampling_freq = {1: 2, 2: 5, 3: 10, 4: 20}.get(process['cmb_sac2ncf_final_sf'], 1)
+            success = proc.trace_decimate(tr, final_sampling_freq, method=pid[1])
+
+        elif pid == [2,1]:
+            print(f"    Process #{i+1}: Remove instrument response (in memory)")
+            mseeds = conf['download']['le_mseeds']
+            xmldir = process['le_sac2ncf_stametadir']
+            xmldir_2 = os.path.join(maindir, mseeds, event)
+            unit = ['DISP', 'VEL', 'ACC'][process['cmb_sac2ncf_resp_output']]
+            prefilter = process['cmb_sac2ncf_resp_prefilter']
+            if prefilter == 0:
+                prefilter = None
+            elif prefilter == 1:
+                prefilter = (0.005, 0.006, 30.0, 35.0)
+
+            xml_fname = f"{tr.stats.network}.{tr.stats.station}.{tr.stats.channel}"
+            if os.path.isfile(os.path.join(xmldir, xml_fname)):
+                xml_file = os.path.join(xmldir, xml_fname)
+            elif os.path.isfile(os.path.join(xmldir_2, xml_fname)):
+                xml_file = os.path.join(xmldir_2, xml_fname)
+            else:
+                print(f"    Error! Meta data was not found: {xml_fname}")
+                success = False
+                continue
+            success = proc.trace_remove_response(tr, xml_file, unit=unit, prefilter=prefilter)
+
+        elif pid[0] == 3:
+            print(f"    Process #{i+1}: Bandpass filter (in memory{'; SciPy instead of SAC' if pid[1] == 1 else ''})")
+            success = proc.trace_bandpass_filter(tr,
+                      cp1=process['le_sac2ncf_bp_cp1'], cp2=process['le_sac2ncf_bp_cp2'],
+                      n=process['sb_sac2ncf_bp_poles'], p=process['sb_sac2ncf_bp_passes'])
+
+        elif pid[0] == 4:
+            print(f"    Process #{i+1}: Cut seismograms (in memory)")
+            try:
+                cut_begin = float(process['le_sac2ncf_cut_begin'])
+                cut_end = float(process['le_sac2ncf_cut_end'])
+            except Exception as e:
+                print(f"    Error! Cut begin/end values are not set properly!")
+                success = False
+                continue
+            success = proc.trace_cut_fillz(tr, cut_begin, cut_end)
+
+        elif pid == [5,1]:
+            print(f"    Process #{i+1}: Detrend seismograms (in memory)")
+            detrend_method = ['demean', 'linear', 'polynomial', 'spline'][process['cmb_sac2ncf_detrend_method']]
+            success = proc.trace_detrend(tr, detrend_method=detrend_method,
+                      detrend_order=int(process['sb_sac2ncf_detrend_order']),
+                      dspline=int(process['le_sac2ncf_dspline']))
+
+        elif pid == [6,1]:
+            print(f"    Process #{i+1}: Write SAC headers (in memory)")
+            xmldir = process['le_sac2ncf_stametadir']
+            xml_fname = f"{tr.stats.network}.{tr.stats.station}.{tr.stats.channel}"
+            if not os.path.isfile(os.path.join(xmldir, xml_fname)):
+                print(f"    Error! Meta data was not found: {xml_fname}")
+                success = False
+                continue
+            inv = proc.read_inventory(os.path.join(xmldir, xml_fname))
+            success = proc.trace_write_headers(tr, proc.get_inventory_headers(inv))
+
+        elif pid[0] == 8:
+            print(f"    Process #{i+1}: Temporal normalization (in memory)")
+            if pid[1] == 3:
+                success = proc.trace_ram_normalize(tr, float(process['le_sac2ncf_ram_window']))
+            else:
+                success = proc.trace_one_bit_normalize(tr)
+
+        elif pid[0] == 9:
+            print(f"    Process #{i+1}: Spectral whitening (in memory{'; NumPy instead of SAC' if pid[1] == 1 else ''})")
+            if pid[1] == 3:
+                success = proc.trace_spectral_whiten(tr,
+                          process['le_sac2ncf_whiten_cp1'], process['le_sac2ncf_whiten_cp2'],
+                          smooth=process['le_sac2ncf_whiten_smooth'])
+            else:
+                success = proc.trace_whiten(tr, int(process['sb_sac2ncf_whiten_order']))
+
+        elif pid[0] == 10:
+            proc_id_xcorr = i+1
+
+    # single write of the processed trace (or clean up on failure)
+    if success:
+        try:
+            tr.data = tr.data.astype(np.float32)
+            tr.write(output_sacfile, format='SAC')
+        except Exception as e:
+            success = False
+    if not success and os.path.isfile(output_sacfile):
+        os.remove(output_sacfile)
+    return success, proc_id_xcorr
+
+
+
+def run_sac_pair(sac_cmd, outputs, sta_pair, SAC='/usr/local/sac/bin/sac'):
+    # one SAC batch per station pair: a failing command only affects (and is reported for) its own pair
+    # OUTPUT: list of the output files that were written
+    for output_file in outputs:
+        if os.path.isfile(output_file):
+            os.remove(output_file)
+    if not proc.run_sac(sac_cmd, SAC=SAC):
+        # the SAC pool reported an error: none of the pair's outputs are trusted
+        failed = outputs
+    else:
+        failed = [x for x in outputs if not os.path.isfile(x)]
+    if len(failed):
+        event = os.path.basename(os.path.dirname(outputs[0]))
+        print(f"ERROR! SAC failed for station pair '{sta_pair[0]}-{sta_pair[1]}' ({event}): {', '.join([os.path.basename(x) for x in failed])}")
+    for output_file in failed:
+        if os.path.isfile(output_file):
+            os.remove(output_file)
+    return [x for x in outputs if x not in failed]
+
+
+
+def perform_xcorr_RTZ(event_dir, SAC='/usr/local/sac/bin/sac', catalog=None, event_sta_pairs=None, maxlag=0, output_dir=None):
+    # maxlag: keep lags within +/- maxlag seconds only (0: all lags)
+    # output_dir: directory of the cross-correlation files (None: event_dir)
+    if output_dir is None:
+        output_dir = event_dir
+    if catalog is None:
+        catalog = get_event_catalog(event_dir)
+    if event_sta_pairs is None:
+        event_sta_pairs = get_event_sta_pairs(event_dir, catalog=catalog)
+    # station headers (from the station's first sac file) for the cross-correlation headers
+    sta_headers = {}
+    for row in catalog[::-1]:
+        sta_headers[str(row['kstnm'])] = {'kstnm': str(row['kstnm']), 'knetwk': str(row['knetwk']),
+                                          'stla': row['stla'], 'stlo': row['stlo'], 'stel': row['stel']}
+    tempsac = os.path.join(event_dir, f"temp_{os.getpid()}.sac") # auto correlation file (unique per worker)
+    xcorr_outputs = [] # [output xcorr file, sta1, sta2, component]
     for sta_pair in event_sta_pairs:
+        sac_cmd = []
+        pair_outputs = []
         sta1_sta2_R = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.R")
         sta2_sta1_R = os.path.join(event_dir, f"{sta_pair[1]}_{sta_pair[0]}.R")
-        sta1_sta2_RR = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.RR")
+        sta1_sta2_RR = os.path.join(output_dir, f"{sta_pair[0]}_{sta_pair[1]}.RR")
         sta1_sta2_T = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.T")
         sta2_sta1_T = os.path.join(event_dir, f"{sta_pair[1]}_{sta_pair[0]}.T")
-        sta1_sta2_TT = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.TT")
+        sta1_sta2_TT = os.path.join(output_dir, f"{sta_pair[0]}_{sta_pair[1]}.TT")
         sta1_sta2_Z = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.Z")
         sta2_sta1_Z = os.path.join(event_dir, f"{sta_pair[1]}_{sta_pair[0]}.Z")
-        sta1_sta2_ZZ = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.ZZ")
-        tempsac = os.path.join(event_dir, f"temp.sac") # auto correlation file
+        sta1_sta2_ZZ = os.path.join(output_dir, f"{sta_pair[0]}_{sta_pair[1]}.ZZ")
 
         # RR
         if os.path.isfile(sta1_sta2_R) and os.path.isfile(sta2_sta1_R):
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta1_sta2_R} {sta2_sta1_R}")
-            shell_cmd.append(f"correlate master 1 number 1 normalized")
-            shell_cmd.append(f"w {tempsac} {sta1_sta2_RR}")
-            shell_cmd.append(f"q")
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-            # update headers
-            st1 = obspy.read(sta1_sta2_R, format="SAC", headonly=True)
-            st2 = obspy.read(sta2_sta1_R, format="SAC", headonly=True)
-            headers = {}
-            headers['stla'] = f"{st2[0].stats.sac.stla}"
-            headers['stlo'] = f"{st2[0].stats.sac.stlo}"
-            headers['stel'] = f"{st2[0].stats.sac.stel}"
-            headers['evla'] = f"{st1[0].stats.sac.stla}"
-            headers['evlo'] = f"{st1[0].stats.sac.stlo}"
-            headers['evel'] = f"{st1[0].stats.sac.stel}"
-            headers['kstnm'] = f"{st1[0].stats.sac.kstnm[0:3]}-{st2[0].stats.sac.kstnm[0:3]}"
-            headers['knetwk'] = f"{st1[0].stats.sac.knetwk}-{st2[0].stats.sac.knetwk}"
-            headers['kcmpnm'] = "RR"
-            headers['kevnm'] = f"{st1[0].stats.sac.kstnm}_{st2[0].stats.sac.kstnm}_RR"
-            proc.write_sac_headers(sta1_sta2_RR, headers, SAC=SAC)
+            sac_cmd.append(f"r {sta1_sta2_R} {sta2_sta1_R}")
+            sac_cmd.append(f"correlate master 1 number 1 normalized")
+            if maxlag > 0:
+                sac_cmd.append(f"cutim {-maxlag} {maxlag}")
+            sac_cmd.append(f"w {tempsac} {sta1_sta2_RR}")
+            pair_outputs.append(sta1_sta2_RR)
 
         # TT
         if os.path.isfile(sta1_sta2_T) and os.path.isfile(sta2_sta1_T):
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta1_sta2_T} {sta2_sta1_T}")
-            shell_cmd.append(f"correlate master 1 number 1 normalized")
-            shell_cmd.append(f"w {tempsac} {sta1_sta2_TT}")
-            shell_cmd.append(f"q")
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-            # update headers
-            st1 = obspy.read(sta1_sta2_T, format="SAC", headonly=True)
-            st2 = obspy.read(sta2_sta1_T, format="SAC", headonly=True)
-            headers = {}
-            headers['stla'] = f"{st2[0].stats.sac.stla}"
-            headers['stlo'] = f"{st2[0].stats.sac.stlo}"
-            headers['stel'] = f"{st2[0].stats.sac.stel}"
-            headers['evla'] = f"{st1[0].stats.sac.stla}"
-            headers['evlo'] = f"{st1[0].stats.sac.stlo}"
-            headers['evel'] = f"{st1[0].stats.sac.stel}"
-            headers['kstnm'] = f"{st1[0].stats.sac.kstnm[0:3]}-{st2[0].stats.sac.kstnm[0:3]}"
-            headers['knetwk'] = f"{st1[0].stats.sac.knetwk}-{st2[0].stats.sac.knetwk}"
-            headers['kcmpnm'] = "TT"
-            headers['kevnm'] = f"{st1[0].stats.sac.kstnm}_{st2[0].stats.sac.kstnm}_TT"
-            proc.write_sac_headers(sta1_sta2_TT, headers, SAC=SAC)
+            sac_cmd.append(f"r {sta1_sta2_T} {sta2_sta1_T}")
+            sac_cmd.append(f"correlate master 1 number 1 normalized")
+            if maxlag > 0:
+                sac_cmd.append(f"cutim {-maxlag} {maxlag}")
+            sac_cmd.append(f"w {tempsac} {sta1_sta2_TT}")
+            pair_outputs.append(sta1_sta2_TT)
 
         # ZZ
         if os.path.isfile(sta1_sta2_Z) and os.path.isfile(sta2_sta1_Z):
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta1_sta2_Z} {sta2_sta1_Z}")
-            shell_cmd.append(f"correlate master 1 number 1 normalized")
-            shell_cmd.append(f"w {tempsac} {sta1_sta2_ZZ}")
-            shell_cmd.append(f"q")
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-            # update headers
-            st1 = obspy.read(sta1_sta2_Z, format="SAC", headonly=True)
-            st2 = obspy.read(sta2_sta1_Z, format="SAC", headonly=True)
-            headers = {}
-            headers['stla'] = f"{st2[0].stats.sac.stla}"
-            headers['stlo'] = f"{st2[0].stats.sac.stlo}"
-            headers['stel'] = f"{st2[0].stats.sac.stel}"
-            headers['evla'] = f"{st1[0].stats.sac.stla}"
-            headers['evlo'] = f"{st1[0].stats.sac.stlo}"
-            headers['evel'] = f"{st1[0].stats.sac.stel}"
-            headers['kstnm'] = f"{st1[0].stats.sac.kstnm[0:3]}-{st2[0].stats.sac.kstnm[0:3]}"
-            headers['knetwk'] = f"{st1[0].stats.sac.knetwk}-{st2[0].stats.sac.knetwk}"
-            headers['kcmpnm'] = "ZZ"
-            headers['kevnm'] = f"{st1[0].stats.sac.kstnm}_{st2[0].stats.sac.kstnm}_ZZ"
-            proc.write_sac_headers(sta1_sta2_ZZ, headers, SAC=SAC)
-
-
-
-def get_event_sta_components(event_dir):
-    event_sta_components = {}
-    sacfiles = get_event_sacs(event_dir)
+            sac_cmd.append(f"r {sta1_sta2_Z} {sta2_sta1_Z}")
+            sac_cmd.append(f"correlate master 1 number 1 normalized")
+            if maxlag > 0:
+                sac_cmd.append(f"cutim {-maxlag} {maxlag}")
+            sac_cmd.append(f"w {tempsac} {sta1_sta2_ZZ}")
+            pair_outputs.append(sta1_sta2_ZZ)
+
+        if len(sac_cmd):
+            for xcorr_file in run_sac_pair(sac_cmd, pair_outputs, sta_pair, SAC=SAC):
+                xcorr_outputs.append([xcorr_file, sta_pair[0], sta_pair[1], xcorr_file.split('.')[-1]])
+
+    # update headers
+    for xcorr_file, sta1, sta2, cmp in xcorr_outputs:
+        headers = xcorr_engine.get_xcorr_headers(sta_headers[sta1], sta_headers[sta2], cmp)
+        proc.write_sac_headers(xcorr_file, headers, SAC=SAC)
+
+
+
+def perform_xcorr_RTZ_fft(event_dir, catalog=None, event_sta_pairs=None, maxlag=0, window=0, overlap=0, weighted=False, output_dir=None):
+    # RR, TT, and ZZ cross-correlations using the FFT engine; horizontals are rotated to
+    # R and T in memory, so no PPN/PPE, R, T, or Z copies are generated
+    if catalog is None:
+        catalog = get_event_catalog(event_dir)
+    event_sta_components = get_event_sta_components(event_dir, catalog=catalog)
+    if event_sta_pairs is None:
+        event_sta_pairs = get_event_sta_pairs(event_dir, catalog=catalog)
+    if output_dir is None:
+        output_dir = event_dir
+    return xcorr_engine.xcorr_event_RTZ(output_dir, event_sta_components, event_sta_pairs, maxlag=maxlag,
+                                        window=window, overlap=overlap, weighted=weighted)
+
+
+
+def perform_xcorr_tensor(event_dir, outputs=0, catalog=None, event_sta_pairs=None, maxlag=0, window=0, overlap=0, weighted=False, output_dir=None):
+    # N/E/Z correlation tensor of every pair, rotated to RR, TT, ZZ (outputs=1: and RT, TR, RZ, ZR);
+    # outputs=2: the tensor components (NN, NE, EN, EE, NZ, EZ, ZN, ZE) are also kept
+    if catalog is None:
+        catalog = get_event_catalog(event_dir)
+    event_sta_components = get_event_sta_components(event_dir, catalog=catalog)
+    if event_sta_pairs is None:
+        event_sta_pairs = get_event_sta_pairs(event_dir, catalog=catalog)
+    if output_dir is None:
+        output_dir = event_dir
+    return xcorr_engine.xcorr_event_tensor(output_dir, event_sta_components, event_sta_pairs, outputs=outputs, maxlag=maxlag,
+                                           window=window, overlap=overlap, weighted=weighted)
+
+
+
+def get_event_catalog(event_dir, sacfiles=None):
+    # one header scan per event directory (sacfiles: list of sac file paths; None: sac files in event_dir)
+    # OUTPUT: structured array with one row per readable sac file (undefined float headers: nan)
+    if sacfiles is None:
+        sacfiles = [os.path.join(event_dir, sacfile) for sacfile in get_event_sacs(event_dir)]
+    rows = []
     for sacfile in sacfiles:
         try:
-            st = obspy.read(os.path.join(event_dir, sacfile), headonly=True)
-            kstnm = st[0].stats.sac.kstnm
-            cmpaz = float(st[0].stats.sac.cmpaz)
-            cmpinc = float(st[0].stats.sac.cmpinc)
-            if kstnm not in event_sta_components.keys():
-                event_sta_components[f'{kstnm}'] = [[], [], []]
+            hdr = sacio.read_header(sacfile)
+            rows.append((hdr['kstnm'], hdr.get('knetwk', ''), hdr.get('kcmpnm', ''),
+                         *[float(hdr.get(x, np.nan)) for x in ['stla', 'stlo', 'stel', 'cmpaz', 'cmpinc', 'delta']],
+                         int(hdr['npts']), sacfile))
         except Exception as e:
             pass
+    max_path_len = max([len(row[-1]) for row in rows] + [1])
+    return np.array(rows, dtype=catalog_dtype + [('path', f'U{max_path_len}')])
 
-        # for ??1 and ??2 components
-        if cmpaz> 315 or cmpaz< 45:
-            cmpaz = 0
-        if cmpaz> 45 and cmpaz< 135:
-            cmpaz = 90
 
-        if cmpaz == 0 and cmpinc == 90:
-            event_sta_components[f'{kstnm}'][0].append(sacfile)
-        elif cmpaz == 90 and cmpinc == 90:
-            event_sta_components[f'{kstnm}'][1].append(sacfile)
-        elif cmpaz == 0 and cmpinc == 0:
-            event_sta_components[f'{kstnm}'][2].append(sacfile)
+def get_catalog_stations(catalog):
+    # unique station names in the order they first appear (sorted sac file names)
+    _, index = np.unique(catalog['kstnm'], return_index=True)
+    return [str(sta) for sta in catalog['kstnm'][np.sort(index)]]
 
-    return event_sta_components
 
+def get_catalog_component_masks(catalog):
+    # OUTPUT: north, east, and vertical component masks (cmpaz within 45 degrees of 0 or 90 for ??1 and ??2 components)
+    cmpaz = catalog['cmpaz']
+    cmpinc = catalog['cmpinc']
+    cmpaz = np.where((cmpaz > 315) | (cmpaz < 45), 0, cmpaz)
+    cmpaz = np.where((cmpaz > 45) & (cmpaz < 135), 90, cmpaz)
+    north = (cmpaz == 0) & (cmpinc == 90)
+    east = (cmpaz == 90) & (cmpinc == 90)
+    vertical = (cmpaz == 0) & (cmpinc == 0)
+    return north, east, vertical
 
-def get_event_sta_pairs(event_dir):
-    event_sta_pairs = []
-    event_sta_list = []
-    sacfiles = get_event_sacs(event_dir)
-    for sacfile in sacfiles:
-        try:
-            st = obspy.read(os.path.join(event_dir, sacfile), headonly=True)
-            kstnm = st[0].stats.sac.kstnm
 
-            if kstnm not in event_sta_list:
-                event_sta_list.append(kstnm)
-        except:
-            pass
+def get_catalog_rows(catalog):
+    # OUTPUT: {sac file path: catalog row}
+    return {str(row['path']): row for row in catalog}
 
-    for i, sta1 in enumerate(event_sta_list):
-        for j, sta2 in enumerate(event_sta_list):
-            if i != j and [sta1, sta2] not in event_sta_pairs\
-                      and [sta2, sta1] not in event_sta_pairs:
-                event_sta_pairs.append([sta1, sta2])
 
-    return event_sta_pairs
+def get_event_sta_components(event_dir, catalog=None):
+    # OUTPUT: {station: [north files, east files, vertical files]} (sac file paths)
+    if catalog is None:
+        catalog = get_event_catalog(event_dir)
+    event_sta_components = {}
+    for sta in get_catalog_stations(catalog):
+        event_sta_components[sta] = [[], [], []]
+    for icmp, mask in enumerate(get_catalog_component_masks(catalog)):
+        for kstnm, path in zip(catalog['kstnm'][mask], catalog['path'][mask]):
+            event_sta_components[str(kstnm)][icmp].append(str(path))
+    return event_sta_components
 
 
+def get_event_sta_pairs(event_dir, catalog=None, min_dist=0, max_dist=0):
+    # station pairs (same order as itertools.combinations); pairs are pruned by their
+    # interstation distance (km) if min_dist or max_dist (0: no limit) is set
+    if catalog is None:
+        catalog = get_event_catalog(event_dir)
+    event_sta_list = get_catalog_stations(catalog)
+    ista1, ista2 = np.triu_indices(len(event_sta_list), 1)
+    if min_dist > 0 or max_dist > 0:
+        _, index = np.unique(catalog['kstnm'], return_index=True)
+        sta_rows = catalog[np.sort(index)]
+        dist = get_distances(sta_rows['stla'][ista1], sta_rows['stlo'][ista1],
+                             sta_rows['stla'][ista2], sta_rows['stlo'][ista2])
+        keep = dist >= min_dist
+        if max_dist > 0:
+            keep &= dist <= max_dist
+        print(f"    Station pairs: {np.count_nonzero(keep)} of {len(keep)} are within the distance range")
+        if np.any(np.isnan(dist)):
+            print(f"    Warning! {np.count_nonzero(np.isnan(dist))} station pairs are skipped: station coordinates (stla, stlo) are not set")
+        ista1 = ista1[keep]
+        ista2 = ista2[keep]
+    return [[event_sta_list[i], event_sta_list[j]] for i, j in zip(ista1, ista2)]
 
 
-def generate_xcorr_RTZ_files(event_dir, SAC='/usr/local/sac/bin/sac'):
-    # generate radial (R), tangential (T), and vertical (Z) components
+def get_distances(lat1, lon1, lat2, lon2):
+    # vectorized great-circle distance in km on a sphere with geocentric latitudes (same as the 'dist' header of
+    # the FFT cross-correlations; SAC computes 'dist' on the ellipsoid, so it can differ by a few tenths of a percent)
+    return xcorr_engine.get_azimuths(lat1, lon1, lat2, lon2)[2] * xcorr_engine.km_per_deg
 
-    event_sta_components = get_event_sta_components(event_dir)
-    event_sta_pairs = get_event_sta_pairs(event_dir)
+
+
+
+def generate_xcorr_RTZ_files(event_dir, SAC='/usr/local/sac/bin/sac', catalog=None, event_sta_pairs=None):
+    # generate radial (R), tangential (T), and vertical (Z) components
+    if catalog is None:
+        catalog = get_event_catalog(event_dir)
+    catalog_rows = get_catalog_rows(catalog)
+    event_sta_components = get_event_sta_components(event_dir, catalog=catalog)
+    if event_sta_pairs is None:
+        event_sta_pairs = get_event_sta_pairs(event_dir, catalog=catalog)
 
     for sta_pair in event_sta_pairs:
         sta1 = sta_pair[0]
         sta2 = sta_pair[1]
+        sac_cmd = []
+        pair_outputs = []
 
         sta1_Hdata_available = len(event_sta_components[f"{sta1}"][0]) and len(event_sta_components[f"{sta1}"][1])
         sta2_Hdata_available = len(event_sta_components[f"{sta2}"][0]) and len(event_sta_components[f"{sta2}"][1])
         sta1_sta2_Zdata_available = len(event_sta_components[f"{sta1}"][2]) and len(event_sta_components[f"{sta2}"][2])
         
-        # generate PPN and PPE (northern and eastern cross-correlation perporcessing sac files)
+        # generate PPN and PPE (northern and eastern cross-correlation perporcessing sac files),
+        # and the radial and tangential components (one SAC batch per station pair)
         if sta1_Hdata_available and sta2_Hdata_available:
-            try:
-                st_sta1 = obspy.read(os.path.join(event_dir, event_sta_components[f"{sta1}"][0][0]), headonly=True)
-                st_sta2 = obspy.read(os.path.join(event_dir, event_sta_components[f"{sta2}"][0][0]), headonly=True)
-                sta1_stla = float(st_sta1[0].stats.sac.stla)
-                sta1_stlo = float(st_sta1[0].stats.sac.stlo)
-                sta1_stel = float(st_sta1[0].stats.sac.stel)
-
-                sta2_stla = float(st_sta2[0].stats.sac.stla)
-                sta2_stlo = float(st_sta2[0].stats.sac.stlo)
-                sta2_stel = float(st_sta2[0].stats.sac.stel)
-            except Exception as e:
+            hdr_sta1 = catalog_rows[event_sta_components[f"{sta1}"][0][0]]
+            hdr_sta2 = catalog_rows[event_sta_components[f"{sta2}"][0][0]]
+            if np.isnan([hdr_sta1['stla'], hdr_sta1['stlo'], hdr_sta1['stel'],
+                         hdr_sta2['stla'], hdr_sta2['stlo'], hdr_sta2['stel']]).any():
                 continue
-            # sta1_sta2.PPN
-            sta1_sta2_PPN = os.path.join(event_dir, f"{sta1}_{sta2}.PPN")
-            sta1_sta2_PPN_src = os.path.join(event_dir, event_sta_components[f"{sta1}"][0][0])
-            shutil.copyfile(sta1_sta2_PPN_src, sta1_sta2_PPN)
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta1_sta2_PPN}")
-            shell_cmd.append(f"chnhdr evla {sta2_stla}")
-            shell_cmd.append(f"chnhdr evlo {sta2_stlo}")
-            shell_cmd.append(f"chnhdr evel {sta2_stel}")
-            shell_cmd.append(f"wh")
-            shell_cmd.append('quit')
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-
-            # sta1_sta2.PPE
-            sta1_sta2_PPE = os.path.join(event_dir, f"{sta1}_{sta2}.PPE")
-            sta1_sta2_PPE_src = os.path.join(event_dir, event_sta_components[f"{sta1}"][1][0])
-            shutil.copyfile(sta1_sta2_PPE_src, sta1_sta2_PPE)
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta1_sta2_PPE}")
-            shell_cmd.append(f"chnhdr evla {sta2_stla}")
-            shell_cmd.append(f"chnhdr evlo {sta2_stlo}")
-            shell_cmd.append(f"chnhdr evel {sta2_stel}")
-            shell_cmd.append(f"wh")
-            shell_cmd.append('quit')
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-
-            # sta2_sta1.PPN
-            sta2_sta1_PPN = os.path.join(event_dir, f"{sta2}_{sta1}.PPN")
-            sta2_sta1_PPN_src = os.path.join(event_dir, event_sta_components[f"{sta2}"][0][0])
-            shutil.copyfile(sta2_sta1_PPN_src, sta2_sta1_PPN)
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta2_sta1_PPN}")
-            shell_cmd.append(f"chnhdr evla {sta1_stla}")
-            shell_cmd.append(f"chnhdr evlo {sta1_stlo}")
-            shell_cmd.append(f"chnhdr evel {sta1_stel}")
-            shell_cmd.append(f"wh")
-            shell_cmd.append('quit')
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-
-            # sta2_sta1.PPE
-            sta2_sta1_PPE = os.path.join(event_dir, f"{sta2}_{sta1}.PPE")
-            sta2_sta1_PPE_src = os.path.join(event_dir, event_sta_components[f"{sta2}"][1][0])
-            shutil.copyfile(sta2_sta1_PPE_src, sta2_sta1_PPE)
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta2_sta1_PPE}")
-            shell_cmd.append(f"chnhdr evla {sta1_stla}")
-            shell_cmd.append(f"chnhdr evlo {sta1_stlo}")
-            shell_cmd.append(f"chnhdr evel {sta1_stel}")
-            shell_cmd.append(f"wh")
-            shell_cmd.append('quit')
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
+            for sta_a, sta_b, hdr_b in [[sta1, sta2, hdr_sta2], [sta2, sta1, hdr_sta1]]:
+                event_headers = {'evla': hdr_b['stla'], 'evlo': hdr_b['stlo'], 'evel': hdr_b['stel']}
+                sta_a_sta_b_PPN = os.path.join(event_dir, f"{sta_a}_{sta_b}.PPN")
+                sta_a_sta_b_PPN_src = event_sta_components[f"{sta_a}"][0][0]
+                sta_a_sta_b_PPE = os.path.join(event_dir, f"{sta_a}_{sta_b}.PPE")
+                sta_a_sta_b_PPE_src = event_sta_components[f"{sta_a}"][1][0]
+                sta_a_sta_b_R = os.path.join(event_dir, f"{sta_a}_{sta_b}.R")
+                sta_a_sta_b_T = os.path.join(event_dir, f"{sta_a}_{sta_b}.T")
+                cmpaz_PPN = catalog_rows[event_sta_components[f"{sta_a}"][0][0]]['cmpaz']
+                cmpaz_PPE = catalog_rows[event_sta_components[f"{sta_a}"][1][0]]['cmpaz']
+                cmpaz_dif = int(round(abs(cmpaz_PPN - cmpaz_PPE), 0))
+                if cmpaz_dif not in [90, 270]:
+                    print(f"ERROR! Horizontal component azimuths are not 90 degrees apart for '{sta_a}' >> {cmpaz_dif}")
+                    continue
+                shutil.copyfile(sta_a_sta_b_PPN_src, sta_a_sta_b_PPN)
+                sacio.update_header(sta_a_sta_b_PPN, event_headers)
+                shutil.copyfile(sta_a_sta_b_PPE_src, sta_a_sta_b_PPE)
+                sacio.update_header(sta_a_sta_b_PPE, event_headers)
+                sac_cmd.append(f"r {sta_a_sta_b_PPN} {sta_a_sta_b_PPE}")
+                sac_cmd.append("rotate to gcp")
+                sac_cmd.append(f"w {sta_a_sta_b_R} {sta_a_sta_b_T}")
+                pair_outputs += [sta_a_sta_b_R, sta_a_sta_b_T]
+
+        if len(sac_cmd):
+            run_sac_pair(sac_cmd, pair_outputs, sta_pair, SAC=SAC)
 
         # generate Z (vertical component cross-correlation perporcessing sac files)
         if sta1_sta2_Zdata_available:
-            try:
-                st_sta1 = obspy.read(os.path.join(event_dir, event_sta_components[f"{sta1}"][2][0]), headonly=True)
-                st_sta2 = obspy.read(os.path.join(event_dir, event_sta_components[f"{sta2}"][2][0]), headonly=True)
-                sta1_stla = float(st_sta1[0].stats.sac.stla)
-                sta1_stlo = float(st_sta1[0].stats.sac.stlo)
-                sta1_stel = float(st_sta1[0].stats.sac.stel)
-                
-                sta2_stla = float(st_sta2[0].stats.sac.stla)
-                sta2_stlo = float(st_sta2[0].stats.sac.stlo)
-                sta2_stel = float(st_sta2[0].stats.sac.stel)
-            except Exception as e:
+            hdr_sta1 = catalog_rows[event_sta_components[f"{sta1}"][2][0]]
+            hdr_sta2 = catalog_rows[event_sta_components[f"{sta2}"][2][0]]
+            if np.isnan([hdr_sta1['stla'], hdr_sta1['stlo'], hdr_sta1['stel'],
+                         hdr_sta2['stla'], hdr_sta2['stlo'], hdr_sta2['stel']]).any():
                 continue
-
-            # sta1_sta2.Z
-            sta1_sta2_Z = os.path.join(event_dir, f"{sta1}_{sta2}.Z")
-            sta1_sta2_Z_src = os.path.join(event_dir, event_sta_components[f"{sta1}"][2][0])
-            shutil.copyfile(sta1_sta2_Z_src, sta1_sta2_Z)
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta1_sta2_Z}")
-            shell_cmd.append(f"chnhdr evla {sta2_stla}")
-            shell_cmd.append(f"chnhdr evlo {sta2_stlo}")
-            shell_cmd.append(f"chnhdr evel {sta2_stel}")
-            shell_cmd.append(f"wh")
-            shell_cmd.append('quit')
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-
-            # sta2_sta1.Z
-            sta2_sta1_Z = os.path.join(event_dir, f"{sta2}_{sta1}.Z")
-            sta2_sta1_Z_src = os.path.join(event_dir, event_sta_components[f"{sta2}"][2][0])
-            shutil.copyfile(sta2_sta1_Z_src, sta2_sta1_Z)
-            shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-            shell_cmd.append(f"r {sta2_sta1_Z}")
-            shell_cmd.append(f"chnhdr evla {sta1_stla}")
-            shell_cmd.append(f"chnhdr evlo {sta1_stlo}")
-            shell_cmd.append(f"chnhdr evel {sta1_stel}")
-            shell_cmd.append(f"wh")
-            shell_cmd.append('quit')
-            shell_cmd.append('EOF')
-            shell_cmd = '\n'.join(shell_cmd)
-            subprocess.call(shell_cmd, shell=True)
-
-    # generate radial and tangential components:
-    for sta_pair in event_sta_pairs:
-        # sta1_sta2
-        sta1_sta2_PPN = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.PPN")
-        sta1_sta2_PPE = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.PPE")
-        sta1_sta2_R = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.R")
-        sta1_sta2_T = os.path.join(event_dir, f"{sta_pair[0]}_{sta_pair[1]}.T")
-        if os.path.isfile(sta1_sta2_PPN) and os.path.isfile(sta1_sta2_PPE):
-            st_PPN = obspy.read(sta1_sta2_PPN, headonly=True)
-            st_PPE = obspy.read(sta1_sta2_PPE, headonly=True)
-            cmpaz_PPN = float(st_PPN[0].stats.sac.cmpaz)
-            cmpaz_PPE = float(st_PPE[0].stats.sac.cmpaz)
-            cmpaz_dif = int(round(abs(cmpaz_PPN - cmpaz_PPE), 0))
-            if cmpaz_dif in [90, 270]:
-                shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-                shell_cmd.append(f"r {sta1_sta2_PPN} {sta1_sta2_PPE}")
-                shell_cmd.append("rotate to gcp")
-                shell_cmd.append(f"w {sta1_sta2_R} {sta1_sta2_T}")
-                shell_cmd.append('quit')
-                shell_cmd.append('EOF')
-                shell_cmd = '\n'.join(shell_cmd)
-                subprocess.call(shell_cmd, shell=True)
-            else:
-                print(f"ERROR! Horizontal component azimuths are not 90 degrees apart for '{sta_pair[0]}' >> {cmpaz_dif}")
-
-        # sta2_sta1
-        sta2_sta1_PPN = os.path.join(event_dir, f"{sta_pair[1]}_{sta_pair[0]}.PPN")
-        sta2_sta1_PPE = os.path.join(event_dir, f"{sta_pair[1]}_{sta_pair[0]}.PPE")
-        sta2_sta1_R = os.path.join(event_dir, f"{sta_pair[1]}_{sta_pair[0]}.R")
-        sta2_sta1_T = os.path.join(event_dir, f"{sta_pair[1]}_{sta_pair[0]}.T")
-        if os.path.isfile(sta2_sta1_PPN) and os.path.isfile(sta2_sta1_PPE):
-            st_PPN = obspy.read(sta2_sta1_PPN, headonly=True)
-            st_PPE = obspy.read(sta2_sta1_PPE, headonly=True)
-            cmpaz_PPN = float(st_PPN[0].stats.sac.cmpaz)
-            cmpaz_PPE = float(st_PPE[0].stats.sac.cmpaz)
-            cmpaz_dif = int(round(abs(cmpaz_PPN - cmpaz_PPE), 0))
-            if cmpaz_dif in [90, 270]:
-                shell_cmd = ["export SAC_DISPLAY_COPYRIGHT=0", f"{SAC}<<EOF"]
-                shell_cmd.append(f"r {sta2_sta1_PPN} {sta2_sta1_PPE}")
-                shell_cmd.append("rotate to gcp")
-                shell_cmd.append(f"w {sta2_sta1_R} {sta2_sta1_T}")
-                shell_cmd.append('quit')
-                shell_cmd.append('EOF')
-                shell_cmd = '\n'.join(shell_cmd)
-                subprocess.call(shell_cmd, shell=True)
-            else:
-                print(f"ERROR! Horizontal component azimuths are not 90 degrees apart for '{sta_pair[1]}' >> {cmpaz_dif}")
-    
+            for sta_a, sta_b, hdr_b in [[sta1, sta2, hdr_sta2], [sta2, sta1, hdr_sta1]]:
+                sta_a_sta_b_Z = os.path.join(event_dir, f"{sta_a}_{sta_b}.Z")
+                sta_a_sta_b_Z_src = event_sta_components[f"{sta_a}"][2][0]
+                shutil.copyfile(sta_a_sta_b_Z_src, sta_a_sta_b_Z)
+                sacio.update_header(sta_a_sta_b_Z, {'evla': hdr_b['stla'], 'evlo': hdr_b['stlo'], 'evel': hdr_b['stel']})
 
 
 
@@ -606,19 +1184,3 @@ def get_event_RTZs(event_dir):
             rtz_files.append(x)
     return rtz_files
 
-
-def copy_event(src_event, dst_event):
-    if not os.path.isdir(dst_event):
-        os.mkdir(dst_event)
-    sac_files = get_event_sacs(src_event)
-    for sac_file in sac_files:
-        src_sac = os.path.join(src_event, sac_file)
-        dst_sac = os.path.join(dst_event, sac_file)
-        shutil.copyfile(src_sac, dst_sac)
-
-
-def remove_all_files_except_regex(directory, regex):
-    for f in os.listdir(directory):
-        if not regex.match(f):
-            os.remove(os.path.join(directory, f))
-
@@ -0,0 +1,164 @@
+# pool of long-lived SAC processes fed with commands through a pipe (one SAC startup per worker
+# instead of one shell + SAC startup per file per process)
+
+import os
+import pty
+import time
+import queue
+import select
+import subprocess
+
+# commands that leave state behind in a SAC session; they are reset after every job
+reset_commands = ["cut off", "cuterr usebe"]
+
+
+class SACProcess:
+    def __init__(self, SAC='/usr/local/sac/bin/sac', timeout=3600):
+        self.SAC = SAC
+        self.timeout = timeout
+        self.njobs = 0
+        self.start()
+
+
+    def start(self):
+        # SAC block-buffers its output if it is not a terminal; a pseudo-terminal keeps it line buffered
+        env = os.environ.copy()
+        env['SAC_DISPLAY_COPYRIGHT'] = '0'
+        self.master, slave = pty.openpty()
+        self.process = subprocess.Popen([self.SAC], stdin=subprocess.PIPE, stdout=slave, stderr=slave,
+                                        env=env, close_fds=True, universal_newlines=True, bufsize=1)
+        os.close(slave)
+        self.buffer = ''
+
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+
+    def close(self):
+        try:
+            if self.is_alive():
+                self.process.stdin.write("quit\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=10)
+        except Exception as e:
+            self.process.kill()
+        finally:
+            os.close(self.master)
+
+
+    def restart(self):
+        try:
+            self.process.kill()
+            os.close(self.master)
+        except Exception as e:
+            pass
+        self.start()
+
+
+    def readline(self, deadline):
+        while '\n' not in self.buffer:
+            wait = deadline - time.perf_counter()
+            if wait <= 0:
+                raise TimeoutError("SAC did not respond in time")
+            ready, _, _ = select.select([self.master], [], [], wait)
+            if ready:
+                try:
+                    chunk = os.read(self.master, 65536)
+                except OSError:
+                    chunk = b''
+                if not chunk:
+                    raise EOFError("SAC process exited")
+                self.buffer += chunk.decode('ascii', 'replace').replace('\r', '')
+        line, self.buffer = self.buffer.split('\n', 1)
+        return line
+
+
+    def run(self, commands):
+        # INPUT: list of SAC commands ('quit' commands are ignored)
+        # OUTPUT: list of [command, latency (s), output lines, error lines] for each command
+        # Every command is followed by a 'message' sentinel; the sentinel's arrival marks its completion.
+        self.njobs += 1
+        commands = [cmd for cmd in commands if cmd.strip().lower() not in ['q', 'quit']]
+        sentinels = []
+        script = []
+        for i, cmd in enumerate(commands + reset_commands):
+            sentinel = f"ANS_SAC_DONE_{self.njobs}_{i}"
+            sentinels.append(sentinel)
+            script.append(cmd)
+            script.append(f'message "{sentinel}"')
+
+        results = []
+        t0 = time.perf_counter()
+        deadline = t0 + self.timeout
+        try:
+            self.process.stdin.write('\n'.join(script) + '\n')
+            self.process.stdin.flush()
+            for i, sentinel in enumerate(sentinels):
+                output = []
+                while True:
+                    line = self.readline(deadline)
+                    if sentinel in line and 'message' not in line.lower():
+                        break
+                    if line.strip() and sentinel not in line:
+                        output.append(line.strip())
+                t1 = time.perf_counter()
+                if i < len(commands):
+                    errors = [line for line in output if 'ERROR' in line.upper()]
+                    results.append([commands[i], t1 - t0, output, errors])
+                t0 = t1
+        except (TimeoutError, EOFError, BrokenPipeError, OSError) as e:
+            # the session is in an unknown state: start a new one and report the failure
+            self.restart()
+            for cmd in commands[len(results):]:
+                results.append([cmd, time.perf_counter() - t0, [], [f"ERROR: {e}"]])
+        return results
+
+
+
+class SACPool:
+    def __init__(self, SAC='/usr/local/sac/bin/sac', size=1, timeout=3600):
+        self.SAC = SAC
+        self.size = max(int(size), 1)
+        self.idle = queue.Queue()
+        for i in range(self.size):
+            self.idle.put(SACProcess(SAC, timeout=timeout))
+        self.latencies = {} # {command name: [number of calls, total latency (s), max latency (s)]}
+        self.nerrors = 0
+
+
+    def run(self, commands, verbose=False):
+        # OUTPUT: True if no SAC command reported an error
+        sac_process = self.idle.get()
+        try:
+            results = sac_process.run(commands)
+        finally:
+            self.idle.put(sac_process)
+
+        success = True
+        for cmd, latency, output, errors in results:
+            name = cmd.split()[0].lower() if cmd.split() else ''
+            stats = self.latencies.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += latency
+            stats[2] = max(stats[2], latency)
+            if len(errors):
+                success = False
+                self.nerrors += 1
+                if verbose:
+                    print(f"    SAC error in '{cmd}': {' '.join(errors)}")
+        return success
+
+
+    def report(self):
+        lines = [f"SAC pool ({self.size} process(es)); command latency:"]
+        for name in sorted(self.latencies, key=lambda x: -self.latencies[x][1]):
+            ncalls, total, maximum = self.latencies[name]
+            lines.append(f"    {name:<10s} calls: {ncalls:<8d} mean: {1000*total/ncalls:8.2f} ms  max: {1000*maximum:8.2f} ms  total: {total:8.2f} s")
+        lines.append(f"    commands with errors: {self.nerrors}")
+        return '\n'.join(lines)
+
+
+    def close(self):
+        for i in range(self.size):
+            self.idle.get().close()
@@ -0,0 +1,483 @@
+# FFT-based cross-correlation engine: the spectrum of each input trace is computed when it is first
+# needed (and kept in a bounded station cache), and all station pair correlations are formed by
+# conjugate multiplication and an inverse FFT
+
+import os
+import collections
+import numpy as np
+from scipy.fft import next_fast_len
+from . import sacio
+
+flattening = 1 / 298.257223563 # WGS84
+km_per_deg = 111.19492664455873
+
+
+def get_xcorr_headers(hdr1, hdr2, cmp):
+    # headers of a cross-correlation (sta1: virtual source, sta2: receiver) as written after SAC correlate
+    headers = {}
+    headers['stla'] = f"{hdr2['stla']}"
+    headers['stlo'] = f"{hdr2['stlo']}"
+    headers['stel'] = f"{hdr2['stel']}"
+    headers['evla'] = f"{hdr1['stla']}"
+    headers['evlo'] = f"{hdr1['stlo']}"
+    headers['evel'] = f"{hdr1['stel']}"
+    headers['kstnm'] = f"{hdr1['kstnm'][0:3]}-{hdr2['kstnm'][0:3]}"
+    headers['knetwk'] = f"{hdr1['knetwk']}-{hdr2['knetwk']}"
+    headers['kcmpnm'] = cmp
+    headers['kevnm'] = f"{hdr1['kstnm']}_{hdr2['kstnm']}_{cmp}"
+    return headers
+
+
+
+def get_xcorr_output_headers(hdr1, hdr2, cmp, maxlag=None):
+    # full header of an output cross-correlation: master (sta1) header without the data-dependent
+    # fields, begin time of the first (most negative) lag, and the cross-correlation headers
+    headers = dict(hdr1)
+    for hdr in ['depmin', 'depmax', 'depmen', 'e', 'npts', 'a', 'f', 'o']:
+        headers.pop(hdr, None)
+    headers['b'] = -get_lag_range(hdr1['npts'], hdr2['npts'], maxlag)[0] * hdr1['delta']
+    headers.update(get_xcorr_headers(hdr1, hdr2, cmp))
+    return headers
+
+
+
+def get_azimuths(lat1, lon1, lat2, lon2):
+    # vectorized great-circle azimuth from point 1 to point 2, back-azimuth (azimuth from point 2
+    # to point 1), and distance in degrees; inputs in degrees (scalars or arrays)
+    # geographic latitudes are converted to geocentric (as in SAC), which keeps the azimuths
+    # within a few thousandths of a degree of the ellipsoidal values
+    lat1, lon1, lat2, lon2 = [np.radians(np.asarray(x, dtype=np.float64)) for x in [lat1, lon1, lat2, lon2]]
+    lat1 = np.arctan((1 - flattening)**2 * np.tan(lat1))
+    lat2 = np.arctan((1 - flattening)**2 * np.tan(lat2))
+    dlon = lon2 - lon1
+    az = np.arctan2(np.sin(dlon) * np.cos(lat2),
+                    np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon))
+    baz = np.arctan2(-np.sin(dlon) * np.cos(lat1),
+                     np.cos(lat2) * np.sin(lat1) - np.sin(lat2) * np.cos(lat1) * np.cos(dlon))
+    hav = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    gcarc = 2 * np.arcsin(np.sqrt(np.clip(hav, 0, 1)))
+    return np.degrees(az) % 360, np.degrees(baz) % 360, np.degrees(gcarc)
+
+
+
+def get_rotation_coefficients(baz, cmpaz1, cmpaz2):
+    # coefficients of two orthogonal horizontal components (azimuths cmpaz1 and cmpaz2) that give
+    # the radial (pointing away from the source: baz + 180) and the transverse (radial + 90) components,
+    # like SAC 'rotate to gcp': R = cR1*H1 + cR2*H2; T = cT1*H1 + cT2*H2
+    theta_R = np.radians(np.asarray(baz, dtype=np.float64) + 180)
+    theta_T = theta_R + np.pi / 2
+    cmpaz1 = np.radians(cmpaz1)
+    cmpaz2 = np.radians(cmpaz2)
+    return np.cos(theta_R - cmpaz1), np.cos(theta_R - cmpaz2),\
+           np.cos(theta_T - cmpaz1), np.cos(theta_T - cmpaz2)
+
+
+
+def get_maxlag_samples(maxlag, delta):
+    # maximum lag in samples (None: all lags) from maximum lag in seconds (0: all lags)
+    if maxlag is None or maxlag <= 0:
+        return None
+    return int(round(maxlag / delta))
+
+
+
+def get_lag_range(npts1, npts2, maxlag=None):
+    # OUTPUT: number of negative and positive lag samples of a correlation (maxlag: samples; None: all lags)
+    nneg = npts1 - 1
+    npos = npts2 - 1
+    if maxlag is not None:
+        nneg = min(nneg, maxlag)
+        npos = min(npos, maxlag)
+    return nneg, npos
+
+
+
+def get_nfft(npts1, npts2, maxlag=None):
+    # fast FFT length without circular wrap-around for lags up to maxlag samples (None: all lags);
+    # truncated lags only need npts + maxlag samples
+    nfft = npts1 + npts2 - 1
+    if maxlag is not None:
+        nfft = min(nfft, max(npts1, npts2) + maxlag)
+    return next_fast_len(nfft, real=True)
+
+
+
+def correlate_cross_spectrum(cross_spectrum, npts1, npts2, nfft, maxlag=None):
+    # correlation (not normalized) of trace 1 (master) with trace 2 from their (stacked) cross-spectrum, like
+    # SAC 'correlate master 1': lags from -(npts1-1) to npts2-1 samples (npts1 + npts2 - 1 samples), positive
+    # lags: trace 2 lags behind; maxlag: only lags within +/- maxlag samples are returned
+    nneg, npos = get_lag_range(npts1, npts2, maxlag)
+    cc = np.fft.irfft(cross_spectrum, n=nfft)
+    return np.concatenate((cc[nfft-nneg:nfft], cc[:npos+1]))
+
+
+
+def get_windows(data, window, step):
+    # OUTPUT: 2D view of the overlapping sub-windows [nwin, window] (window <= 0: the whole trace)
+    if window <= 0 or window >= len(data):
+        return data[np.newaxis, :]
+    return np.lib.stride_tricks.sliding_window_view(data, window)[::max(step, 1)]
+
+
+
+def get_window_weights(group_energy1, group_energy2, weighted=False):
+    # OUTPUT: stacking weights of the common sub-windows; weighted: inverse window energy, so that no
+    # single window (earthquake, glitch) dominates the stack (windows without energy are excluded)
+    nwin = min(len(group_energy1), len(group_energy2))
+    energy = group_energy1[:nwin] * group_energy2[:nwin]
+    if not weighted:
+        return np.ones(nwin)
+    weights = np.zeros(nwin)
+    weights[energy > 0] = 1 / np.sqrt(energy[energy > 0])
+    return weights
+
+
+
+def stack_cross_spectra(spectra1, spectra2, weights):
+    # weighted sum of the sub-window cross-spectra: one inverse FFT per pair instead of one per window
+    nwin = len(weights)
+    return np.einsum('k,kf,kf->f', weights, np.conj(spectra1[:nwin]), spectra2[:nwin])
+
+
+
+def get_stack_norm(energy1, energy2, weights):
+    # normalization of a stacked correlation; with a single window: sqrt(energy1 * energy2) as SAC 'normalized'
+    nwin = len(weights)
+    return float(np.sum(weights * np.sqrt(energy1[:nwin] * energy2[:nwin])))
+
+
+
+def read_event_stations(event_sta_components):
+    # INPUT: {station: [north files, east files, vertical files]} (sac file paths)
+    # OUTPUT: {station: {'N': [header, sac file], 'E': [header, sac file], 'Z': [header, sac file]}} (available
+    # components only; the data are not loaded); horizontals are dropped (with an error message) if they can not be rotated together
+    stations = {}
+    for sta, sta_files in event_sta_components.items():
+        stations[sta] = {}
+        for icmp, cmp in enumerate(['N', 'E', 'Z']):
+            if not len(sta_files[icmp]):
+                continue
+            sacfile = sta_files[icmp][0]
+            try:
+                hdr, data = sacio.read_sac(sacfile)
+                for hdr_name in ['stla', 'stlo', 'stel', 'cmpaz', 'delta', 'npts']:
+                    float(hdr[hdr_name])
+                stations[sta][cmp] = [hdr, sacfile]
+                del data
+            except Exception as e:
+                print(f"    Error! Could not read sac file: {sacfile}")
+        if 'N' in stations[sta] and 'E' in stations[sta]:
+            hdr_N = stations[sta]['N'][0]
+            hdr_E = stations[sta]['E'][0]
+            cmpaz_dif = int(round(abs(float(hdr_N['cmpaz']) - float(hdr_E['cmpaz'])), 0))
+            if cmpaz_dif not in [90, 270]:
+                print(f"ERROR! Horizontal component azimuths are not 90 degrees apart for '{sta}' >> {cmpaz_dif}")
+                del stations[sta]['N'], stations[sta]['E']
+            elif hdr_N['npts'] != hdr_E['npts'] or abs(hdr_N['delta'] - hdr_E['delta']) > 1e-6 * hdr_N['delta']:
+                print(f"ERROR! Horizontal components do not have the same npts and delta for '{sta}'")
+                del stations[sta]['N'], stations[sta]['E']
+        else:
+            stations[sta].pop('N', None)
+            stations[sta].pop('E', None)
+    return stations
+
+
+
+def get_station_spectra(station, window, step, nfft):
+    # INPUT: {cmp: [header, sac file]} (see read_event_stations), sub-window length and step (samples), nfft
+    # OUTPUT: {cmp: spectra [nwin, nfreq]}, {cmp: energies [nwin]} of the sub-windows; energies also include
+    # the N-E cross energy ('NE') for the normalization of rotated traces and the horizontal energy
+    # ('H' = N + E, rotation invariant) for window weights
+    spectra = {}
+    energies = {}
+    data = {}
+    for cmp in station:
+        data[cmp] = get_windows(np.array(sacio.read_sac(station[cmp][1])[1], dtype=np.float64), window, step)
+        spectra[cmp] = np.fft.rfft(data[cmp], n=nfft, axis=-1)
+        energies[cmp] = np.sum(data[cmp]**2, axis=-1)
+    if 'N' in data:
+        energies['NE'] = np.sum(data['N'] * data['E'], axis=-1)
+        energies['H'] = energies['N'] + energies['E']
+    return spectra, energies
+
+
+
+def get_event_spectra(event_sta_components, event_sta_pairs, nfft=None, maxlag=0, window=0, overlap=0, cache_size=100):
+    # OUTPUT: nfft, {station: {cmp: header}}, station spectra (see EventSpectra), and the pairs with data (in
+    # station-block order, see get_block_pairs) with their azimuth, back-azimuth, and distance (deg) arrays
+    # cmp: 'N', 'E', 'Z'; sub-windows: window (s; 0: whole trace as one window), overlap (%);
+    # header 'npts' is the number of samples of a window. Only the headers are read here: the spectra of a
+    # station are computed when its first pair is correlated
+    stations = read_event_stations(event_sta_components)
+    windows = {} # {station: [window, step] in samples}
+    headers = {}
+    for sta in stations:
+        headers[sta] = {}
+        if len(stations[sta]):
+            hdr = list(stations[sta].values())[0][0]
+            nwindow = int(round(window / hdr['delta'])) if window > 0 else 0
+            windows[sta] = [nwindow, int(round(nwindow * (1 - overlap / 100)))]
+        for cmp in stations[sta]:
+            headers[sta][cmp] = dict(stations[sta][cmp][0])
+            if 0 < windows[sta][0] < headers[sta][cmp]['npts']:
+                headers[sta][cmp]['npts'] = windows[sta][0]
+    max_npts = max([headers[sta][cmp]['npts'] for sta in headers for cmp in headers[sta]] + [1])
+    min_delta = min([headers[sta][cmp]['delta'] for sta in headers for cmp in headers[sta]] + [np.inf])
+    if nfft is None:
+        nfft = get_nfft(int(max_npts), int(max_npts), get_maxlag_samples(maxlag, min_delta))
+    pairs, az, baz, gcarc = get_pair_azimuths(headers, event_sta_pairs)
+    order = get_block_order(pairs, max(cache_size // 2, 1) if cache_size > 0 else 0)
+    pairs = [pairs[ipair] for ipair in order]
+    event_spectra = EventSpectra(stations, windows, nfft, pairs, cache_size=cache_size)
+    return nfft, headers, event_spectra, pairs, az[order], baz[order], gcarc[order]
+
+
+
+def get_block_order(event_sta_pairs, block_size=0):
+    # OUTPUT: order of the station pairs by station blocks (block_size stations; 0: input order): all pairs
+    # between two blocks are correlated together, so only the spectra of two blocks of stations need to be kept
+    if block_size <= 0:
+        return np.arange(len(event_sta_pairs), dtype=int)
+    station_index = {}
+    for sta_pair in event_sta_pairs:
+        for sta in sta_pair:
+            station_index.setdefault(sta, len(station_index))
+    blocks = [sorted([station_index[sta] // block_size for sta in sta_pair]) for sta_pair in event_sta_pairs]
+    return np.array(sorted(range(len(event_sta_pairs)), key=lambda ipair: blocks[ipair]), dtype=int)
+
+
+
+class EventSpectra:
+    # spectra and energies of the event stations (see get_station_spectra), computed when a station is first
+    # needed. At most 'cache_size' stations are kept (the least recently used station is dropped and computed
+    # again if it is needed later; 0: no limit) and a station is dropped once all its pairs are done (done()).
+    # With pairs in station-block order (get_block_order; block: cache_size/2 stations), memory is cache_size
+    # stations and each station is transformed about #stations/block times.
+    def __init__(self, stations, windows, nfft, event_sta_pairs, cache_size=100):
+        self.stations = stations
+        self.windows = windows
+        self.nfft = nfft
+        self.cache_size = max(cache_size, 2) if cache_size > 0 else 0
+        self.npairs = collections.Counter([sta for sta_pair in event_sta_pairs for sta in sta_pair])
+        self.cache = collections.OrderedDict()
+
+    def get(self, sta):
+        # OUTPUT: {cmp: spectra}, {cmp: energies}
+        if sta in self.cache:
+            self.cache.move_to_end(sta)
+            return self.cache[sta]
+        self.cache[sta] = get_station_spectra(self.stations[sta], *self.windows[sta], self.nfft)
+        if self.cache_size:
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return self.cache[sta]
+
+    def done(self, sta1, sta2):
+        for sta in [sta1, sta2]:
+            self.npairs[sta] -= 1
+            if self.npairs[sta] <= 0:
+                self.cache.pop(sta, None)
+
+
+
+def get_pair_azimuths(headers, event_sta_pairs):
+    # OUTPUT: pairs with data, and the azimuth (sta1 to sta2), back-azimuth (sta2 to sta1), and distance (deg) arrays
+    pairs = [sta_pair for sta_pair in event_sta_pairs if sta_pair[0] in headers and sta_pair[1] in headers\
+             and len(headers[sta_pair[0]]) and len(headers[sta_pair[1]])]
+    coords = {}
+    for sta in set([sta for sta_pair in pairs for sta in sta_pair]):
+        hdr = list(headers[sta].values())[0]
+        coords[sta] = [float(hdr['stla']), float(hdr['stlo'])]
+    coords1 = np.array([coords[sta1] for sta1, sta2 in pairs]).reshape(-1, 2)
+    coords2 = np.array([coords[sta2] for sta1, sta2 in pairs]).reshape(-1, 2)
+    az, baz, gcarc = get_azimuths(coords1[:,0], coords1[:,1], coords2[:,0], coords2[:,1])
+    return pairs, az, baz, gcarc
+
+
+
+def get_rotated_components(sta_headers, sta_energies, sta_baz):
+    # INPUT: {cmp: header}, {cmp: energies} of a station with back-azimuth sta_baz
+    # OUTPUT: {'R': [header, cN, cE, energy], 'T': [header, cN, cE, energy]}
+    hdr_N = sta_headers['N']
+    hdr_E = sta_headers['E']
+    cR1, cR2, cT1, cT2 = get_rotation_coefficients(sta_baz, float(hdr_N['cmpaz']), float(hdr_E['cmpaz']))
+    rotated = {}
+    for cmp, c1, c2, cmpaz in [['R', cR1, cR2, sta_baz + 180], ['T', cT1, cT2, sta_baz + 270]]:
+        hdr = dict(hdr_N)
+        hdr['cmpaz'] = cmpaz % 360
+        hdr['kcmpnm'] = cmp
+        energy = c1**2 * sta_energies['N'] + c2**2 * sta_energies['E'] + 2 * c1 * c2 * sta_energies['NE']
+        rotated[cmp] = [hdr, c1, c2, energy]
+    return rotated
+
+
+
+def write_xcorr(output_dir, sta1, sta2, cmp, hdr1, hdr2, cc, pair_headers, maxlag=None):
+    xcorr_file = os.path.join(output_dir, f"{sta1}_{sta2}.{cmp}")
+    xcorr_headers = get_xcorr_output_headers(hdr1, hdr2, cmp, maxlag=maxlag)
+    xcorr_headers.update(pair_headers)
+    sacio.write_sac(xcorr_file, xcorr_headers, cc)
+
+
+
+def xcorr_event_RTZ(output_dir, event_sta_components, event_sta_pairs, nfft=None, maxlag=0,
+                    window=0, overlap=0, weighted=False, cache_size=100):
+    # INPUT: output directory, {station: [north files, east files, vertical files]}, [[sta1, sta2], ...],
+    #        maximum lag (s; 0: all lags), sub-window length (s; 0: whole trace) and overlap (%),
+    #        weighted: inverse window energy stacking weights
+    # OUTPUT: number of written cross-correlation files (sta1_sta2.RR, sta1_sta2.TT, sta1_sta2.ZZ)
+    # Rotation is linear, so the R and T spectra of every pair are weighted sums of the station's N and E
+    # spectra: no rotated (PPN/PPE, R/T, Z) copies are written.
+    # As with 'rotate to gcp' on sta1_sta2.PPN/PPE, the R of sta1 points away from sta2 and vice versa.
+    # Sub-window correlations are stacked in the frequency domain: one day-level correlation per pair.
+    # Station spectra are computed when needed and at most cache_size stations are kept (0: no limit; see EventSpectra).
+    nfft, headers, event_spectra, pairs, az, baz, gcarc = get_event_spectra(event_sta_components, event_sta_pairs, nfft=nfft,
+                                                                            maxlag=maxlag, window=window, overlap=overlap,
+                                                                            cache_size=cache_size)
+
+    nxcorr = 0
+    for ipair, (sta1, sta2) in enumerate(pairs):
+        pair_headers = {'az': az[ipair], 'baz': baz[ipair], 'gcarc': gcarc[ipair], 'dist': gcarc[ipair] * km_per_deg}
+        spectra1, energies1 = event_spectra.get(sta1)
+        spectra2, energies2 = event_spectra.get(sta2)
+        xcorr_inputs = [] # [component, sta1 header, sta1 spectra, sta1 energies, sta1 group energies, sta2 ...]
+        if 'N' in headers[sta1] and 'N' in headers[sta2]:
+            # the back-azimuth of sta1 (event: sta2) is the azimuth from sta1 to sta2 and vice versa
+            rotated1 = get_rotated_components(headers[sta1], energies1, az[ipair])
+            rotated2 = get_rotated_components(headers[sta2], energies2, baz[ipair])
+            for cmp in ['R', 'T']:
+                hdr1, c11, c12, energy1 = rotated1[cmp]
+                hdr2, c21, c22, energy2 = rotated2[cmp]
+                rotated_spectra1 = c11 * spectra1['N'] + c12 * spectra1['E']
+                rotated_spectra2 = c21 * spectra2['N'] + c22 * spectra2['E']
+                xcorr_inputs.append([f"{cmp}{cmp}", hdr1, rotated_spectra1, energy1, energies1['H'],
+                                                    hdr2, rotated_spectra2, energy2, energies2['H']])
+        if 'Z' in headers[sta1] and 'Z' in headers[sta2]:
+            xcorr_inputs.append(["ZZ", headers[sta1]['Z'], spectra1['Z'], energies1['Z'], energies1['Z'],
+                                       headers[sta2]['Z'], spectra2['Z'], energies2['Z'], energies2['Z']])
+
+        for cmp, hdr1, cmp_spectra1, energy1, group1, hdr2, cmp_spectra2, energy2, group2 in xcorr_inputs:
+            if abs(hdr1['delta'] - hdr2['delta']) > 1e-6 * hdr1['delta']:
+                print(f"    Error! Sampling intervals do not match: '{sta1}_{sta2}.{cmp}'")
+                continue
+            weights = get_window_weights(group1, group2, weighted)
+            norm = get_stack_norm(energy1, energy2, weights)
+            if norm <= 0:
+                continue
+            maxlag_samples = get_maxlag_samples(maxlag, hdr1['delta'])
+            cross_spectrum = stack_cross_spectra(cmp_spectra1, cmp_spectra2, weights)
+            cc = correlate_cross_spectrum(cross_spectrum, hdr1['npts'], hdr2['npts'], nfft, maxlag=maxlag_samples) / norm
+            write_xcorr(output_dir, sta1, sta2, cmp, hdr1, hdr2, cc, pair_headers, maxlag=maxlag_samples)
+            nxcorr += 1
+        del xcorr_inputs
+        event_spectra.done(sta1, sta2)
+    return nxcorr
+
+
+
+def xcorr_event_tensor(output_dir, event_sta_components, event_sta_pairs, outputs=0, nfft=None, maxlag=0,
+                       window=0, overlap=0, weighted=False, cache_size=100):
+    # INPUT: output directory, {station: [north files, east files, vertical files]}, [[sta1, sta2], ...],
+    #        outputs: 0 (RR, TT, ZZ), 1 (and RT, TR, RZ, ZR), 2 (and NN, NE, EN, EE, NZ, EZ, ZN, ZE),
+    #        maximum lag (s; 0: all lags), sub-window length (s; 0: whole trace) and overlap (%),
+    #        weighted: inverse window energy stacking weights
+    # OUTPUT: number of written cross-correlation files
+    # The N/E/Z correlation tensor of every pair is computed from the station spectra (one FFT per station
+    # component) and rotated afterwards: correlation is bilinear, so for a = sum(ai*u1i) and b = sum(bj*u2j),
+    # corr(a, b) = sum(ai*bj*corr(u1i, u2j)). RR, TT, and ZZ are the same as with xcorr_event_RTZ().
+    # Window weights only depend on rotation invariant energies (N + E, Z), so stacked tensors rotate exactly.
+    # Station spectra are computed when needed and at most cache_size stations are kept (0: no limit; see EventSpectra).
+    nfft, headers, event_spectra, pairs, az, baz, gcarc = get_event_spectra(event_sta_components, event_sta_pairs, nfft=nfft,
+                                                                            maxlag=maxlag, window=window, overlap=overlap,
+                                                                            cache_size=cache_size)
+    groups = {'N': 'H', 'E': 'H', 'R': 'H', 'T': 'H', 'Z': 'Z'} # energy groups of the window weights
+
+    nxcorr = 0
+    for ipair, (sta1, sta2) in enumerate(pairs):
+        pair_headers = {'az': az[ipair], 'baz': baz[ipair], 'gcarc': gcarc[ipair], 'dist': gcarc[ipair] * km_per_deg}
+        if abs(list(headers[sta1].values())[0]['delta'] - list(headers[sta2].values())[0]['delta'])\
+           > 1e-6 * list(headers[sta1].values())[0]['delta']:
+            print(f"    Error! Sampling intervals do not match: '{sta1}_{sta2}'")
+            event_spectra.done(sta1, sta2)
+            continue
+        spectra1, energies1 = event_spectra.get(sta1)
+        spectra2, energies2 = event_spectra.get(sta2)
+        maxlag_samples = get_maxlag_samples(maxlag, list(headers[sta1].values())[0]['delta'])
+        horizontals = 'N' in headers[sta1] and 'N' in headers[sta2]
+        verticals = 'Z' in headers[sta1] and 'Z' in headers[sta2]
+
+        # window weights of the component groups
+        weights = {}
+        for group1 in set([groups[cmp] for cmp in headers[sta1]]):
+            for group2 in set([groups[cmp] for cmp in headers[sta2]]):
+                weights[f"{group1}{group2}"] = get_window_weights(energies1[group1], energies2[group2], weighted)
+
+        # correlation tensor (stacked, not normalized)
+        tensor_cmps = []
+        if horizontals:
+            tensor_cmps += ['NN', 'NE', 'EN', 'EE']
+        if verticals:
+            tensor_cmps += ['ZZ']
+        if outputs >= 1:
+            if 'N' in headers[sta1] and 'Z' in headers[sta2]:
+                tensor_cmps += ['NZ', 'EZ']
+            if 'Z' in headers[sta1] and 'N' in headers[sta2]:
+                tensor_cmps += ['ZN', 'ZE']
+        tensor = {}
+        for cmp in tensor_cmps:
+            cross_spectrum = stack_cross_spectra(spectra1[cmp[0]], spectra2[cmp[1]],
+                                                 weights[f"{groups[cmp[0]]}{groups[cmp[1]]}"])
+            tensor[cmp] = correlate_cross_spectrum(cross_spectrum, headers[sta1][cmp[0]]['npts'],
+                                                   headers[sta2][cmp[1]]['npts'], nfft, maxlag=maxlag_samples)
+
+        # rotated components: [header, N coefficient, E coefficient, energies]
+        rotated1 = {'Z': [headers[sta1]['Z'], 0, 0, energies1['Z']]} if 'Z' in headers[sta1] else {}
+        rotated2 = {'Z': [headers[sta2]['Z'], 0, 0, energies2['Z']]} if 'Z' in headers[sta2] else {}
+        if 'N' in headers[sta1]:
+            rotated1.update(get_rotated_components(headers[sta1], energies1, az[ipair]))
+        if 'N' in headers[sta2]:
+            rotated2.update(get_rotated_components(headers[sta2], energies2, baz[ipair]))
+
+        xcorr_cmps = []
+        if horizontals:
+            xcorr_cmps += ['RR', 'TT']
+        if verticals:
+            xcorr_cmps += ['ZZ']
+        if outputs >= 1:
+            if horizontals:
+                xcorr_cmps += ['RT', 'TR']
+            if 'NZ' in tensor:
+                xcorr_cmps += ['RZ']
+            if 'ZN' in tensor:
+                xcorr_cmps += ['ZR']
+
+        xcorrs = [] # [component, sta1 header, sta2 header, correlation, normalization]
+        for cmp in xcorr_cmps:
+            hdr1, c11, c12, energy1 = rotated1[cmp[0]]
+            hdr2, c21, c22, energy2 = rotated2[cmp[1]]
+            if cmp == 'ZZ':
+                cc = np.array(tensor['ZZ'])
+            elif cmp[0] == 'Z':
+                cc = c21 * tensor['ZN'] + c22 * tensor['ZE']
+            elif cmp[1] == 'Z':
+                cc = c11 * tensor['NZ'] + c12 * tensor['EZ']
+            else:
+                cc = c11 * c21 * tensor['NN'] + c11 * c22 * tensor['NE']\
+                   + c12 * c21 * tensor['EN'] + c12 * c22 * tensor['EE']
+            norm = get_stack_norm(energy1, energy2, weights[f"{groups[cmp[0]]}{groups[cmp[1]]}"])
+            xcorrs.append([cmp, hdr1, hdr2, cc, norm])
+        if outputs >= 2:
+            for cmp in tensor:
+                if cmp != 'ZZ':
+                    norm = get_stack_norm(energies1[cmp[0]], energies2[cmp[1]],
+                                          weights[f"{groups[cmp[0]]}{groups[cmp[1]]}"])
+                    xcorrs.append([cmp, headers[sta1][cmp[0]], headers[sta2][cmp[1]], tensor[cmp], norm])
+
+        for cmp, hdr1, hdr2, cc, norm in xcorrs:
+            if norm <= 0:
+                continue
+            cc /= norm
+            write_xcorr(output_dir, sta1, sta2, cmp, hdr1, hdr2, cc, pair_headers, maxlag=maxlag_samples)
+            nxcorr += 1
+        event_spectra.done(sta1, sta2)
+    return nxcorr
@@ -0,0 +1,47 @@
+# writes the SAC 'bp' references used by test_bandpass.py
+# usage: python tests/make_bandpass_references.py <path to sac> <day trace sac file> [<day trace sac file> ...]
+# every trace is filtered by SAC ('bp co ... n 3 p 2') with a typical band and a band with its upper
+# corner near the Nyquist frequency; the inputs, outputs and tests/data/bandpass/references.txt are written
+
+import os
+import sys
+import shutil
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ans import proc
+from ans import sacio
+
+reference_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bandpass')
+
+
+def get_corner_periods(delta):
+    # [cp1, cp2]: typical ambient noise band, and upper corner at ~0.9 of the Nyquist frequency
+    return [[max(5.0, 10 * delta), 50.0], [2.2 * delta, 20 * delta]]
+
+
+def main(SAC, sacfiles):
+    os.makedirs(reference_dir, exist_ok=True)
+    manifest = []
+    for sacfile in sacfiles:
+        name = os.path.splitext(os.path.basename(sacfile))[0]
+        input_sacfile = os.path.join(reference_dir, f"{name}.sac")
+        shutil.copyfile(sacfile, input_sacfile)
+        delta = sacio.read_header(input_sacfile)['delta']
+        for cp1, cp2 in get_corner_periods(delta):
+            reference_sacfile = os.path.join(reference_dir, f"{name}_bp_{cp1:g}_{cp2:g}.sac")
+            if not proc.sac_bandpass_filter(input_sacfile, reference_sacfile, cp1, cp2, n=3, p=2, SAC=SAC) \
+            or not os.path.isfile(reference_sacfile):
+                print(f"ERROR! SAC bp failed: {sacfile} ({cp1:g}-{cp2:g} s)")
+                continue
+            manifest.append(f"{os.path.basename(input_sacfile)} {os.path.basename(reference_sacfile)} {cp1:g} {cp2:g} 3 2")
+    with open(os.path.join(reference_dir, 'references.txt'), 'w') as fopen:
+        fopen.write('\n'.join(manifest) + '\n')
+    print(f"{len(manifest)} references written: {reference_dir}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: python make_bandpass_references.py <path to sac> <sac file> [<sac file> ...]")
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,83 @@
+# in-process bandpass filter (proc.bandpass_filter) tests
+# - against SAC 'bp co ... n 3 p 2' outputs stored in tests/data/bandpass (see make_bandpass_references.py);
+#   skipped while no references are stored
+# - against the analytic Butterworth response of the design SAC uses (prewarped bilinear transform)
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import signal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ans import proc
+from ans import sacio
+
+# maximum relative RMS difference to SAC 'bp' (SAC filters in single precision)
+SAC_BP_TOLERANCE = 1e-3
+
+reference_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bandpass')
+
+
+def get_sac_references():
+    manifest = os.path.join(reference_dir, 'references.txt')
+    if not os.path.isfile(manifest):
+        return []
+    with open(manifest) as fopen:
+        return [line.split() for line in fopen if line.strip()]
+
+
+@pytest.mark.skipif(not len(get_sac_references()), reason="no SAC bp references in tests/data/bandpass")
+@pytest.mark.parametrize("reference", get_sac_references(), ids=lambda x: x[1])
+def test_matches_sac_bp(reference):
+    input_sacfile, reference_sacfile, cp1, cp2, n, p = reference
+    headers, data = sacio.load_sac(os.path.join(reference_dir, input_sacfile))
+    sac_data = sacio.load_sac(os.path.join(reference_dir, reference_sacfile))[1].astype(np.float64)
+    filtered = proc.bandpass_filter(data, headers['delta'], float(cp1), float(cp2), n=int(n), p=int(p))
+    rms_difference = np.sqrt(np.mean((filtered - sac_data) ** 2)) / np.sqrt(np.mean(sac_data ** 2))
+    assert rms_difference < SAC_BP_TOLERANCE
+
+
+def butterworth_response(freqs, delta, cp1, cp2, n):
+    # single pass amplitude response of an n-pole Butterworth bandpass after the bilinear transform
+    warp = lambda f: 2 / delta * np.tan(np.pi * f * delta)
+    w = warp(freqs)
+    w1 = warp(1 / cp2)
+    w2 = warp(1 / cp1)
+    return 1 / np.sqrt(1 + ((w ** 2 - w1 * w2) / (w * (w2 - w1))) ** (2 * n))
+
+
+@pytest.mark.parametrize("delta, cp1, cp2, n", [
+    [1.0, 5.0, 50.0, 3],
+    [0.05, 0.11, 1.0, 3], # upper corner at 0.91 of the Nyquist frequency
+    [0.01, 0.022, 0.2, 2],
+    [1.0, 10.0, 400.0, 4],
+])
+def test_design_response(delta, cp1, cp2, n):
+    sos = proc.get_bandpass_sos(delta, cp1, cp2, n)
+    freqs = np.linspace(0.001, 0.499, 500) / delta
+    response = np.abs(signal.sosfreqz(sos, worN=freqs, fs=1 / delta)[1])
+    assert np.allclose(response, butterworth_response(freqs, delta, cp1, cp2, n), atol=1e-6)
+    # -3 dB at both corners
+    corners = np.abs(signal.sosfreqz(sos, worN=[1 / cp2, 1 / cp1], fs=1 / delta)[1])
+    assert np.allclose(corners, np.sqrt(0.5), atol=1e-6)
+
+
+def test_two_passes_are_zero_phase():
+    delta = 0.05
+    impulse = np.zeros(4001)
+    impulse[2000] = 1
+    filtered = proc.bandpass_filter(impulse, delta, 0.11, 1.0, n=3, p=2)
+    assert np.allclose(filtered, filtered[::-1], atol=1e-9)
+    spectrum = np.abs(np.fft.rfft(filtered))
+    freqs = np.fft.rfftfreq(len(impulse), delta)[1:]
+    assert np.allclose(spectrum[1:], butterworth_response(freqs, delta, 0.11, 1.0, 3) ** 2, atol=1e-4)
+
+
+def test_traces_are_filtered_independently():
+    data = np.random.default_rng(0).standard_normal((3, 2000))
+    filtered = proc.bandpass_filter(data, 1.0, 5.0, 50.0)
+    for i in range(3):
+        assert np.array_equal(filtered[i], proc.bandpass_filter(data[i], 1.0, 5.0, 50.0))
@@ -0,0 +1,113 @@
+# sacpool tests with a fake SAC process: it echoes every command (as a prompt would), prints the
+# 'message' text, reports an ERROR for 'r' of a BAD file, exits on 'crash' and hangs on 'hang'
+
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ans import sacpool
+
+
+FAKE_SAC = textwrap.dedent('''\
+    #!{python}
+    import sys
+    import time
+    with open({log!r}, 'a') as log:
+        log.write('start\\n')
+    for line in sys.stdin:
+        line = line.strip()
+        print(f"SAC> {{line}}", flush=True)
+        if line.lower() in ('q', 'quit'):
+            break
+        elif line == 'crash':
+            sys.exit(1)
+        elif line == 'hang':
+            time.sleep(60)
+        elif line.startswith('message'):
+            print(line.split(' ', 1)[1].strip('"'), flush=True)
+        elif line.startswith('r ') and 'BAD' in line:
+            print(" ERROR 1301: No data files read in.", flush=True)
+        elif line.startswith('lh'):
+            print("      npts = 100", flush=True)
+''')
+
+
+@pytest.fixture
+def fake_sac(tmp_path):
+    sac = tmp_path / 'sac'
+    sac.write_text(FAKE_SAC.format(python=sys.executable, log=str(tmp_path / 'starts.log')))
+    sac.chmod(0o755)
+    return str(sac)
+
+
+def count_starts(fake_sac):
+    with open(os.path.join(os.path.dirname(fake_sac), 'starts.log')) as fp:
+        return len(fp.readlines())
+
+
+def test_run_reports_output_per_command(fake_sac):
+    sac_process = sacpool.SACProcess(fake_sac, timeout=10)
+    try:
+        results = sac_process.run(["r a.sac", "lh npts", "w over", "quit"])
+    finally:
+        sac_process.close()
+    assert [x[0] for x in results] == ["r a.sac", "lh npts", "w over"]
+    assert results[1][2] == ["SAC> lh npts", "npts = 100"]
+    assert all(len(x[3]) == 0 for x in results)
+    assert all(x[1] >= 0 for x in results)
+
+
+def test_error_is_assigned_to_its_command(fake_sac):
+    sac_process = sacpool.SACProcess(fake_sac, timeout=10)
+    try:
+        results = sac_process.run(["r a.sac", "r BAD.sac", "w out.sac"])
+        # the next job on the same session is not affected
+        next_results = sac_process.run(["r b.sac"])
+    finally:
+        sac_process.close()
+    assert results[0][3] == []
+    assert results[1][3] == ["ERROR 1301: No data files read in."]
+    assert results[2][3] == []
+    assert next_results[0][3] == []
+    assert count_starts(fake_sac) == 1
+
+
+def test_exited_process_is_restarted(fake_sac):
+    sac_process = sacpool.SACProcess(fake_sac, timeout=10)
+    try:
+        results = sac_process.run(["r a.sac", "crash", "w out.sac"])
+        assert results[0][3] == []
+        assert "SAC process exited" in results[1][3][0]
+        assert "SAC process exited" in results[2][3][0]
+        assert sac_process.run(["r a.sac"])[0][3] == []
+    finally:
+        sac_process.close()
+    assert count_starts(fake_sac) == 2
+
+
+def test_timeout_restarts_process(fake_sac):
+    sac_process = sacpool.SACProcess(fake_sac, timeout=1)
+    try:
+        results = sac_process.run(["hang", "w out.sac"])
+        assert all("did not respond" in x[3][0] for x in results)
+        assert sac_process.run(["r a.sac"])[0][3] == []
+    finally:
+        sac_process.close()
+    assert count_starts(fake_sac) == 2
+
+
+def test_pool_success_and_latency_report(fake_sac):
+    pool = sacpool.SACPool(fake_sac, size=2, timeout=10)
+    try:
+        assert pool.run(["r a.sac", "w over"])
+        assert not pool.run(["r BAD.sac", "w over"])
+        assert pool.nerrors == 1
+        assert pool.latencies['r'][0] == 2
+        assert pool.latencies['w'][0] == 2
+        assert "commands with errors: 1" in pool.report()
+    finally:
+        pool.close()